@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import serial
+
+from alarms import AlarmEngine
+
+# Типы записей в кольцевом буфере
+RECORD_LINE = 0      # строка от устройства
+RECORD_ALARM = 1     # событие тревоги (JSON AlarmEvent.as_dict)
+RECORD_ERROR = 2     # потеря связи / ошибка открытия порта
+RECORD_OPENED = 3    # порт открыт
+RECORD_STATUS = 4    # сообщение для строки состояния
+
+# Заголовок буфера: индекс записи, индекс чтения (uint64)
+HEADER = struct.Struct("<QQ")
+# Заголовок слота: тип записи, длина текста, время прихода (monotonic)
+SLOT_HEADER = struct.Struct("<BHd")
+SLOT_SIZE = 256
+RING_CAPACITY = 4096
+
+JOURNAL_FILE = "acquisition_journal.csv"
+# Журнал переименовывается в acquisition_journal.1.csv (одна предыдущая часть) по достижении размера
+JOURNAL_MAX_BYTES = 8 * 2 ** 20
+JOURNAL_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Пока процесс сбора работает, рядом с журналом лежит файл с его pid; новый
+# интерфейс просит процесс, оставшийся без родителя, завершиться файлом .takeover
+OWNER_SUFFIX = ".pid"
+TAKEOVER_SUFFIX = ".takeover"
+# Как часто процесс без интерфейса проверяет запрос на завершение, с
+TAKEOVER_CHECK = 0.5
+
+# OpenProcess / GetExitCodeProcess (проверка pid на Windows)
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+
+def journal_parts(path):
+    """Файлы журнала сбора от старого к новому"""
+    base, ext = os.path.splitext(path)
+    return [part for part in (f"{base}.1{ext}", path) if os.path.exists(part)]
+
+
+def _side_file(path, suffix):
+    return os.path.splitext(path)[0] + suffix
+
+
+class Journal:
+    """Журнал строк процесса сбора: "время;строка", с ротацией по размеру"""
+    def __init__(self, path, max_bytes=JOURNAL_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, line):
+        self.file.write(f"{datetime.now().strftime(JOURNAL_TIME_FORMAT)[:-3]};{line}\n")
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self.file.close()
+        rotate_journal(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
+
+
+def rotate_journal(path):
+    """Текущая часть журнала становится предыдущей (старая предыдущая удаляется)"""
+    if os.path.exists(path):
+        base, ext = os.path.splitext(path)
+        os.replace(path, f"{base}.1{ext}")
+
+
+def read_journal(path, after=None):
+    """Записи журнала (время, строка) новее after (время журнала, до секунд)"""
+    for part in journal_parts(path):
+        with open(part, encoding="utf-8", errors="ignore") as f:
+            for record in f:
+                stamp, sep, line = record.rstrip("\n").partition(";")
+                if not sep or not line:
+                    continue
+                if after is not None and stamp[:len(after)] <= after:
+                    continue
+                yield stamp, line
+
+
+def pid_alive(pid):
+    """Жив ли процесс с этим pid"""
+    if sys.platform == "win32":
+        # os.kill на Windows завершает процесс, поэтому проверка через OpenProcess
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_alive(owner):
+    """Жив ли процесс, записавший файл pid (нечитаемый файл считается оставшимся от мертвого)"""
+    try:
+        with open(owner) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return False
+    return pid_alive(pid)
+
+
+def remove_owner(owner, pid=None):
+    """Удаление файла pid (если задан pid - только своего)"""
+    try:
+        if pid is not None:
+            with open(owner) as f:
+                if f.read().strip() != str(pid):
+                    return
+        os.remove(owner)
+    except (OSError, ValueError):
+        pass
+
+
+def stop_orphan(journal_path=JOURNAL_FILE, timeout=3.0):
+    """Завершение процесса сбора, пережившего интерфейс; True, если порт свободен.
+
+    Процесс без родителя продолжает писать журнал, пока его не попросят
+    завершиться: тогда он закрывает порт и журнал и удаляет свой файл pid.
+    Файл pid мертвого процесса (убит, пропало питание, принудительное
+    завершение) удаляется сразу, без ожидания.
+    """
+    owner = _side_file(journal_path, OWNER_SUFFIX)
+    if not os.path.exists(owner):
+        return True
+    if not owner_alive(owner):
+        remove_owner(owner)
+        return True
+    takeover = _side_file(journal_path, TAKEOVER_SUFFIX)
+    with open(takeover, "w"):
+        pass
+    try:
+        deadline = time.monotonic() + timeout
+        while os.path.exists(owner) and time.monotonic() < deadline:
+            if not owner_alive(owner):
+                remove_owner(owner)
+                break
+            time.sleep(0.05)
+        return not os.path.exists(owner)
+    finally:
+        os.remove(takeover)
+
+
+class ShmRing:
+    """Кольцевой буфер в разделяемой памяти: один писатель, один читатель.
+
+    Писатель меняет только индекс записи, читатель - только индекс чтения,
+    поэтому блокировки не нужны: слот сначала заполняется, а затем
+    публикуется сдвигом индекса записи.
+    """
+    def __init__(self, name=None, capacity=RING_CAPACITY, slot_size=SLOT_SIZE):
+        self.capacity = capacity
+        self.slot_size = slot_size
+        size = HEADER.size + capacity * slot_size
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+
+    def _indexes(self):
+        return HEADER.unpack_from(self.shm.buf, 0)
+
+    def put(self, kind, received, text):
+        """Запись в буфер, False если буфер заполнен"""
+        write_index, read_index = self._indexes()
+        if write_index - read_index >= self.capacity:
+            return False
+
+        payload = text.encode("utf-8")[:self.slot_size - SLOT_HEADER.size]
+        offset = HEADER.size + (write_index % self.capacity) * self.slot_size
+        SLOT_HEADER.pack_into(self.shm.buf, offset, kind, len(payload), received)
+        start = offset + SLOT_HEADER.size
+        self.shm.buf[start:start + len(payload)] = payload
+
+        # Публикация записи
+        struct.pack_into("<Q", self.shm.buf, 0, write_index + 1)
+        return True
+
+    def get_all(self, limit=None):
+        """Чтение всех опубликованных записей: список (тип, время, текст)"""
+        write_index, read_index = self._indexes()
+        if limit is not None:
+            write_index = min(write_index, read_index + limit)
+
+        records = []
+        for index in range(read_index, write_index):
+            offset = HEADER.size + (index % self.capacity) * self.slot_size
+            kind, length, received = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+            start = offset + SLOT_HEADER.size
+            text = bytes(self.shm.buf[start:start + length]).decode("utf-8", "ignore")
+            records.append((kind, received, text))
+
+        # Освобождение прочитанных слотов
+        struct.pack_into("<Q", self.shm.buf, 8, write_index)
+        return records
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def acquisition_main(port, baud, ring_name, commands, stop_event, journal_path):
+    """Процесс сбора: владеет портом, декодирует строки и публикует их в буфер.
+
+    Каждая строка сначала дописывается в журнал, а интерфейс при запуске
+    дописывает в журнал Excel и агрегаты то, что принято без него
+    (read_journal), поэтому зависание или падение интерфейса не приводит к
+    потере показаний. Если буфер заполнен, записи копятся в очереди процесса
+    до освобождения места. Если интерфейс завершился аварийно, процесс
+    продолжает сбор в журнал (с проверкой порогов), пока новый интерфейс не
+    попросит его завершиться (stop_orphan).
+    """
+    ring = ShmRing(ring_name)
+    pending = deque()
+    parent = multiprocessing.parent_process()
+    journal = Journal(journal_path) if journal_path else None
+    owner = _side_file(journal_path, OWNER_SUFFIX) if journal_path else None
+    takeover = _side_file(journal_path, TAKEOVER_SUFFIX) if journal_path else None
+    orphaned = False
+    next_check = 0.0
+    if owner is not None:
+        with open(owner, "w") as f:
+            f.write(str(os.getpid()))
+
+    def publish(kind, received, text):
+        if not orphaned:
+            pending.append((kind, received, text))
+
+    alarm_engine = None
+    try:
+        alarm_engine = AlarmEngine.from_config()
+        alarm_engine.add_listener(lambda event: publish(
+            RECORD_ALARM, event.received, json.dumps(event.as_dict(), ensure_ascii=False)))
+    except Exception as e:
+        publish(RECORD_STATUS, time.monotonic(), f"Ошибка загрузки порогов тревоги: {e}")
+
+    serial_port = None
+    buffer = ""
+    try:
+        serial_port = serial.Serial(port, baud, timeout=1)
+        publish(RECORD_OPENED, time.monotonic(), port)
+
+        while not stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + TAKEOVER_CHECK
+                if not orphaned and parent is not None and not parent.is_alive():
+                    # Интерфейса нет: буфер больше никто не читает, сбор идет только в журнал
+                    orphaned = True
+                    pending.clear()
+                if orphaned and (journal is None or os.path.exists(takeover)):
+                    break
+
+            if serial_port.in_waiting:
+                data = serial_port.read(serial_port.in_waiting).decode('utf-8', 'ignore')
+                received = time.monotonic()
+                buffer += data
+
+                while '\n' in buffer:
+                    line, buffer = buffer.split('\n', 1)
+                    line = line.strip()
+                    if line:
+                        if journal is not None:
+                            journal.write(line)
+                        if alarm_engine is not None:
+                            alarm_engine.process_line(line, received)
+                        publish(RECORD_LINE, received, line)
+
+            # Команды от интерфейса
+            while not orphaned:
+                try:
+                    cmd = commands.get_nowait()
+                except queue.Empty:
+                    break
+                serial_port.write(f"{cmd}\n".encode())
+
+            while pending and ring.put(*pending[0]):
+                pending.popleft()
+
+            time.sleep(0.01)
+
+    except Exception as e:
+        if not stop_event.is_set():
+            publish(RECORD_ERROR, time.monotonic(), str(e))
+            # Ждем, пока интерфейс заберет оставшиеся записи
+            while pending and not stop_event.is_set() and (parent is None or parent.is_alive()):
+                if ring.put(*pending[0]):
+                    pending.popleft()
+                else:
+                    time.sleep(0.01)
+    finally:
+        if serial_port is not None:
+            try:
+                serial_port.close()
+            except Exception:
+                pass
+        if alarm_engine is not None:
+            alarm_engine.stop()
+        if journal is not None:
+            journal.close()
+        if owner is not None and os.path.exists(owner):
+            os.remove(owner)
+        ring.close()
+
+
+class AcquisitionProcess:
+    """Управление процессом сбора со стороны интерфейса.
+
+    Процесс запускается через spawn: fork процесса Qt с уже работающими
+    потоками приемников, рассылки и контроля цикла событий может унаследовать
+    захваченные ими блокировки.
+    """
+    def __init__(self, port, baud, journal_path=JOURNAL_FILE):
+        context = multiprocessing.get_context("spawn")
+        self.ring = ShmRing()
+        self.commands = context.Queue()
+        self.stop_event = context.Event()
+        self.owner = _side_file(journal_path, OWNER_SUFFIX) if journal_path else None
+        self.process = context.Process(
+            target=acquisition_main,
+            args=(port, baud, self.ring.name, self.commands, self.stop_event, journal_path),
+            daemon=True,
+        )
+
+    def start(self):
+        self.process.start()
+
+    def poll(self, limit=None):
+        """Новые записи из буфера: список (тип, время, текст)"""
+        return self.ring.get_all(limit)
+
+    def send(self, cmd):
+        """Передача команды устройству через процесс сбора"""
+        self.commands.put(cmd)
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+            # terminate не выполняет finally процесса: файл pid удаляется здесь
+            if self.owner is not None:
+                remove_owner(self.owner, self.process.pid)
+        self.commands.close()
+        self.ring.close()
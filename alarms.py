@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import subprocess
+import threading
+from datetime import datetime
+
+from protocol import parse_temperatures
+
+ALARM_CONFIG = "alarms.json"
+ALARM_LOG = "alarms.log"
+
+# Пороги, которые прошивка записывает в датчики (TH = 0x64, TL = -30)
+DEFAULT_HIGH = 100.0
+DEFAULT_LOW = -30.0
+DEFAULT_HYSTERESIS = 0.5
+
+NORMAL = "NORMAL"
+HIGH = "HIGH"
+LOW = "LOW"
+
+EVENT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class AlarmRule:
+    """Пороги датчика: верхний/нижний, гистерезис и выдержка срабатывания (с)"""
+    def __init__(self, high=DEFAULT_HIGH, low=DEFAULT_LOW, hysteresis=DEFAULT_HYSTERESIS, holdoff=0.0):
+        self.high = high
+        self.low = low
+        self.hysteresis = hysteresis
+        self.holdoff = holdoff
+
+
+class AlarmEvent:
+    """Смена состояния тревоги датчика"""
+    def __init__(self, sensor, state, previous, temp, received):
+        self.sensor = sensor
+        self.state = state
+        self.previous = previous
+        self.temp = temp
+        self.received = received
+        self.time = datetime.now()
+
+    @classmethod
+    def from_dict(cls, data, received):
+        """Событие, переданное словарем as_dict (например, из процесса сбора)"""
+        event = cls(data["sensor"] - 1, data["state"], data["previous"], data["temp"], received)
+        event.time = datetime.strptime(data["time"], EVENT_TIME_FORMAT)
+        return event
+
+    def as_dict(self):
+        return {
+            "time": self.time.strftime(EVENT_TIME_FORMAT)[:-3],
+            "sensor": self.sensor + 1,
+            "state": self.state,
+            "previous": self.previous,
+            "temp": self.temp,
+        }
+
+    def text(self):
+        if self.state == NORMAL:
+            return f"Датчик {self.sensor + 1}: норма ({self.temp:.2f} °C)"
+        kind = "выше верхнего порога" if self.state == HIGH else "ниже нижнего порога"
+        return f"ТРЕВОГА! Датчик {self.sensor + 1}: {kind} ({self.temp:.2f} °C)"
+
+
+class CommandHook:
+    """Запуск внешней команды, параметры тревоги передаются через переменные окружения"""
+    def __init__(self, command):
+        self.command = command
+
+    def __call__(self, event):
+        env = dict(os.environ)
+        env.update({
+            "ALARM_SENSOR": str(event.sensor + 1),
+            "ALARM_STATE": event.state,
+            "ALARM_PREVIOUS": event.previous,
+            "ALARM_TEMP": f"{event.temp:.4f}",
+        })
+        # Не ждем завершения, чтобы не задерживать остальные хуки
+        subprocess.Popen(self.command, shell=True, env=env,
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class FileHook:
+    """Дописывание события в файл (JSON-строка)"""
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, event):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event.as_dict(), ensure_ascii=False) + "\n")
+
+
+class SocketHook:
+    """Отправка события JSON-строкой по UDP или TCP"""
+    def __init__(self, host, port, protocol="udp", timeout=0.2):
+        self.address = (host, port)
+        self.protocol = protocol
+        self.timeout = timeout
+        self.sock = None
+        if protocol == "udp":
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, event):
+        data = (json.dumps(event.as_dict(), ensure_ascii=False) + "\n").encode()
+        if self.protocol == "udp":
+            self.sock.sendto(data, self.address)
+        else:
+            with socket.create_connection(self.address, timeout=self.timeout) as sock:
+                sock.sendall(data)
+
+
+HOOK_TYPES = {
+    "command": lambda cfg: CommandHook(cfg["command"]),
+    "file": lambda cfg: FileHook(cfg["path"]),
+    "socket": lambda cfg: SocketHook(cfg.get("host", "127.0.0.1"), int(cfg["port"]),
+                                     cfg.get("protocol", "udp")),
+}
+
+
+class AlarmEngine:
+    """Оценка порогов по декодированным показаниям прямо в потоке чтения.
+
+    Тревога включается, когда температура выходит за порог и держится там
+    не меньше holdoff секунд, и снимается только после возврата за порог
+    на величину гистерезиса.
+
+    При смене состояния слушатели вызываются в потоке чтения, а хуки
+    (команда, файл, сокет) выполняются отдельным потоком из очереди:
+    недоступный TCP-адрес не задерживает чтение порта. В журнал тревог
+    пишутся обе задержки: до передачи события из потока чтения и до
+    выполнения хуков.
+    """
+    def __init__(self, rules=None, hooks=None, log_file=ALARM_LOG):
+        self.rules = rules if rules is not None else {0: AlarmRule(), 1: AlarmRule()}
+        self.hooks = hooks or []
+        self.listeners = []
+        self.states = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.logger = logging.getLogger("ds18b20.alarms")
+        self.logger.setLevel(logging.INFO)
+        if log_file and not self.logger.handlers:
+            handler = logging.FileHandler(log_file, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+
+        self.queue = queue.Queue()
+        self.worker = None
+        if self.hooks:
+            self.worker = threading.Thread(target=self._run_hooks, name="alarm-hooks", daemon=True)
+            self.worker.start()
+
+    @classmethod
+    def from_config(cls, path=ALARM_CONFIG, log_file=ALARM_LOG):
+        """Загрузка порогов и хуков из JSON, при отсутствии файла - пороги прошивки"""
+        if not os.path.exists(path):
+            return cls(log_file=log_file)
+
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+
+        rules = {}
+        for num, cfg in config.get("sensors", {}).items():
+            rules[int(num) - 1] = AlarmRule(
+                high=float(cfg.get("high", DEFAULT_HIGH)),
+                low=float(cfg.get("low", DEFAULT_LOW)),
+                hysteresis=float(cfg.get("hysteresis", DEFAULT_HYSTERESIS)),
+                holdoff=float(cfg.get("holdoff", 0.0)),
+            )
+        hooks = [HOOK_TYPES[cfg["type"]](cfg) for cfg in config.get("hooks", [])]
+        return cls(rules or None, hooks, log_file)
+
+    def add_listener(self, callback):
+        """Дополнительный обработчик событий (например, уведомление интерфейса)"""
+        self.listeners.append(callback)
+
+    def _target_state(self, rule, state, temp):
+        if state == HIGH:
+            return HIGH if temp > rule.high - rule.hysteresis else NORMAL
+        if state == LOW:
+            return LOW if temp < rule.low + rule.hysteresis else NORMAL
+        if temp > rule.high:
+            return HIGH
+        if temp < rule.low:
+            return LOW
+        return NORMAL
+
+    def evaluate(self, sensor, temp, received=None):
+        """Проверка одного показания, возвращает событие при смене состояния"""
+        rule = self.rules.get(sensor)
+        if rule is None:
+            return None
+        if received is None:
+            received = time.monotonic()
+
+        with self.lock:
+            state = self.states.get(sensor, NORMAL)
+            target = self._target_state(rule, state, temp)
+
+            if target == state:
+                self.pending.pop(sensor, None)
+                return None
+
+            # Выдержка: новое состояние должно продержаться holdoff секунд
+            if target != NORMAL and rule.holdoff > 0:
+                since = self.pending.get(sensor)
+                if since is None or since[0] != target:
+                    self.pending[sensor] = (target, received)
+                    return None
+                if received - since[1] < rule.holdoff:
+                    return None
+
+            self.pending.pop(sensor, None)
+            self.states[sensor] = target
+
+        event = AlarmEvent(sensor, target, state, temp, received)
+        self.fire(event)
+        return event
+
+    def fire(self, event):
+        """Вызов слушателей, передача события хукам и запись задержки в потоке чтения"""
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                self.logger.info(f"S{event.sensor} ошибка обработчика: {e}")
+        if self.worker is not None:
+            self.queue.put(event)
+
+        latency_ms = (time.monotonic() - event.received) * 1000
+        self.logger.info(f"S{event.sensor} {event.previous} -> {event.state} "
+                         f"temp={event.temp:.4f} latency={latency_ms:.2f}ms")
+
+    def _run_hooks(self):
+        """Поток хуков: события по очереди, задержка от прихода строки до выполнения всех хуков"""
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            for hook in self.hooks:
+                try:
+                    hook(event)
+                except Exception as e:
+                    self.logger.info(f"S{event.sensor} ошибка хука {type(hook).__name__}: {e}")
+            latency_ms = (time.monotonic() - event.received) * 1000
+            self.logger.info(f"S{event.sensor} {event.state} hooks latency={latency_ms:.2f}ms "
+                             f"queued={self.queue.qsize()}")
+
+    def stop(self, timeout=2.0):
+        """Выполнение оставшихся в очереди хуков и остановка потока"""
+        if self.worker is None:
+            return
+        self.queue.put(None)
+        self.worker.join(timeout)
+        self.worker = None
+
+    def process_line(self, line, received=None):
+        """Проверка всех температур из строки прошивки"""
+        events = []
+        for sensor, temp in parse_temperatures(line).items():
+            event = self.evaluate(sensor, temp, received)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def state(self, sensor):
+        return self.states.get(sensor, NORMAL)
@@ -0,0 +1,316 @@
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from export_log import LOG_FILE, CHUNK_SIZE, sensor_columns, parse_bound
+
+# Сетка гистограммы: шаг датчика 1/16 °C во всем диапазоне DS18B20
+TEMP_MIN = -55.0
+TEMP_MAX = 125.0
+TEMP_STEP = 0.0625
+BINS = int(round((TEMP_MAX - TEMP_MIN) / TEMP_STEP)) + 1
+
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+# Показание считается действующим до следующей строки, но не дольше (с)
+MAX_HOLD = 3600.0
+
+# Период кадров прошивки, с: строка журнала, действовавшая n периодов, - это n одинаковых кадров
+FRAME_PERIOD = 10.0
+
+
+def chunk_to_arrays(chunk, sensors):
+    """Порция строк журнала -> время (с, float64), температуры (NaN для ERROR), разрешения (int8)"""
+    times = np.array([row[0] for row in chunk], dtype="datetime64[ms]").astype(np.int64) / 1000.0
+
+    temps = np.empty((len(sensors), len(chunk)), dtype=np.float64)
+    res = np.zeros((len(sensors), len(chunk)), dtype=np.int8)
+    for i in range(len(sensors)):
+        temp_col = [row[1 + 2 * i] for row in chunk]
+        res_col = [row[2 + 2 * i] for row in chunk]
+        # Нечисловые значения ('ERROR', '---', пустые) становятся NaN
+        temps[i] = np.array([_to_float(v) for v in temp_col], dtype=np.float64)
+        res[i] = np.array([_to_int(v) for v in res_col], dtype=np.int8)
+    return times, temps, res
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class Moments:
+    """Количество, среднее, дисперсия, минимум и максимум.
+
+    Порции объединяются по формулам Чана: сумма квадратов отклонений
+    считается внутри порции, поэтому точность не теряется на больших
+    значениях при малом разбросе.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean_value = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values, weights=None):
+        """Порция значений; weights - целое число повторов каждого значения"""
+        if weights is not None:
+            used = weights > 0
+            values, weights = values[used], weights[used]
+        if values.size == 0:
+            return
+        if weights is None:
+            n = int(values.size)
+            mean = float(values.mean())
+            m2 = float(np.square(values - mean).sum())
+        else:
+            n = int(weights.sum())
+            mean = float(np.average(values, weights=weights))
+            m2 = float((weights * np.square(values - mean)).sum())
+        self._merge(n, mean, m2, float(values.min()), float(values.max()))
+
+    def add_constant(self, value, n):
+        """n одинаковых значений без создания массива"""
+        if n > 0:
+            self._merge(int(n), float(value), 0.0, float(value), float(value))
+
+    def _merge(self, n, mean, m2, low, high):
+        total = self.count + n
+        delta = mean - self.mean_value
+        self.mean_value += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    def mean(self):
+        return self.mean_value if self.count else None
+
+    def std(self):
+        if self.count < 2:
+            return None
+        return float(np.sqrt(self.m2 / (self.count - 1)))
+
+    def as_dict(self):
+        return {"count": self.count, "mean": self.mean(), "std": self.std(),
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+
+class SensorStats:
+    """Накопители по одному датчику"""
+    def __init__(self):
+        self.moments = Moments()
+        self.histogram = np.zeros(BINS, dtype=np.int64)
+        self.errors = 0
+        self.time_total = 0.0
+        self.time_above = 0.0
+        # Шум по разрешению: разности соседних кадров при одинаковом разрешении
+        self.noise = {}
+
+    def percentiles(self, points=PERCENTILES):
+        total = self.histogram.sum()
+        if total == 0:
+            return {p: None for p in points}
+        cumulative = np.cumsum(self.histogram)
+        ranks = np.ceil(np.array(points) / 100.0 * total).clip(1, total)
+        idx = np.searchsorted(cumulative, ranks)
+        return {p: round(TEMP_MIN + i * TEMP_STEP, 4) for p, i in zip(points, idx)}
+
+
+class HistoryAnalytics:
+    """Потоковые отчеты по истории: память пропорциональна размеру порции"""
+    def __init__(self, sensors, threshold=None, max_hold=MAX_HOLD, frame_period=FRAME_PERIOD):
+        self.sensors = list(sensors)
+        self.threshold = threshold
+        self.max_hold = max_hold
+        self.frame_period = frame_period
+        self.stats = [SensorStats() for _ in self.sensors]
+        self.delta = Moments()
+        self.rows = 0
+        self.first_time = None
+        self.last_time = None
+        # Последняя строка предыдущей порции (для интервалов и разностей на стыке)
+        self.tail = None
+
+    def add_chunk(self, times, temps, res):
+        if times.size == 0:
+            return
+        self.rows += int(times.size)
+        if self.first_time is None:
+            self.first_time = float(times[0])
+        self.last_time = float(times[-1])
+
+        if self.tail is not None:
+            prev_time, prev_temps, prev_res = self.tail
+            times_ext = np.concatenate(([prev_time], times))
+            temps_ext = np.concatenate((prev_temps[:, None], temps), axis=1)
+            res_ext = np.concatenate((prev_res[:, None], res), axis=1)
+        else:
+            times_ext, temps_ext, res_ext = times, temps, res
+        self.tail = (times[-1], temps[:, -1].copy(), res[:, -1].copy())
+
+        # Длительность действия показания: до следующей строки, с ограничением
+        hold = np.minimum(np.diff(times_ext), self.max_hold)
+        # Журнал пишет строку только при изменении: строка, действовавшая n кадров,
+        # стоит за n одинаковыми кадрами. Строка учитывается один раз при приходе,
+        # остальные n - 1 кадров - когда пришла следующая (последняя строка - один
+        # кадр, как в rollups.rebuild_from_log)
+        repeats = np.maximum(np.rint(hold / self.frame_period) - 1, 0).astype(np.int64)
+
+        for i, stats in enumerate(self.stats):
+            values = temps[i]
+            valid = ~np.isnan(values)
+            good = values[valid]
+            stats.errors += int((~valid).sum())
+            held = temps_ext[i, :-1]
+            held_valid = ~np.isnan(held)
+            stats.moments.add(good)
+            stats.moments.add(held[held_valid], repeats[held_valid])
+            stats.histogram += _histogram(good) + _histogram(held[held_valid], repeats[held_valid])
+
+            # Время выше порога: показание i действует до строки i + 1
+            stats.time_total += float(hold[held_valid].sum())
+            if self.threshold is not None:
+                stats.time_above += float(hold[held_valid & (held > self.threshold)].sum())
+
+            # Шум: разности соседних кадров с одинаковым разрешением - изменения
+            # между строками и нулевые разности внутри каждой строки
+            a, b = temps_ext[i, :-1], temps_ext[i, 1:]
+            ra, rb = res_ext[i, :-1], res_ext[i, 1:]
+            pair = ~np.isnan(a) & ~np.isnan(b) & (ra == rb) & (ra > 0)
+            diffs = (b - a)[pair]
+            pair_res = ra[pair]
+            held = ~np.isnan(a) & (ra > 0)
+            for bits in np.unique(ra[held]):
+                moments = stats.noise.setdefault(int(bits), Moments())
+                moments.add(diffs[pair_res == bits])
+                moments.add_constant(0.0, repeats[held & (ra == bits)].sum())
+
+        if len(self.sensors) >= 2:
+            delta = temps[0] - temps[1]
+            self.delta.add(delta[~np.isnan(delta)])
+            held_delta = temps_ext[0, :-1] - temps_ext[1, :-1]
+            held_valid = ~np.isnan(held_delta)
+            self.delta.add(held_delta[held_valid], repeats[held_valid])
+
+    def report(self):
+        result = {
+            "rows": self.rows,
+            "from": _format_epoch(self.first_time),
+            "to": _format_epoch(self.last_time),
+            "threshold": self.threshold,
+            "sensors": {},
+        }
+        for sensor, stats in zip(self.sensors, self.stats):
+            noise = {}
+            for bits, moments in sorted(stats.noise.items()):
+                std = moments.std()
+                # Разность двух независимых показаний: sigma * sqrt(2)
+                noise[bits] = {"pairs": moments.count,
+                               "noise": None if std is None else round(std / np.sqrt(2), 5)}
+            result["sensors"][sensor] = {
+                **stats.moments.as_dict(),
+                "errors": stats.errors,
+                "percentiles": stats.percentiles(),
+                "hours_total": round(stats.time_total / 3600.0, 3),
+                "hours_above": round(stats.time_above / 3600.0, 3) if self.threshold is not None else None,
+                "noise_by_resolution": noise,
+            }
+        if len(self.sensors) >= 2:
+            result["delta"] = {"sensors": self.sensors[:2], **self.delta.as_dict()}
+        return result
+
+
+def _histogram(values, weights=None):
+    """Счетчики по сетке TEMP_STEP; weights - повторы каждого значения"""
+    bins = np.rint((values - TEMP_MIN) / TEMP_STEP).astype(np.int64).clip(0, BINS - 1)
+    return np.bincount(bins, weights=weights, minlength=BINS).astype(np.int64)
+
+
+def _format_epoch(value):
+    if value is None:
+        return None
+    return str(np.datetime64(int(value * 1000), "ms").astype("datetime64[s]")).replace("T", " ")
+
+
+def analyze_log(path, sensors, start=None, end=None, threshold=None, chunk_size=CHUNK_SIZE, max_hold=MAX_HOLD):
+    """Отчет по журналу за интервал: закрытые сутки - из архива, остальное - из xlsx"""
+    from archive import iter_history_chunks
+
+    columns = []
+    for sensor_num in sensors:
+        temp_col, _, res_col = sensor_columns(sensor_num)
+        columns += [temp_col, res_col]
+
+    analytics = HistoryAnalytics(sensors, threshold, max_hold)
+    for chunk in iter_history_chunks(path, columns, start, end, chunk_size):
+        analytics.add_chunk(*chunk_to_arrays(chunk, sensors))
+    return analytics.report()
+
+
+def format_report(report):
+    """Отчет в текстовом виде"""
+    lines = [f"Строк: {report['rows']}  ({report['from']} — {report['to']})"]
+    for sensor, s in report["sensors"].items():
+        lines.append("")
+        lines.append(f"Датчик {sensor}: показаний {s['count']}, ошибок {s['errors']}")
+        if s["count"]:
+            lines.append(f"  среднее {s['mean']:.4f} °C, СКО {s['std'] or 0:.4f}, "
+                         f"мин {s['min']:.4f}, макс {s['max']:.4f}")
+            lines.append("  перцентили: " + ", ".join(f"p{p}={v}" for p, v in s["percentiles"].items()))
+        lines.append(f"  охвачено часов: {s['hours_total']}")
+        if s["hours_above"] is not None:
+            lines.append(f"  выше {report['threshold']} °C: {s['hours_above']} ч")
+        for bits, n in s["noise_by_resolution"].items():
+            noise = "---" if n["noise"] is None else f"{n['noise']:.5f} °C"
+            lines.append(f"  шум при {bits} бит: {noise} (пар: {n['pairs']})")
+    if "delta" in report:
+        d = report["delta"]
+        lines.append("")
+        lines.append(f"Разность датчик {d['sensors'][0]} - датчик {d['sensors'][1]}: пар {d['count']}")
+        if d["count"]:
+            lines.append(f"  среднее {d['mean']:.4f} °C, СКО {d['std'] or 0:.4f}, мин {d['min']:.4f}, макс {d['max']:.4f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Статистика по истории температуры DS18B20")
+    parser.add_argument("-i", "--input", default=LOG_FILE, help="журнал Excel (по умолчанию temperature_log.xlsx)")
+    parser.add_argument("--from", dest="start", type=parse_bound, help="начало интервала")
+    parser.add_argument("--to", dest="end", type=parse_bound, help="конец интервала (не включая)")
+    parser.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    parser.add_argument("-t", "--threshold", type=float, help="порог для расчета времени выше порога, °C")
+    parser.add_argument("--max-hold", type=float, default=MAX_HOLD,
+                        help="максимальная длительность действия одного показания, с")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="размер порции строк")
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        report = analyze_log(args.input, args.sensors, args.start, args.end,
+                             args.threshold, args.chunk_size, args.max_hold)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Ошибка анализа: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
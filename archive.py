@@ -0,0 +1,542 @@
+import os
+import sys
+import json
+import zlib
+import queue
+import sqlite3
+import argparse
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+from export_log import (LOG_FILE, TIME_FORMAT, CHUNK_SIZE, WRITERS, FORMATS, TIME_COLUMN,
+                        sensor_columns, iter_log_chunks, parse_bound, to_number, detect_format)
+from sinks import rotated_logs
+
+# Строк в блоке архива (последний блок периода может быть короче)
+CHUNK_ROWS = 4096
+
+# Температура хранится в единицах датчика 1/16 °C; ERROR и "---" - отдельными значениями
+TEMP_SCALE = 16
+TEMP_ERROR = -32768
+TEMP_EMPTY = -32767
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def archive_path_for(log_file):
+    """Архив рядом с журналом: temperature_log.xlsx -> temperature_log.archive.db"""
+    return os.path.splitext(log_file)[0] + ".archive.db"
+
+
+def to_seconds(text):
+    """Время журнала -> секунды от 1970-01-01 (местное время без поясов, как в журнале)"""
+    return int((datetime.strptime(text, TIME_FORMAT) - EPOCH).total_seconds())
+
+
+def from_seconds(seconds):
+    return (EPOCH + timedelta(seconds=seconds)).strftime(TIME_FORMAT)
+
+
+def encode_temp(value):
+    temp = to_number(value)
+    if temp is None:
+        return TEMP_ERROR if value == "ERROR" else TEMP_EMPTY
+    return max(-32766, min(32767, int(round(temp * TEMP_SCALE))))
+
+
+def decode_temp(raw):
+    return None if raw <= TEMP_EMPTY else raw / TEMP_SCALE
+
+
+def _little_endian(arr):
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+class ChunkInfo:
+    """Запись индекса: диапазон времени, число строк, по датчику (мин, макс, ошибок),
+    число строк с ошибкой хотя бы одного датчика"""
+    __slots__ = ("id", "start", "end", "rows", "stats", "errors")
+
+    def __init__(self, id, start, end, rows, stats, errors):
+        self.id = id
+        self.start = start
+        self.end = end
+        self.rows = rows
+        self.stats = stats
+        self.errors = errors
+
+
+class Chunk:
+    """Раскодированный блок: время (с), температуры и разрешения по датчикам"""
+    __slots__ = ("times", "temps", "res")
+
+    def __init__(self, times, temps, res):
+        self.times = times
+        self.temps = temps
+        self.res = res
+
+    def row(self, i, sensors):
+        """Строка в виде журнала: время, затем (температура, статус, разрешение) по датчикам"""
+        values = [from_seconds(self.times[i])]
+        for sensor in sensors:
+            raw = self.temps[sensor][i]
+            res = self.res[sensor][i]
+            res = str(res) if res else None
+            if raw == TEMP_ERROR:
+                values += ["ERROR", "ERROR", res]
+            elif raw == TEMP_EMPTY:
+                values += ["---", "OK", res]
+            else:
+                values += [raw / TEMP_SCALE, "OK", res]
+        return tuple(values)
+
+
+def encode_chunk(times, temps, res, sensors):
+    """Колонки блока: разности времени (uint32), температуры (int16), разрешения (uint8); zlib"""
+    deltas = array("I", [0] + [b - a for a, b in zip(times, times[1:])])
+    parts = [_little_endian(deltas).tobytes()]
+    for sensor in sensors:
+        parts.append(_little_endian(array("h", temps[sensor])).tobytes())
+    for sensor in sensors:
+        parts.append(array("B", res[sensor]).tobytes())
+    return zlib.compress(b"".join(parts), 9)
+
+
+def decode_chunk(data, start, rows, sensors):
+    raw = zlib.decompress(data)
+    offset = 0
+
+    deltas = array("I")
+    deltas.frombytes(raw[offset:offset + 4 * rows])
+    _little_endian(deltas)
+    offset += 4 * rows
+    times = []
+    current = start
+    for delta in deltas:
+        current += delta
+        times.append(current)
+
+    temps, res = {}, {}
+    for sensor in sensors:
+        column = array("h")
+        column.frombytes(raw[offset:offset + 2 * rows])
+        temps[sensor] = _little_endian(column)
+        offset += 2 * rows
+    for sensor in sensors:
+        column = array("B")
+        column.frombytes(raw[offset:offset + rows])
+        res[sensor] = column
+        offset += rows
+    return Chunk(times, temps, res)
+
+
+class Archive:
+    """Сжатый архив закрытых периодов журнала.
+
+    Строки хранятся блоками по CHUNK_ROWS в колонках: время разностями
+    от начала блока, температуры - целыми в единицах 1/16 °C, разрешения -
+    байтами; блок сжимается zlib. Индекс блоков (начало, конец, число строк,
+    мин/макс и число ошибок по датчикам) лежит в той же базе SQLite, поэтому
+    запрос за интервал распаковывает только пересекающиеся блоки.
+    """
+    def __init__(self, path, sensors=(1, 2)):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                stats TEXT NOT NULL,
+                errors INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS chunks_time ON chunks (start, end)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'sensors'").fetchone()
+        if row is None:
+            self.sensors = list(sensors)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('sensors', ?)", (json.dumps(self.sensors),))
+        else:
+            self.sensors = json.loads(row[0])
+        self.conn.commit()
+
+    def last_time(self):
+        """Время последней строки архива (с) или None"""
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(end) FROM chunks").fetchone()
+        return row[0]
+
+    def total_rows(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(rows), 0) FROM chunks").fetchone()[0]
+
+    def add_chunk(self, times, temps, res, commit=True):
+        """Запись блока; times - секунды по возрастанию, temps/res - {датчик: список}"""
+        stats = {}
+        for sensor in self.sensors:
+            valid = [t for t in temps[sensor] if t > TEMP_EMPTY]
+            stats[sensor] = [min(valid) / TEMP_SCALE if valid else None,
+                             max(valid) / TEMP_SCALE if valid else None,
+                             temps[sensor].count(TEMP_ERROR)]
+        columns = [temps[sensor] for sensor in self.sensors]
+        errors = sum(1 for values in zip(*columns) if TEMP_ERROR in values)
+        data = encode_chunk(times, temps, res, self.sensors)
+        with self.lock:
+            self.conn.execute("INSERT INTO chunks (start, end, rows, stats, errors, data) VALUES (?, ?, ?, ?, ?, ?)",
+                              (times[0], times[-1], len(times), json.dumps(stats), errors, data))
+            if commit:
+                self.conn.commit()
+
+    def packed(self, path):
+        """Был ли файл журнала уже перенесен (имя, размер и время изменения совпадают)"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?",
+                                    ("packed:" + os.path.basename(path),)).fetchone()
+        return row is not None and row[0] == _file_stamp(path)
+
+    def commit_packed(self, path):
+        """Фиксация блоков файла журнала вместе с отметкой о его переносе"""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              ("packed:" + os.path.basename(path), _file_stamp(path)))
+            self.conn.commit()
+
+    def rollback(self):
+        with self.lock:
+            self.conn.rollback()
+
+    def chunks(self, start=None, end=None):
+        """Индекс блоков, пересекающихся с [start, end) (секунды)"""
+        query = "SELECT id, start, end, rows, stats, errors FROM chunks"
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("end >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("start < ?")
+            params.append(end)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY start"
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [ChunkInfo(id, s, e, n, {int(k): v for k, v in json.loads(stats).items()}, errors)
+                for id, s, e, n, stats, errors in rows]
+
+    def read_chunk(self, info):
+        """Распаковка блока по записи индекса"""
+        with self.lock:
+            data = self.conn.execute("SELECT data FROM chunks WHERE id = ?", (info.id,)).fetchone()[0]
+        return decode_chunk(data, info.start, info.rows, self.sensors)
+
+    def iter_rows(self, sensors=None, start=None, end=None, chunk_size=CHUNK_SIZE):
+        """Порции строк в виде журнала (время, температура, статус, разрешение...) за [start, end)"""
+        sensors = sensors or self.sensors
+        start_s = to_seconds(start) if start else None
+        end_s = to_seconds(end) if end else None
+        out = []
+        for info in self.chunks(start_s, end_s):
+            chunk = self.read_chunk(info)
+            for i, moment in enumerate(chunk.times):
+                if start_s is not None and moment < start_s:
+                    continue
+                if end_s is not None and moment >= end_s:
+                    break
+                out.append(chunk.row(i, sensors))
+                if len(out) >= chunk_size:
+                    yield out
+                    out = []
+        if out:
+            yield out
+
+    def size(self):
+        """Размер сжатых данных, байт"""
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def pack_file(archive, path, chunk_rows=CHUNK_ROWS):
+    """Перенос закрытого журнала в архив: блоки и отметка - одной транзакцией, затем файл удаляется.
+
+    Возвращает число строк. Если программа прервется после фиксации, но
+    до удаления, отметка не даст перенести файл второй раз.
+    """
+    if archive.packed(path):
+        os.remove(path)
+        return 0
+
+    columns = []
+    for sensor in archive.sensors:
+        temp_col, _, res_col = sensor_columns(sensor)
+        columns += [temp_col, res_col]
+
+    times = []
+    temps = {sensor: [] for sensor in archive.sensors}
+    res = {sensor: [] for sensor in archive.sensors}
+    count = 0
+
+    def flush():
+        archive.add_chunk(times, temps, res, commit=False)
+        times.clear()
+        for sensor in archive.sensors:
+            temps[sensor].clear()
+            res[sensor].clear()
+
+    try:
+        for chunk in iter_log_chunks(path, columns):
+            for row in chunk:
+                moment = to_seconds(row[0])
+                if times and moment < times[-1]:
+                    # Часы компьютера перевели назад: время в блоке должно только расти
+                    moment = times[-1]
+                times.append(moment)
+                for i, sensor in enumerate(archive.sensors):
+                    temps[sensor].append(encode_temp(row[1 + 2 * i]))
+                    try:
+                        res[sensor].append(int(row[2 + 2 * i]))
+                    except (TypeError, ValueError):
+                        res[sensor].append(0)
+                count += 1
+                if len(times) >= chunk_rows:
+                    flush()
+        if times:
+            flush()
+        archive.commit_packed(path)
+    except BaseException:
+        archive.rollback()
+        raise
+    os.remove(path)
+    return count
+
+
+def pack_log(archive, log_file, chunk_rows=CHUNK_ROWS):
+    """Перенос в архив закрытых журналов (их ротирует ExcelSink); возвращает число строк"""
+    return sum(pack_file(archive, path, chunk_rows) for path in rotated_logs(log_file))
+
+
+def iter_history_chunks(log_file, columns, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """История целиком, как iter_log_chunks: архив, затем еще не перенесенные журналы.
+
+    Из xlsx читаются только закрытые журналы, которые архив еще не забрал,
+    и журнал текущих суток. Колонок времени и задержки записи в архиве нет,
+    для его строк они равны None. Если журнал успели перенести в архив во
+    время чтения, его строки берутся из архива.
+    """
+    path = archive_path_for(log_file)
+    archive = Archive(path) if os.path.exists(path) else None
+    last = None
+
+    def from_archive(lower):
+        fields = _archive_fields(columns, archive.sensors)
+        for rows in archive.iter_rows(archive.sensors, lower, end, chunk_size):
+            yield [(row[0],) + tuple(None if i is None else row[i] for i in fields) for row in rows]
+
+    try:
+        pending = rotated_logs(log_file)
+        sources = [None] if archive is not None else []
+        sources += [log for log in pending if archive is None or not archive.packed(log)]
+        sources.append(log_file)
+        for source in sources:
+            if source is None or not os.path.exists(source):
+                if archive is None:
+                    continue
+                lower = start if last is None else from_seconds(to_seconds(last) + 1)
+                if start is not None and lower < start:
+                    lower = start
+                chunks = from_archive(lower)
+            else:
+                chunks = iter_log_chunks(source, columns, start, end, chunk_size)
+            for chunk in chunks:
+                if chunk:
+                    last = chunk[-1][0]
+                    yield chunk
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def last_logged_time(log_file):
+    """Время последней записанной строки: журнал текущих суток, закрытые журналы, затем архив"""
+    for path in [log_file] + rotated_logs(log_file)[::-1]:
+        if not os.path.exists(path):
+            continue
+        last = None
+        for chunk in iter_log_chunks(path, []):
+            last = chunk[-1][0]
+        if last is not None:
+            return last
+    path = archive_path_for(log_file)
+    if not os.path.exists(path):
+        return None
+    archive = Archive(path)
+    try:
+        last = archive.last_time()
+    finally:
+        archive.close()
+    return from_seconds(last) if last is not None else None
+
+
+def _archive_fields(columns, sensors):
+    """Колонки журнала -> позиции в строке Archive.iter_rows (None - колонки нет в архиве)"""
+    positions = {}
+    for n, sensor in enumerate(sensors):
+        for k, column in enumerate(sensor_columns(sensor)):
+            positions[column] = 1 + 3 * n + k
+    fields = []
+    for column in columns:
+        if column in positions:
+            fields.append(positions[column])
+        elif column.startswith('Датчик '):
+            raise KeyError(f"в архиве нет колонки: {column}")
+        else:
+            fields.append(None)
+    return fields
+
+
+class Archiver:
+    """Перенос закрытых журналов в архив в отдельном потоке.
+
+    submit() только ставит задание в очередь; поток забирает все
+    ротированные журналы (и оставшиеся с прошлого запуска, при старте),
+    после каждого прохода вызывает on_packed(count, error).
+    """
+    def __init__(self, log_file, path=None, sensors=(1, 2)):
+        self.log_file = log_file
+        self.path = path or archive_path_for(log_file)
+        self.sensors = sensors
+        self.queue = queue.Queue()
+        self.thread = None
+        self.on_packed = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="archiver", daemon=True)
+        self.thread.start()
+        self.submit()
+
+    def submit(self, path=None):
+        """Новый закрытый журнал (path - для справки, переносятся все ожидающие)"""
+        self.queue.put(True)
+
+    def stop(self, timeout=5.0):
+        """Остановка после текущего переноса.
+
+        Файл фиксируется в архиве одной транзакцией, поэтому перенос,
+        прерванный выходом из программы, просто повторится при запуске.
+        """
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+    def run(self):
+        archive = Archive(self.path, self.sensors)
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                try:
+                    count, error = pack_log(archive, self.log_file), None
+                except Exception as e:
+                    count, error = 0, e
+                if self.on_packed is not None:
+                    self.on_packed(count, error)
+        finally:
+            archive.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сжатый архив журнала температуры")
+    parser.add_argument("-i", "--input", default=LOG_FILE, help="журнал Excel (по умолчанию temperature_log.xlsx)")
+    parser.add_argument("-a", "--archive", help="файл архива (по умолчанию рядом с журналом)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pack = sub.add_parser("pack", help="перенести закрытые журналы (temperature_log.<дата>.xlsx) в архив")
+    pack.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2],
+                      help="номера датчиков (с 1) для нового архива")
+    pack.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="строк в блоке")
+
+    query = sub.add_parser("query", help="выгрузить строки архива за интервал")
+    query.add_argument("-o", "--output", help="выходной файл (по умолчанию stdout для csv/jsonl)")
+    query.add_argument("-f", "--format", choices=FORMATS, help="формат выгрузки (по умолчанию по расширению)")
+    query.add_argument("--from", dest="start", type=parse_bound, help="начало интервала")
+    query.add_argument("--to", dest="end", type=parse_bound, help="конец интервала (не включая)")
+    query.add_argument("-s", "--sensors", type=int, nargs="+", help="номера датчиков (с 1)")
+
+    sub.add_parser("info", help="сведения об архиве и блоках")
+    args = parser.parse_args(argv)
+
+    path = args.archive or archive_path_for(args.input)
+    if args.command != "pack" and not os.path.exists(path):
+        print(f"Ошибка: архив {path} не найден", file=sys.stderr)
+        return 1
+    try:
+        archive = Archive(path, args.sensors if args.command == "pack" else (1, 2))
+    except sqlite3.Error as e:
+        print(f"Ошибка открытия архива: {e}", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == "pack":
+            count = pack_log(archive, args.input, args.chunk_rows)
+            print(f"Перенесено строк: {count}", file=sys.stderr)
+        elif args.command == "query":
+            sensors = args.sensors or archive.sensors
+            missing = [s for s in sensors if s not in archive.sensors]
+            if missing:
+                raise KeyError(f"в архиве нет датчиков: {', '.join(map(str, missing))}")
+            columns = [TIME_COLUMN]
+            for sensor in sensors:
+                columns += sensor_columns(sensor)
+            writer = WRITERS[args.format or detect_format(args.output)](args.output, columns)
+            count = 0
+            try:
+                for chunk in archive.iter_rows(sensors, args.start, args.end):
+                    writer.write_chunk(chunk)
+                    count += len(chunk)
+            finally:
+                writer.close()
+            print(f"Выгружено строк: {count}", file=sys.stderr)
+        else:
+            infos = archive.chunks()
+            rows = sum(info.rows for info in infos)
+            size = archive.size()
+            print(f"Архив: {path}")
+            print(f"Блоков: {len(infos)}, строк: {rows}, сжатых данных: {size / 1024:.1f} КБ "
+                  f"({size / rows if rows else 0:.2f} байт/строку)")
+            if os.path.exists(args.input):
+                print(f"Журнал {args.input}: {os.path.getsize(args.input) / 1024:.1f} КБ")
+            for info in infos:
+                stats = ", ".join(f"датчик {sensor}: {low}..{high}, ошибок {errors}"
+                                  for sensor, (low, high, errors) in info.stats.items())
+                print(f"{from_seconds(info.start)} — {from_seconds(info.end)}\t{info.rows}\t{stats}")
+    except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+        print(f"Ошибка архива: {e}", file=sys.stderr)
+        return 1
+    finally:
+        archive.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
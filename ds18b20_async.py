@@ -0,0 +1,168 @@
+"""Асинхронный доступ к монитору DS18B20 без Qt.
+
+Пример:
+
+    async with open_stream("COM3") as stream:
+        await stream.set_resolution(0, 10)
+        async for event in stream:
+            if isinstance(event, Reading):
+                print(event.sensor, event.temp)
+"""
+import time
+import asyncio
+
+import serial
+
+from protocol import (parse_line, resolution_command, Reading, ResolutionChanged, Status,
+                      STATUS_NO_SENSORS, STATUS_LINE)
+from timebase import ArrivalClock
+
+__all__ = ["open_stream", "SensorStream", "Reading", "ResolutionChanged", "Status",
+           "STATUS_NO_SENSORS", "STATUS_LINE"]
+
+BAUDRATE = 9600
+# Период опроса порта, если у него нет файлового дескриптора (Windows, эмуляторы)
+POLL_INTERVAL = 0.01
+
+
+class SensorStream:
+    """Поток событий протокола из последовательного порта.
+
+    Чтение идет в цикле событий asyncio без потоков: на POSIX порт
+    регистрируется через loop.add_reader, иначе опрашивается таймером.
+    Итерация возвращает Reading, ResolutionChanged и Status.
+    """
+    def __init__(self, serial_port):
+        self.serial_port = serial_port
+        self.clock = ArrivalClock()
+        self.queue = asyncio.Queue()
+        self.buffer = ""
+        self.loop = None
+        self.poll_task = None
+        self.reader_fd = None
+        self.error = None
+        self.closed = False
+        # Ожидающие подтверждения смены разрешения: датчик -> [(бит, future)]
+        self.pending = {}
+        self.last_confirmation_latency = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is None:
+            if self.error is not None:
+                raise self.error
+            raise StopAsyncIteration
+        return event
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        fileno = getattr(self.serial_port, "fileno", None)
+        try:
+            self.reader_fd = fileno() if fileno else None
+            self.loop.add_reader(self.reader_fd, self._on_readable)
+        except (NotImplementedError, TypeError, ValueError, OSError, AttributeError):
+            self.reader_fd = None
+            self.poll_task = self.loop.create_task(self._poll())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.reader_fd is not None:
+            self.loop.remove_reader(self.reader_fd)
+        if self.poll_task is not None:
+            self.poll_task.cancel()
+        for waiters in self.pending.values():
+            for _, future in waiters:
+                if not future.done():
+                    future.cancel()
+        try:
+            self.serial_port.close()
+        except Exception:
+            pass
+        self.queue.put_nowait(None)
+
+    async def _poll(self):
+        while not self.closed:
+            self._on_readable()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _on_readable(self):
+        try:
+            waiting = self.serial_port.in_waiting
+            if not waiting:
+                return
+            data = self.serial_port.read(waiting).decode('utf-8', 'ignore')
+        except Exception as e:
+            self.error = e
+            self.close()
+            return
+
+        received = self.clock.now()
+        self.buffer += data
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            line = line.strip()
+            if line:
+                for event in parse_line(line, received):
+                    if isinstance(event, ResolutionChanged):
+                        self._confirm(event)
+                    self.queue.put_nowait(event)
+
+    def _confirm(self, event):
+        waiters = self.pending.get(event.sensor, [])
+        for item in list(waiters):
+            bits, future = item
+            if bits == event.bits and not future.done():
+                future.set_result(event)
+                waiters.remove(item)
+
+    def send_command(self, cmd):
+        """Отправка команды прошивке"""
+        self.serial_port.write(f"{cmd}\n".encode())
+
+    async def set_resolution(self, sensor, bits, timeout=5.0):
+        """Смена разрешения датчика (с 0), завершается по подтверждению прошивки.
+
+        Возвращает событие ResolutionChanged, при отсутствии подтверждения
+        за timeout секунд возникает asyncio.TimeoutError.
+        """
+        cmd = resolution_command(sensor, bits)
+        if cmd is None:
+            raise ValueError(f"нет команды для датчика {sensor} и разрешения {bits} бит")
+
+        future = self.loop.create_future()
+        self.pending.setdefault(sensor, []).append((int(bits), future))
+        sent = time.monotonic()
+        self.send_command(cmd)
+        try:
+            event = await asyncio.wait_for(future, timeout)
+        finally:
+            waiters = self.pending.get(sensor, [])
+            if (int(bits), future) in waiters:
+                waiters.remove((int(bits), future))
+        self.last_confirmation_latency = event.received - sent
+        return event
+
+
+def open_stream(port, baudrate=BAUDRATE, serial_instance=None):
+    """Открытие порта (имя или URL pyserial, например 'loop://') как SensorStream.
+
+    Используется как асинхронный контекстный менеджер. Вместо имени можно
+    передать уже открытый объект с интерфейсом serial.Serial.
+    """
+    if serial_instance is None:
+        serial_instance = serial.serial_for_url(port, baudrate=baudrate, timeout=0)
+    return SensorStream(serial_instance)
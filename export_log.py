@@ -0,0 +1,279 @@
+import sys
+import argparse
+import csv
+import json
+import sqlite3
+from datetime import datetime
+from openpyxl import Workbook, load_workbook
+
+# Журнал, который ведет DS18B20Monitor
+LOG_FILE = "temperature_log.xlsx"
+TIME_COLUMN = 'Время'
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Размер порции строк при потоковом чтении/записи
+CHUNK_SIZE = 5000
+
+FORMATS = ("csv", "xlsx", "jsonl")
+
+
+def sensor_columns(sensor_num):
+    """Колонки журнала для датчика (нумерация с 1, как в интерфейсе)"""
+    return [f'Датчик {sensor_num} Температура (°C)',
+            f'Датчик {sensor_num} Статус',
+            f'Датчик {sensor_num} Разрешение (бит)']
+
+
+def format_time(value):
+    """Приведение значения времени из журнала к строке TIME_FORMAT"""
+    if isinstance(value, datetime):
+        return value.strftime(TIME_FORMAT)
+    if value is None:
+        return None
+    return str(value)
+
+
+def parse_bound(text):
+    """Разбор границы интервала: дата или дата со временем"""
+    for fmt in (TIME_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).strftime(TIME_FORMAT)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"неверный формат времени: {text}")
+
+
+def read_log_header(path):
+    """Заголовок журнала (первая строка листа)"""
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        for row in ws.iter_rows(min_row=1, max_row=1, values_only=True):
+            return [str(v) if v is not None else "" for v in row]
+        return []
+    finally:
+        wb.close()
+
+
+def iter_log_chunks(path, columns, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Потоковое чтение журнала порциями по chunk_size строк.
+
+    Возвращает списки кортежей со значениями columns, первой всегда идет
+    колонка времени. Журнал дописывается только в конец, поэтому строки
+    упорядочены по времени: после конца интервала чтение прекращается.
+    Время хранится строкой в формате TIME_FORMAT, поэтому границы
+    сравниваются как строки без разбора дат.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(v) if v is not None else "" for v in header]
+
+        missing = [c for c in [TIME_COLUMN] + list(columns) if c not in header]
+        if missing:
+            raise KeyError(f"в журнале нет колонок: {', '.join(missing)}")
+
+        time_idx = header.index(TIME_COLUMN)
+        indexes = [header.index(c) for c in columns]
+        width = len(header)
+
+        chunk = []
+        for row in rows:
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+
+            current_time = format_time(row[time_idx])
+            if current_time is None:
+                continue
+            if start is not None and current_time < start:
+                continue
+            if end is not None and current_time >= end:
+                break
+
+            chunk.append((current_time,) + tuple(row[i] for i in indexes))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+    finally:
+        wb.close()
+
+
+def to_number(value):
+    """Температура в виде числа, None для 'ERROR' и пустых ячеек"""
+    if value is None or value == "ERROR" or value == "---":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CsvWriter:
+    """Запись в CSV"""
+    def __init__(self, output, columns):
+        self.file = open(output, "w", newline="", encoding="utf-8") if output else sys.stdout
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_chunk(self, chunk):
+        self.writer.writerows(chunk)
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+class XlsxWriter:
+    """Запись в xlsx в режиме write-only (строки сразу уходят во временный поток)"""
+    def __init__(self, output, columns):
+        if not output:
+            raise ValueError("для формата xlsx нужно указать выходной файл")
+        self.output = output
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Температура")
+        self.ws.append(columns)
+
+    def write_chunk(self, chunk):
+        for row in chunk:
+            self.ws.append(row)
+
+    def close(self):
+        self.wb.save(self.output)
+
+
+class JsonLinesWriter:
+    """Запись в JSON Lines, температуры записываются числами"""
+    def __init__(self, output, columns):
+        self.file = open(output, "w", encoding="utf-8") if output else sys.stdout
+        self.columns = columns
+        self.temp_indexes = [i for i, c in enumerate(columns) if 'Температура' in c]
+
+    def write_chunk(self, chunk):
+        if not chunk:
+            return
+        lines = []
+        for row in chunk:
+            row = list(row)
+            for i in self.temp_indexes:
+                row[i] = to_number(row[i])
+            lines.append(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False))
+        self.file.write("\n".join(lines) + "\n")
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter, "jsonl": JsonLinesWriter}
+
+
+def export_log(path, output, fmt, sensors, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Выгрузка интервала журнала для выбранных датчиков, возвращает число строк.
+
+    Закрытые сутки читаются из архива (archive.py), где распаковываются
+    только блоки, пересекающие интервал; из xlsx - лишь журналы, которые
+    архив еще не забрал, и журнал текущих суток.
+    """
+    from archive import iter_history_chunks
+
+    columns = []
+    for sensor_num in sensors:
+        columns += sensor_columns(sensor_num)
+
+    writer = WRITERS[fmt](output, [TIME_COLUMN] + columns)
+    count = 0
+    try:
+        for chunk in iter_history_chunks(path, columns, start, end, chunk_size):
+            writer.write_chunk(chunk)
+            count += len(chunk)
+    finally:
+        writer.close()
+    return count
+
+
+def export_rollups(path, output, fmt, sensors, granularity, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Выгрузка агрегатов (rollups.py) вместо сырых строк, возвращает число интервалов"""
+    from rollups import RollupStore, rollup_path_for
+
+    columns = ['Интервал']
+    for sensor_num in sensors:
+        columns += [f'Датчик {sensor_num} Количество', f'Датчик {sensor_num} Среднее (°C)',
+                    f'Датчик {sensor_num} Мин (°C)', f'Датчик {sensor_num} Макс (°C)']
+    positions = {sensor_num: 1 + 4 * i for i, sensor_num in enumerate(sensors)}
+
+    store = RollupStore(rollup_path_for(path))
+    writer = WRITERS[fmt](output, columns)
+    count = 0
+    current = None
+    try:
+        for rows in store.iter_chunks(granularity, sensors, start, end, chunk_size):
+            chunk = []
+            for bucket, sensor, n, mean, low, high in rows:
+                # Строки упорядочены по интервалу: собираем широкую строку по всем датчикам
+                if current is None or current[0] != bucket:
+                    if current is not None:
+                        chunk.append(tuple(current))
+                    current = [bucket] + [None] * (len(columns) - 1)
+                pos = positions[sensor]
+                current[pos:pos + 4] = [n, round(mean, 4), low, high]
+            writer.write_chunk(chunk)
+            count += len(chunk)
+        if current is not None:
+            writer.write_chunk([tuple(current)])
+            count += 1
+    finally:
+        writer.close()
+        store.close()
+    return count
+
+
+def detect_format(output):
+    """Определение формата по расширению выходного файла"""
+    if output:
+        ext = output.rsplit(".", 1)[-1].lower()
+        if ext in FORMATS:
+            return ext
+        if ext in ("json", "ndjson"):
+            return "jsonl"
+    return "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка истории температуры DS18B20")
+    parser.add_argument("-i", "--input", default=LOG_FILE, help="журнал Excel (по умолчанию temperature_log.xlsx)")
+    parser.add_argument("-o", "--output", help="выходной файл (по умолчанию stdout для csv/jsonl)")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="формат выгрузки (по умолчанию по расширению)")
+    parser.add_argument("--from", dest="start", type=parse_bound, help="начало интервала, YYYY-MM-DD[ HH:MM[:SS]]")
+    parser.add_argument("--to", dest="end", type=parse_bound, help="конец интервала (не включая)")
+    parser.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    parser.add_argument("-r", "--rollup", choices=("minute", "hour", "day"),
+                        help="выгрузить агрегаты за интервалы вместо сырых строк")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="размер порции строк")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.output)
+
+    try:
+        if args.rollup:
+            count = export_rollups(args.input, args.output, fmt, args.sensors, args.rollup,
+                                   args.start, args.end, args.chunk_size)
+        else:
+            count = export_log(args.input, args.output, fmt, args.sensors,
+                               args.start, args.end, args.chunk_size)
+    except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+        print(f"Ошибка выгрузки: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Выгружено строк: {count}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import json
+import socket
+import selectors
+import threading
+
+from protocol import parse_line, Reading, ResolutionChanged, STATUS_NO_SENSORS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Предел неотправленных данных на клиента: медленный клиент отключается
+MAX_CLIENT_BUFFER = 256 * 1024
+
+
+def line_messages(line, timestamp):
+    """Сообщения для рассылки по строке прошивки (номера датчиков с 1)"""
+    messages = []
+    for event in parse_line(line):
+        if isinstance(event, Reading):
+            messages.append({"type": "reading", "time": timestamp, "sensor": event.sensor + 1, "temp": event.temp})
+        elif isinstance(event, ResolutionChanged):
+            messages.append({"type": "resolution", "time": timestamp, "sensor": event.sensor + 1, "bits": event.bits})
+        elif event.kind == STATUS_NO_SENSORS:
+            messages.append({"type": "status", "time": timestamp, "sensor": None, "working": False})
+    return messages
+
+
+class Client:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.out = bytearray()
+        self.inp = bytearray()
+        self.dropped = False
+
+
+class FanoutServer:
+    """Локальный TCP-сервер, рассылающий показания всем подписчикам.
+
+    Протокол - JSON по строке на сообщение. Каждому клиенту отводится свой
+    ограниченный буфер: если клиент не успевает читать и буфер переполнен,
+    клиент отключается, а поток чтения порта никогда не ждет сеть.
+    Клиент может прислать {"cmd": "set_resolution", "sensor": 1, "bits": 10},
+    команда передается в on_command владельца порта.
+    """
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, on_command=None, max_buffer=MAX_CLIENT_BUFFER):
+        self.host = host
+        self.port = port
+        self.on_command = on_command
+        self.max_buffer = max_buffer
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.selector = selectors.DefaultSelector()
+        self.thread = None
+        self.running = False
+        self.dropped_clients = 0
+        self.server_sock = None
+        self.wake_r = self.wake_w = None
+
+    def start(self):
+        self.server_sock = socket.create_server((self.host, self.port))
+        self.server_sock.setblocking(False)
+        # Реальный порт (если был указан 0)
+        self.port = self.server_sock.getsockname()[1]
+        self.selector.register(self.server_sock, selectors.EVENT_READ, None)
+
+        # Пробуждение потока сервера при публикации
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, "wake")
+
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            self._drop(client)
+        for sock in (self.server_sock, self.wake_r, self.wake_w):
+            if sock is not None:
+                sock.close()
+        self.selector.close()
+
+    def wake(self):
+        try:
+            self.wake_w.send(b"\0")
+        except (OSError, AttributeError):
+            pass
+
+    def client_count(self):
+        with self.lock:
+            return len(self.clients)
+
+    def publish(self, message):
+        """Рассылка сообщения всем клиентам (можно вызывать из любого потока)"""
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            if not self.clients:
+                return
+            for client in self.clients.values():
+                if client.dropped:
+                    continue
+                if len(client.out) + len(data) > self.max_buffer:
+                    client.dropped = True
+                else:
+                    client.out += data
+        self.wake()
+
+    def publish_line(self, line, timestamp):
+        """Рассылка декодированных данных строки прошивки"""
+        for message in line_messages(line, timestamp):
+            self.publish(message)
+
+    def _drop(self, client):
+        with self.lock:
+            for key, value in list(self.clients.items()):
+                if value is client:
+                    del self.clients[key]
+            try:
+                self.selector.unregister(client.sock)
+            except (KeyError, ValueError):
+                pass
+            client.sock.close()
+
+    def _reply(self, client, message):
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            client.out += data
+
+    def _handle_command(self, client, text):
+        try:
+            request = json.loads(text)
+            if request.get("cmd") != "set_resolution":
+                raise ValueError(f"неизвестная команда: {request.get('cmd')}")
+            sensor = int(request["sensor"])
+            bits = int(request["bits"])
+            ok = bool(self.on_command(sensor, bits)) if self.on_command else False
+            self._reply(client, {"type": "command", "ok": ok, "sensor": sensor, "bits": bits})
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(client, {"type": "command", "ok": False, "error": str(e)})
+
+    def serve(self):
+        while self.running:
+            # Интерес к записи только у клиентов с неотправленными данными
+            with self.lock:
+                for client in self.clients.values():
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.out else 0)
+                    self.selector.modify(client.sock, events, client)
+                dropped = [c for c in self.clients.values() if c.dropped]
+            for client in dropped:
+                self.dropped_clients += 1
+                self._drop(client)
+
+            for key, mask in self.selector.select(timeout=1.0):
+                if key.data is None:
+                    self._accept()
+                elif key.data == "wake":
+                    try:
+                        while self.wake_r.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+                    if mask & selectors.EVENT_WRITE and client.sock.fileno() >= 0:
+                        self._write(client)
+
+    def _accept(self):
+        try:
+            sock, address = self.server_sock.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        client = Client(sock, address)
+        with self.lock:
+            self.clients[sock.fileno()] = client
+            self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client)
+            return
+
+        client.inp += data
+        while b"\n" in client.inp:
+            line, _, rest = bytes(client.inp).partition(b"\n")
+            client.inp = bytearray(rest)
+            if line.strip():
+                self._handle_command(client, line.decode("utf-8", "ignore"))
+        if len(client.inp) > self.max_buffer:
+            client.dropped = True
+
+    def _write(self, client):
+        with self.lock:
+            data = bytes(client.out)
+        try:
+            sent = client.sock.send(data)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(client)
+            return
+        with self.lock:
+            del client.out[:sent]
@@ -0,0 +1,286 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import pyqtSlot
+
+from simulator import SimulatedDevice, FaultInjector, SimulatedLink, FAULTS
+
+# Числа в строке так же, как их ищет DS18B20Monitor.parse_temperature
+NUMBER_RE = re.compile(r'-?\d+\.\d+')
+
+SIM_PORT = "SIM"
+
+
+def frame_temperature(sensor, seq, now):
+    """Температура, по которой однозначно восстанавливается номер кадра"""
+    return 20.0 + 20.0 * sensor + (seq % 256) * 0.0625
+
+
+def frame_key(values):
+    return tuple(values[sensor] for sensor in sorted(values))
+
+
+def attach_link(window, link):
+    """Подключение окна к симулятору: фабрика порта и пункт SIM в списке портов"""
+    window.serial_factory = link
+    window.port_combo.addItem(SIM_PORT, SIM_PORT)
+    window.port_combo.setCurrentIndex(window.port_combo.count() - 1)
+
+
+def make_monitor_class():
+    """Окно монитора с записью того, что оно показало и когда обнаружило ошибку"""
+    from gui import DS18B20Monitor
+
+    class HarnessMonitor(DS18B20Monitor):
+        def __init__(self, with_excel=False):
+            self.with_excel = with_excel
+            # (время, (температура 1, температура 2)) после каждой строки с числами
+            self.shown = []
+            self.read_errors = []
+            super().__init__()
+
+        @pyqtSlot(str, float)
+        def process_line(self, line, received=None):
+            super().process_line(line, received)
+            if NUMBER_RE.search(line):
+                self.shown.append((time.monotonic(), (self.sensor_data[0]["temp"], self.sensor_data[1]["temp"])))
+
+        @pyqtSlot()
+        def handle_read_error(self):
+            self.read_errors.append(time.monotonic())
+            super().handle_read_error()
+
+        def save_to_excel_if_changed(self, received=None):
+            # Запись журнала не относится к линии связи и искажает задержки
+            if self.with_excel:
+                super().save_to_excel_if_changed(received)
+
+    return HarnessMonitor
+
+
+class FaultTrial:
+    """Одно испытание: чистая линия, неисправность, восстановление"""
+    def __init__(self, fault, injected, cleared):
+        self.fault = fault
+        self.injected = injected
+        self.cleared = cleared
+        self.detect = None
+        self.recover = None
+        self.lost = 0
+        self.misparsed = 0
+        self.read_errors = 0
+        self.reconnects = 0
+
+    def evaluate(self, device, shown, read_errors, until, end):
+        """Разбор показанных до end значений против кадров, выданных до until"""
+        # Кадр, выданный до неисправности, может быть показан уже после ее начала
+        frames = {frame_key(values): (seq, stamp) for seq, stamp, values in device.emitted if stamp < end}
+        seen = set()
+        previous = None
+        first_misparse = None
+        for moment, key in shown:
+            if moment < self.injected or moment >= end or key == previous:
+                continue
+            previous = key
+            frame = frames.get(key)
+            if frame is None:
+                self.misparsed += 1
+                if first_misparse is None:
+                    first_misparse = moment
+                continue
+            seq, stamp = frame
+            seen.add(seq)
+            if self.recover is None and stamp >= self.cleared:
+                self.recover = moment - self.cleared
+
+        self.lost = sum(1 for seq, stamp in frames.values()
+                        if self.injected <= stamp < until and seq not in seen)
+        errors = [moment for moment in read_errors if self.injected <= moment < end]
+        self.read_errors = len(errors)
+        detected = [moment for moment in (first_misparse, errors[0] if errors else None) if moment is not None]
+        if detected:
+            self.detect = min(detected) - self.injected
+
+
+class FaultHarness:
+    """Прогон неисправностей через настоящий цикл чтения DS18B20Monitor.
+
+    Устройство (simulator.SimulatedDevice) выдает кадры с period секунд,
+    FaultInjector портит линию на duration секунд. Время обнаружения -
+    от начала неисправности до первой ошибки чтения или первого
+    неверного показания; время восстановления - от конца неисправности
+    до первого верного показания кадра, выданного после нее. Переподключение
+    в интерфейсе ручное, здесь оно нажимается каждые reconnect_interval с.
+    """
+    def __init__(self, app, period=0.1, settle=1.0, duration=1.0, timeout=5.0,
+                 reconnect_interval=0.2, seed=None, noise_rate=0.01, with_excel=False):
+        self.app = app
+        self.period = period
+        self.settle = settle
+        self.duration = duration
+        self.timeout = timeout
+        self.reconnect_interval = reconnect_interval
+        self.device = SimulatedDevice(period=period, temperature=frame_temperature)
+        self.injector = FaultInjector(seed=seed, noise_rate=noise_rate)
+        self.link = SimulatedLink(self.device, self.injector)
+        self.window = make_monitor_class()(with_excel=with_excel)
+        attach_link(self.window, self.link)
+        self.last_reconnect = 0.0
+        self.reconnects = 0
+
+    def pump(self, seconds, until=None):
+        """Обработка событий Qt заданное время или до выполнения условия"""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.app.processEvents()
+            self.press_reconnect()
+            if until is not None and until():
+                return True
+            time.sleep(0.002)
+        return False
+
+    def press_reconnect(self):
+        now = time.monotonic()
+        if self.window.reconnect_mode and now - self.last_reconnect >= self.reconnect_interval:
+            self.last_reconnect = now
+            self.reconnects += 1
+            self.window.reconnect()
+
+    def start(self):
+        self.window.connect()
+        if not self.window.is_connected:
+            raise RuntimeError("не удалось подключиться к симулятору")
+        self.pump(self.settle)
+
+    def run(self, fault):
+        self.pump(self.settle)
+        reconnects = self.reconnects
+        injected = time.monotonic()
+        self.injector.inject(fault)
+        self.pump(self.duration)
+        self.injector.clear()
+        cleared = time.monotonic()
+
+        trial = FaultTrial(fault, injected, cleared)
+        shown = self.window.shown
+
+        def recovered():
+            return any(moment > cleared and self._correct_after(key, cleared) for moment, key in shown[-5:])
+
+        self.pump(self.timeout, recovered)
+        until = time.monotonic()
+        # Еще пара периодов, чтобы догнали задержанные строки
+        self.pump(2 * self.period)
+        trial.evaluate(self.device, shown, self.window.read_errors, until, time.monotonic())
+        trial.reconnects = self.reconnects - reconnects
+        return trial
+
+    def _correct_after(self, key, cleared):
+        for seq, stamp, values in reversed(self.device.emitted):
+            if stamp < cleared:
+                return False
+            if frame_key(values) == key:
+                return True
+        return False
+
+    def close(self):
+        self.window.close()
+
+
+def summarize(trials):
+    """Сводка по видам неисправностей: медиана и максимум задержек, суммы потерь"""
+    summary = {}
+    for fault in dict.fromkeys(trial.fault for trial in trials):
+        group = [trial for trial in trials if trial.fault == fault]
+        detect = [t.detect for t in group if t.detect is not None]
+        recover = [t.recover for t in group if t.recover is not None]
+        summary[fault] = {
+            "trials": len(group),
+            "detected": len(detect),
+            "detect_median_ms": round(statistics.median(detect) * 1000, 1) if detect else None,
+            "detect_max_ms": round(max(detect) * 1000, 1) if detect else None,
+            "recovered": len(recover),
+            "recover_median_ms": round(statistics.median(recover) * 1000, 1) if recover else None,
+            "recover_max_ms": round(max(recover) * 1000, 1) if recover else None,
+            "lost": sum(t.lost for t in group),
+            "misparsed": sum(t.misparsed for t in group),
+            "read_errors": sum(t.read_errors for t in group),
+            "reconnects": sum(t.reconnects for t in group),
+        }
+    return summary
+
+
+def format_summary(summary):
+    def ms(value):
+        return "---" if value is None else f"{value:.1f}"
+
+    lines = ["Неисправность\tИспытаний\tОбнаружено\tОбнаружение мед/макс (мс)\t"
+             "Восстановлено\tВосстановление мед/макс (мс)\tПотеряно\tИскажено\tОшибок чтения\tПереподключений"]
+    for fault, s in summary.items():
+        lines.append(f"{fault}\t{s['trials']}\t{s['detected']}\t"
+                     f"{ms(s['detect_median_ms'])}/{ms(s['detect_max_ms'])}\t{s['recovered']}\t"
+                     f"{ms(s['recover_median_ms'])}/{ms(s['recover_max_ms'])}\t"
+                     f"{s['lost']}\t{s['misparsed']}\t{s['read_errors']}\t{s['reconnects']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Испытание чтения порта с внесением неисправностей линии")
+    parser.add_argument("-f", "--faults", nargs="+", choices=FAULTS, default=list(FAULTS),
+                        help="виды неисправностей")
+    parser.add_argument("-n", "--repeat", type=int, default=3, help="повторов каждой неисправности")
+    parser.add_argument("--period", type=float, default=0.1, help="период кадров симулятора, с")
+    parser.add_argument("--duration", type=float, default=1.0, help="длительность неисправности, с")
+    parser.add_argument("--settle", type=float, default=1.0, help="чистая линия перед неисправностью, с")
+    parser.add_argument("--timeout", type=float, default=5.0, help="ожидание восстановления, с")
+    parser.add_argument("--reconnect-interval", type=float, default=0.2,
+                        help="период нажатия 'Переподключиться' после потери связи, с")
+    parser.add_argument("--noise-rate", type=float, default=0.01, help="доля искаженных байт при noise")
+    parser.add_argument("--seed", type=int, help="начальное значение генератора неисправностей")
+    parser.add_argument("--with-excel", action="store_true", help="не отключать запись журнала Excel")
+    parser.add_argument("--json", action="store_true", help="вывести сводку в JSON")
+    args, qt_args = parser.parse_known_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication(sys.argv[:1] + qt_args)
+
+    # Журнал, агрегаты и файлы порогов создаются во временном каталоге
+    workdir = tempfile.TemporaryDirectory()
+    cwd = os.getcwd()
+    os.chdir(workdir.name)
+    trials = []
+    try:
+        harness = FaultHarness(app, args.period, args.settle, args.duration, args.timeout,
+                               args.reconnect_interval, args.seed, args.noise_rate, args.with_excel)
+        harness.start()
+        for _ in range(args.repeat):
+            for fault in args.faults:
+                trial = harness.run(fault)
+                trials.append(trial)
+                print(f"{fault}: обнаружение "
+                      f"{'---' if trial.detect is None else f'{trial.detect * 1000:.1f} мс'}, "
+                      f"восстановление {'---' if trial.recover is None else f'{trial.recover * 1000:.1f} мс'}, "
+                      f"потеряно {trial.lost}, искажено {trial.misparsed}", file=sys.stderr)
+        harness.close()
+    finally:
+        os.chdir(cwd)
+        workdir.cleanup()
+
+    summary = summarize(trials)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_summary(summary))
+    # Неисправность без восстановления - провал испытания
+    return 0 if all(trial.recover is not None for trial in trials) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import math
+from datetime import timedelta
+
+from rollups import bucket_start
+
+# Сколько последних часов хранить в памяти
+KEEP_HOURS = 48
+
+# Период вывода строки "Temperatures:" (output_counter в SysTick_Handler), с
+FRAME_PERIOD = 10.0
+
+FRAME_PREFIX = "Temperatures:"
+
+
+class FrameMonitor:
+    """Контроль интервалов между кадрами "Temperatures:" одного порта.
+
+    Ведет статистику джиттера (отклонение интервала от периода прошивки),
+    считает пропущенные кадры по длинным интервалам и полноту данных по
+    часам: принято / (принято + пропущено). Пропущенные кадры относятся к
+    тем часам, на которые пришелся разрыв; часы совсем без кадров получают
+    запись с нулем принятых. Счетчики за час передаются в
+    store.add_completeness(), чтобы храниться рядом с данными.
+    """
+    def __init__(self, port="", period=FRAME_PERIOD, gap_factor=1.5, store=None):
+        self.port = port
+        self.period = period
+        self.gap_factor = gap_factor
+        self.store = store
+        self.reset()
+
+    def reset(self):
+        """Сброс при намеренном отключении: пауза не считается пропуском"""
+        self.last = None
+        self.last_moment = None
+        self.frames = 0
+        self.missed = 0
+        self.gaps = 0
+        # Статистика отклонения интервала от периода (алгоритм Уэлфорда)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_jitter = 0.0
+        self.hours = {}
+
+    def frame(self, received, moment):
+        """Учет кадра: received - отметка time.monotonic(), moment - она же системным временем.
+
+        Возвращает число кадров, пропущенных перед этим.
+        """
+        missed = 0
+        hours = {}
+        if self.last is not None:
+            interval = received - self.last
+            if interval > self.period * self.gap_factor:
+                missed = max(1, int(round(interval / self.period)) - 1)
+                self.missed += missed
+                self.gaps += 1
+                hours = self._spread(missed)
+            else:
+                deviation = interval - self.period
+                self.count += 1
+                delta = deviation - self.mean
+                self.mean += delta / self.count
+                self.m2 += delta * (deviation - self.mean)
+                self.max_jitter = max(self.max_jitter, abs(deviation))
+        self.last = received
+        self.last_moment = moment
+        self.frames += 1
+
+        hours.setdefault(bucket_start(moment, "hour"), [0, 0])[0] += 1
+        for hour, (received_count, missed_count) in hours.items():
+            self._count(hour, received_count, missed_count)
+        return missed
+
+    def _spread(self, missed):
+        """Пропущенные кадры last + k * period (k = 1..missed) по часам: {час: [0, пропущено]}"""
+        hours = {}
+        start = self.last_moment
+        hour_start = start.replace(minute=0, second=0, microsecond=0)
+        first = 1
+        while first <= missed:
+            next_hour = hour_start + timedelta(hours=1)
+            # Последний кадр, который еще попадает в этот час
+            last = min(missed, math.ceil((next_hour - start).total_seconds() / self.period) - 1)
+            if last >= first:
+                hours[bucket_start(hour_start, "hour")] = [0, last - first + 1]
+                first = last + 1
+            hour_start = next_hour
+        return hours
+
+    def _count(self, hour, received, missed):
+        counts = self.hours.get(hour)
+        if counts is None:
+            counts = self.hours[hour] = [0, 0]
+            while len(self.hours) > KEEP_HOURS:
+                del self.hours[next(iter(self.hours))]
+        counts[0] += received
+        counts[1] += missed
+        if self.store is not None:
+            self.store.add_completeness(self.port, hour, received, missed)
+
+    def overdue(self, now):
+        """Секунды без кадров сверх допустимого или 0"""
+        if self.last is None:
+            return 0.0
+        silence = now - self.last
+        return silence if silence > self.period * self.gap_factor else 0.0
+
+    def jitter_std(self):
+        """Среднеквадратичное отклонение интервала, с"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def completeness(self, hour):
+        """Полнота данных за час в процентах или None"""
+        counts = self.hours.get(hour)
+        if not counts:
+            return None
+        received, missed = counts
+        return 100.0 * received / (received + missed)
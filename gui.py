@@ -8,21 +8,47 @@ import threading
 import time
 import re
 import os
+import json
 from datetime import datetime
 import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
 import subprocess
 import platform
+import argparse
+
+from rollups import RollupStore, rollup_path_for, bucket_start
+from alarms import AlarmEngine, AlarmEvent
+from timebase import ArrivalClock
+from resolution_controller import AdaptiveResolutionController
+from protocol import resolution_command
+from fanout_server import FanoutServer, DEFAULT_HOST
+from sensor_grid import SensorGrid
+from frame_monitor import FrameMonitor, FRAME_PREFIX
+from loop_watchdog import EventLoopWatchdog
+from sinks import SinkPipeline, new_log_workbook
+from history_view import HistoryDialog
+from archive import Archiver, last_logged_time
+from acquisition import (AcquisitionProcess, RECORD_LINE, RECORD_ALARM, RECORD_ERROR, RECORD_STATUS,
+                         JOURNAL_FILE, JOURNAL_TIME_FORMAT, stop_orphan, read_journal, rotate_journal)
 
 class DS18B20Monitor(QMainWindow):
-    def __init__(self):
+    def __init__(self, multiprocess=False, serve=None, grid=False, watchdog=False):
         super().__init__()
         self.serial_port = None
+        # Открытие порта: serial.Serial или замена (simulator.SimulatedLink)
+        self.serial_factory = serial.Serial
         self.is_connected = False
         self.reading_thread = None
         self.stop_thread = False
         
+        # Отметки времени прихода строк (monotonic с привязкой к системным часам)
+        self.clock = ArrivalClock()
+        
+        # Режим с отдельным процессом сбора и кольцевым буфером в разделяемой памяти
+        self.multiprocess = multiprocess
+        self.acquisition = None
+        self.acquisition_timer = QTimer()
+        self.acquisition_timer.timeout.connect(self.poll_acquisition)
+        
         # Флаг ошибки чтения
         self.read_error_occurred = False
         # Флаг режима переподключения
@@ -33,6 +59,11 @@ class DS18B20Monitor(QMainWindow):
         self.indicator_timer.timeout.connect(self.update_indicator)
         self.indicator_state = False  # Текущее состояние индикатора (вкл/выкл)
         
+        # Фоновый режим: окно свернуто или скрыто, отрисовка и таймеры интерфейса на паузе
+        # (отслеживается после построения интерфейса)
+        self.background = False
+        self.track_visibility = False
+        
         # Данные датчиков
         self.sensor_data = {
             0: {"temp": "---", "res": "12", "working": True, "last_saved_temp": None},
@@ -43,11 +74,62 @@ class DS18B20Monitor(QMainWindow):
         self.log_data = []
         self.excel_file = "temperature_log.xlsx"
         
+        # Приемники строк журнала (Excel и sinks.json), у каждого свой поток
+        self.sinks = None
+        
+        # Перенос закрытых журналов (temperature_log.<дата>.xlsx) в архив
+        self.archiver = None
+        
+        # Окно истории (создается при первом открытии, читает архив журнала)
+        self.history_dialog = None
+        
+        # Агрегаты по минутам/часам/суткам (хранятся рядом с журналом)
+        self.rollups = None
+        # При досылке из журнала процесса сбора - время, до которого показания уже учтены
+        self.rollups_since = None
+        
+        # Проверка порогов температуры в потоке чтения
+        self.alarm_engine = None
+        
+        # Автоматический выбор разрешения по скорости изменения температуры
+        self.resolution_controller = AdaptiveResolutionController()
+        
+        # Рассылка показаний другим программам по TCP (host, port) или None
+        self.serve_address = serve
+        self.fanout = None
+        
+        # Таблица датчиков (для шины с большим числом датчиков)
+        self.show_grid = grid
+        self.sensor_grid = None
+        
+        # Контроль пропусков кадров и джиттера
+        self.frame_monitor = None
+        self.frame_check_timer = QTimer()
+        self.frame_check_timer.timeout.connect(self.check_frame_gap)
+        
+        # Контроль задержек цикла событий (отчет stall_report.txt при закрытии)
+        self.watchdog = None
+        if watchdog:
+            self.watchdog = EventLoopWatchdog(parent=self)
+            self.watchdog.start()
+        
         self.init_ui()
         self.scan_ports()
         
         # Создаем/открываем Excel файл при запуске
         self.open_or_create_excel()
+        self.open_archiver()
+        self.open_sinks()
+        self.open_rollups()
+        self.replay_journal()
+        self.open_alarms()
+        self.start_fanout()
+        
+        app = QApplication.instance()
+        if app is not None:
+            app.applicationStateChanged.connect(self.update_background_mode)
+        self.track_visibility = True
+        self.update_background_mode()
         
     def init_ui(self):
         # Настройка главного окна
@@ -261,6 +343,12 @@ class DS18B20Monitor(QMainWindow):
         temp_layout.addWidget(self.sensor2_frame)
         layout.addWidget(temp_frame)
         
+        # Таблица всех датчиков шины
+        if self.show_grid:
+            self.sensor_grid = SensorGrid()
+            self.sensor_grid.delegate.resolution_requested.connect(self.send_resolution_command)
+            layout.addWidget(self.sensor_grid, 1)
+        
         # 4. Радиокнопки для выбора разрешения
         resolution_frame = QFrame()
         resolution_frame.setFrameStyle(QFrame.Panel | QFrame.Raised)
@@ -307,8 +395,16 @@ class DS18B20Monitor(QMainWindow):
         
         sensor2_res_group.setLayout(sensor2_res_layout)
         
+        # Автоматический режим разрешения
+        self.auto_res_checkbox = QCheckBox("Авто")
+        self.auto_res_checkbox.setStyleSheet("font-size: 30px")
+        self.auto_res_checkbox.setToolTip("Понижать разрешение при быстром изменении температуры "
+                                          "и возвращать 12 бит при стабильной")
+        self.auto_res_checkbox.toggled.connect(self.on_auto_resolution_toggled)
+        
         resolution_layout.addWidget(sensor1_res_group)
         resolution_layout.addWidget(sensor2_res_group)
+        resolution_layout.addWidget(self.auto_res_checkbox)
         layout.addWidget(resolution_frame)
         
         # 5. Информация о записи в Excel
@@ -341,8 +437,30 @@ class DS18B20Monitor(QMainWindow):
         """)
         self.open_excel_btn.clicked.connect(self.open_excel_file)
         
+        self.history_btn = QPushButton("📜 История")
+        self.history_btn.setStyleSheet("""
+            QPushButton {
+                font-size: 25px;
+                padding: 8px 15px;
+                background-color: #3498db;
+                color: white;
+                border-radius: 5px;
+            }
+            QPushButton:hover {
+                background-color: #2980b9;
+            }
+        """)
+        self.history_btn.clicked.connect(self.open_history)
+        
+        # Полнота данных и джиттер кадров
+        self.frame_label = QLabel("Полнота: ---")
+        self.frame_label.setStyleSheet("font-size: 25px; color: #2c3e50; border: none;")
+        
         excel_layout.addWidget(self.excel_label)
         excel_layout.addStretch()
+        excel_layout.addWidget(self.frame_label)
+        excel_layout.addStretch()
+        excel_layout.addWidget(self.history_btn)
         excel_layout.addWidget(self.open_excel_btn)
         
         layout.addWidget(self.excel_frame)
@@ -362,6 +480,8 @@ class DS18B20Monitor(QMainWindow):
         
     def update_indicator(self):
         """Обновление состояния индикатора подключения"""
+        if self.background:
+            return
         if self.is_connected:
             # Мигание при подключении
             self.indicator_state = not self.indicator_state
@@ -402,7 +522,7 @@ class DS18B20Monitor(QMainWindow):
     
     def start_indicator_blink(self):
         """Запуск мигания индикатора"""
-        if not self.indicator_timer.isActive():
+        if not self.background and not self.indicator_timer.isActive():
             self.indicator_timer.start(500)  # Мигание каждые 500 мс
     
     def stop_indicator_blink(self):
@@ -447,30 +567,216 @@ class DS18B20Monitor(QMainWindow):
     def create_excel_file(self):
         """Создание нового Excel файла с заголовками"""
         try:
-            # Создаем Workbook
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Температура"
-            
-            # Заголовки
-            headers = ['Время', 'Датчик 1 Температура (°C)', 'Датчик 1 Статус', 
-                      'Датчик 1 Разрешение (бит)', 'Датчик 2 Температура (°C)', 
-                      'Датчик 2 Статус', 'Датчик 2 Разрешение (бит)']
-            
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col, value=header)
-                cell.font = Font(bold=True, size=12)
-                cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                cell.font = Font(color="FFFFFF", bold=True)
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                ws.column_dimensions[chr(64 + col)].width = 25
-            
+            # Заголовки те же, что у журналов, которые создает ExcelSink
+            wb = new_log_workbook()
             wb.save(self.excel_file)
             self.status_bar.showMessage(f"Создан новый файл Excel: {self.excel_file}", 3000)
             
         except Exception as e:
             self.status_bar.showMessage(f"Ошибка создания Excel файла: {str(e)}", 5000)
     
+    def open_sinks(self):
+        """Запуск приемников журнала (sinks.json или только журнал Excel)"""
+        try:
+            self.sinks = SinkPipeline.from_config(self.excel_file)
+            self.sinks.set_error_handler(self.notify_sink_error)
+            if self.archiver is not None:
+                self.sinks.set_rotate_handler(self.archiver.submit)
+            self.sinks.start()
+        except Exception as e:
+            self.sinks = None
+            self.status_bar.showMessage(f"Ошибка запуска записи журнала: {str(e)}", 5000)
+    
+    def notify_sink_error(self, sink, error):
+        """Ошибка приемника (вызывается из его потока)"""
+        QMetaObject.invokeMethod(self.status_bar, "showMessage",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(str, f"Ошибка записи ({sink.name}): {error}"),
+                                 Q_ARG(int, 5000))
+    
+    def open_archiver(self):
+        """Запуск переноса закрытых журналов в архив (и оставшихся с прошлого запуска)"""
+        try:
+            self.archiver = Archiver(self.excel_file)
+            self.archiver.on_packed = self.notify_packed
+            self.archiver.start()
+        except Exception as e:
+            self.archiver = None
+            self.status_bar.showMessage(f"Ошибка запуска архива: {str(e)}", 5000)
+    
+    def notify_packed(self, count, error):
+        """Итог переноса в архив (вызывается из потока архива)"""
+        if count and self.history_dialog is not None:
+            QMetaObject.invokeMethod(self.history_dialog, "archive_updated", Qt.QueuedConnection)
+        if error is not None:
+            message = f"Ошибка переноса журнала в архив: {error}"
+        elif count:
+            message = f"В архив перенесено строк: {count}"
+        else:
+            return
+        QMetaObject.invokeMethod(self.status_bar, "showMessage",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(str, message),
+                                 Q_ARG(int, 5000))
+    
+    def open_rollups(self):
+        """Открытие хранилища агрегатов рядом с журналом"""
+        try:
+            self.rollups = RollupStore(rollup_path_for(self.excel_file))
+        except Exception as e:
+            self.rollups = None
+            self.status_bar.showMessage(f"Ошибка открытия агрегатов: {str(e)}", 5000)
+    
+    def update_rollups(self, sensor_nums, received):
+        """Учет принятых показаний в агрегатах"""
+        if self.rollups is None:
+            return
+        
+        arrival_time = self.clock.to_datetime(received)
+        if self.rollups_since is not None and arrival_time <= self.rollups_since:
+            return
+        try:
+            readings = [(num + 1, float(self.sensor_data[num]["temp"]), arrival_time) for num in sensor_nums]
+            self.rollups.add_many(readings)
+        except Exception as e:
+            self.status_bar.showMessage(f"Ошибка обновления агрегатов: {str(e)}", 5000)
+    
+    def replay_journal(self):
+        """Досылка строк, принятых процессом сбора без интерфейса (после зависания или падения).
+
+        Процесс сбора, переживший интерфейс, сначала завершается. Строки
+        журнала новее последней записанной строки проходят обычную обработку:
+        в журнал Excel попадают только изменения, в агрегаты - показания
+        новее уже учтенных.
+        """
+        try:
+            if not stop_orphan(JOURNAL_FILE):
+                self.status_bar.showMessage("Процесс сбора от прошлого запуска не завершился", 5000)
+            if not os.path.exists(JOURNAL_FILE):
+                return
+            last = last_logged_time(self.excel_file)
+            self.rollups_since = self.rollups.last_reading() if self.rollups is not None else None
+            count = 0
+            for stamp, line in read_journal(JOURNAL_FILE, last):
+                moment = datetime.strptime(stamp, JOURNAL_TIME_FORMAT)
+                self.process_line(line, self.clock.from_datetime(moment))
+                count += 1
+            if count:
+                self.status_bar.showMessage(f"Из журнала процесса сбора дослано строк: {count}", 5000)
+        except Exception as e:
+            self.status_bar.showMessage(f"Ошибка досылки журнала процесса сбора: {str(e)}", 5000)
+        finally:
+            self.rollups_since = None
+    
+    def open_alarms(self):
+        """Загрузка порогов тревоги (alarms.json или пороги прошивки)"""
+        try:
+            self.alarm_engine = AlarmEngine.from_config()
+            self.alarm_engine.add_listener(self.notify_alarm)
+        except Exception as e:
+            self.alarm_engine = None
+            self.status_bar.showMessage(f"Ошибка загрузки порогов тревоги: {str(e)}", 5000)
+    
+    def start_fanout(self):
+        """Запуск TCP-рассылки показаний"""
+        if self.serve_address is None:
+            return
+        host, port = self.serve_address
+        try:
+            self.fanout = FanoutServer(host, port, on_command=self.remote_set_resolution)
+            self.fanout.start()
+            self.status_bar.showMessage(f"Рассылка показаний: {host}:{self.fanout.port}", 3000)
+        except Exception as e:
+            self.fanout = None
+            self.status_bar.showMessage(f"Ошибка запуска рассылки: {str(e)}", 5000)
+    
+    def broadcast(self, message):
+        """Рассылка сообщения подписчикам (если рассылка включена)"""
+        if self.fanout is not None:
+            self.fanout.publish(message)
+    
+    def broadcast_line(self, line, received):
+        """Рассылка декодированных данных строки прошивки"""
+        if self.fanout is not None:
+            timestamp = self.clock.to_datetime(received).isoformat(sep=" ", timespec="milliseconds")
+            self.fanout.publish_line(line, timestamp)
+    
+    def remote_set_resolution(self, sensor, bits):
+        """Команда смены разрешения от клиента рассылки (вызывается из потока сервера)"""
+        if resolution_command(sensor - 1, bits) is None or not self.is_connected:
+            return False
+        QMetaObject.invokeMethod(self, "apply_remote_resolution",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(int, sensor - 1),
+                                 Q_ARG(str, str(bits)))
+        return True
+    
+    @pyqtSlot(int, str)
+    def apply_remote_resolution(self, sensor_num, resolution):
+        """Смена разрешения как выбором радиокнопки"""
+        buttons = {0: self.sensor1_res_buttons, 1: self.sensor2_res_buttons}
+        buttons[sensor_num][resolution].setChecked(True)
+    
+    def notify_alarm(self, event):
+        """Передача события тревоги из потока чтения в интерфейс"""
+        message = event.as_dict()
+        message["type"] = "alarm"
+        self.broadcast(message)
+        QMetaObject.invokeMethod(self, "show_alarm",
+                                 Qt.QueuedConnection,
+                                 Q_ARG(str, event.text()))
+    
+    @pyqtSlot(str)
+    def show_alarm(self, text):
+        """Отображение тревоги в статус баре"""
+        self.status_bar.showMessage(text, 10000)
+    
+    def start_frame_monitor(self, port):
+        """Начало контроля кадров для порта"""
+        if self.frame_monitor is None or self.frame_monitor.port != port:
+            self.frame_monitor = FrameMonitor(port, store=self.rollups)
+        if not self.frame_check_timer.isActive():
+            self.frame_check_timer.start(1000)
+    
+    def on_frame(self, received):
+        """Учет кадра "Temperatures:" и обновление полноты данных"""
+        if self.frame_monitor is None:
+            return
+        
+        moment = self.clock.to_datetime(received)
+        hour = bucket_start(moment, "hour")
+        try:
+            missed = self.frame_monitor.frame(received, moment)
+        except Exception as e:
+            self.status_bar.showMessage(f"Ошибка учета полноты данных: {str(e)}", 5000)
+            return
+        
+        if missed:
+            self.status_bar.showMessage(f"Пропущено кадров: {missed}", 5000)
+        self.update_frame_label(hour)
+    
+    def update_frame_label(self, hour):
+        """Отображение полноты за текущий час и джиттера"""
+        if self.background:
+            return
+        monitor = self.frame_monitor
+        percent = monitor.completeness(hour)
+        percent_text = "---" if percent is None else f"{percent:.1f}%"
+        self.frame_label.setText(f"Полнота (час): {percent_text} | "
+                                 f"джиттер: ±{monitor.jitter_std() * 1000:.0f} мс | "
+                                 f"пропущено: {monitor.missed}")
+        color = "#2c3e50" if percent is None or percent >= 99.0 else "#e74c3c"
+        self.frame_label.setStyleSheet(f"font-size: 25px; color: {color}; border: none;")
+    
+    def check_frame_gap(self):
+        """Проверка, что кадры приходят вовремя"""
+        if self.frame_monitor is None or not self.is_connected or self.background:
+            return
+        silence = self.frame_monitor.overdue(self.clock.now())
+        if silence:
+            self.frame_label.setText(f"⚠ Нет данных {silence:.0f} с")
+            self.frame_label.setStyleSheet("font-size: 25px; color: #e74c3c; font-weight: bold; border: none;")
+    
     def open_excel_file(self):
         """Открытие Excel файла в системе"""
         try:
@@ -490,10 +796,27 @@ class DS18B20Monitor(QMainWindow):
         except Exception as e:
             self.status_bar.showMessage(f"Ошибка открытия файла: {str(e)}", 5000)
     
-    def save_to_excel_if_changed(self):
-        """Сохраняет данные в Excel только если есть изменения"""
+    def open_history(self):
+        """Просмотр истории из архива журнала внутри программы"""
         try:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            if self.history_dialog is None:
+                current_rows = None
+                if self.sinks is not None:
+                    current_rows = lambda: self.sinks.current_rows(self.excel_file)
+                self.history_dialog = HistoryDialog(self.excel_file, current_rows, self)
+            self.history_dialog.show()
+            self.history_dialog.raise_()
+            self.history_dialog.activateWindow()
+        except Exception as e:
+            self.status_bar.showMessage(f"Ошибка открытия истории: {str(e)}", 5000)
+    
+    def save_to_excel_if_changed(self, received=None):
+        """Передает строку в приемники журнала только если есть изменения"""
+        try:
+            # Время строки - приход данных в поток чтения, а не момент сохранения
+            if received is None:
+                received = self.clock.now()
+            current_time = self.clock.to_datetime(received).strftime("%Y-%m-%d %H:%M:%S")
             
             # Получаем данные датчиков
             temp1 = self.sensor_data[0]["temp"]
@@ -552,23 +875,9 @@ class DS18B20Monitor(QMainWindow):
                     'Датчик 2 Разрешение (бит)': self.sensor_data[1]["res"]
                 }
                 
-                # Читаем существующие данные
-                try:
-                    existing_df = pd.read_excel(self.excel_file)
-                except:
-                    existing_df = pd.DataFrame()
-                
-                # Добавляем новую строку
-                new_df = pd.DataFrame([new_row])
-                
-                if not existing_df.empty:
-                    final_df = pd.concat([existing_df, new_df], ignore_index=True)
-                else:
-                    final_df = new_df
-                
-                # Сохраняем
-                final_df.to_excel(self.excel_file, index=False)
-            
+                # Запись идет в потоках приемников, время записи и задержку они добавляют сами
+                if self.sinks is not None:
+                    self.sinks.submit(new_row, received)
                     
         except Exception as e:
             self.status_bar.showMessage(f"Ошибка сохранения в Excel: {str(e)}", 5000)
@@ -626,6 +935,30 @@ class DS18B20Monitor(QMainWindow):
             # Сохраняем изменение разрешения
             self.save_to_excel_if_changed()
     
+    def on_auto_resolution_toggled(self, checked):
+        """Включение/выключение автоматического выбора разрешения"""
+        self.resolution_controller.reset()
+        if checked:
+            self.status_bar.showMessage("Автоматический выбор разрешения включен", 3000)
+        else:
+            self.status_bar.showMessage("Автоматический выбор разрешения выключен", 3000)
+    
+    def adapt_resolution(self, sensor_nums, received):
+        """Автоматическая смена разрешения по скорости изменения и шуму температуры"""
+        if not self.auto_res_checkbox.isChecked() or not self.is_connected:
+            return
+        
+        buttons = {0: self.sensor1_res_buttons, 1: self.sensor2_res_buttons}
+        for num in sensor_nums:
+            try:
+                temp = float(self.sensor_data[num]["temp"])
+            except ValueError:
+                continue
+            new_res = self.resolution_controller.update(num, temp, received, self.sensor_data[num]["res"])
+            if new_res is not None:
+                # Как выбор пользователем: команда уходит на STM32 через on_resolution_changed
+                buttons[num][new_res].setChecked(True)
+    
     def send_resolution_command(self, sensor_num, resolution):
         """Отправка команды для изменения разрешения"""
         # Специальные символы для команд:
@@ -634,13 +967,8 @@ class DS18B20Monitor(QMainWindow):
         # Датчик 1:
         #   9 бит = 'e', 10 бит = 'f', 11 бит = 'g', 12 бит = 'h'
         
-        command_map = {
-            0: {"9": 'a', "10": 'b', "11": 'c', "12": 'd'},
-            1: {"9": 'e', "10": 'f', "11": 'g', "12": 'h'}
-        }
-        
-        if sensor_num in command_map and resolution in command_map[sensor_num]:
-            cmd = command_map[sensor_num][resolution]
+        cmd = resolution_command(sensor_num, resolution)
+        if cmd is not None:
             self.send_command(cmd)
     
     def toggle_connection(self):
@@ -665,7 +993,7 @@ class DS18B20Monitor(QMainWindow):
         baud = 9600
         
         try:
-            self.serial_port = serial.Serial(port, baud, timeout=1)
+            self.open_link(port, baud)
             self.is_connected = True
             self.read_error_occurred = False
             self.reconnect_mode = False
@@ -696,12 +1024,11 @@ class DS18B20Monitor(QMainWindow):
                 btn.setEnabled(True)
             
             # Запуск потока чтения
-            self.stop_thread = False
-            self.reading_thread = threading.Thread(target=self.read_serial)
-            self.reading_thread.daemon = True
-            self.reading_thread.start()
+            self.start_reading()
             
             self.status_bar.showMessage(f"Успешно подключено к {port} ({baud} бод)")
+            self.start_frame_monitor(port)
+            self.broadcast({"type": "link", "connected": True, "port": port})
             
         except Exception as e:
             self.status_bar.showMessage(f"Ошибка подключения: {str(e)}", 5000)
@@ -712,11 +1039,7 @@ class DS18B20Monitor(QMainWindow):
         self.read_error_occurred = False
         self.reconnect_mode = False
         
-        if self.reading_thread:
-            self.reading_thread.join(timeout=0.5)
-        
-        if self.serial_port:
-            self.serial_port.close()
+        self.close_link()
         
         self.is_connected = False
         self.connect_btn.setText("🔗 Подключиться")
@@ -750,6 +1073,11 @@ class DS18B20Monitor(QMainWindow):
         self.sensor2_status.setText("Статус: отключен")
         
         self.status_bar.showMessage("Отключено от порта")
+        # Намеренное отключение - не пропуск данных
+        self.frame_check_timer.stop()
+        if self.frame_monitor is not None:
+            self.frame_monitor.reset()
+        self.broadcast({"type": "link", "connected": False})
         
         # Сохраняем данные при отключении
         self.save_to_excel_if_changed()
@@ -759,14 +1087,10 @@ class DS18B20Monitor(QMainWindow):
         # Сначала отключаемся
         self.stop_thread = True
         
-        if self.reading_thread:
-            self.reading_thread.join(timeout=0.5)
-        
-        if self.serial_port:
-            try:
-                self.serial_port.close()
-            except:
-                pass
+        try:
+            self.close_link()
+        except:
+            pass
         
         # Затем пытаемся подключиться заново
         self.status_bar.showMessage("Попытка переподключения...")
@@ -798,7 +1122,7 @@ class DS18B20Monitor(QMainWindow):
         baud = 9600
         
         try:
-            self.serial_port = serial.Serial(port, baud, timeout=1)
+            self.open_link(port, baud)
             self.is_connected = True
             
             # Обновление интерфейса
@@ -827,12 +1151,11 @@ class DS18B20Monitor(QMainWindow):
                 btn.setEnabled(True)
             
             # Запуск потока чтения
-            self.stop_thread = False
-            self.reading_thread = threading.Thread(target=self.read_serial)
-            self.reading_thread.daemon = True
-            self.reading_thread.start()
+            self.start_reading()
             
             self.status_bar.showMessage(f"✅ Успешно переподключено к {port} ({baud} бод)")
+            self.start_frame_monitor(port)
+            self.broadcast({"type": "link", "connected": True, "port": port})
             
         except Exception as e:
             self.status_bar.showMessage(f"❌ Ошибка переподключения: {str(e)}", 5000)
@@ -853,6 +1176,61 @@ class DS18B20Monitor(QMainWindow):
             """)
             self.reconnect_mode = True
     
+    def open_link(self, port, baud):
+        """Открытие порта в этом процессе или запуск процесса сбора"""
+        if self.multiprocess:
+            self.acquisition = AcquisitionProcess(port, baud)
+            self.acquisition.start()
+            self.acquisition_timer.start(50)
+        else:
+            self.serial_port = self.serial_factory(port, baud, timeout=1)
+    
+    def start_reading(self):
+        """Запуск потока чтения (в режиме процесса сбора читает процесс)"""
+        if self.multiprocess:
+            return
+        self.stop_thread = False
+        self.reading_thread = threading.Thread(target=self.read_serial)
+        self.reading_thread.daemon = True
+        self.reading_thread.start()
+    
+    def close_link(self):
+        """Остановка чтения и закрытие порта"""
+        if self.acquisition is not None:
+            self.acquisition_timer.stop()
+            # Забираем то, что процесс успел опубликовать
+            self.poll_acquisition()
+            acquisition, self.acquisition = self.acquisition, None
+            acquisition.stop()
+        
+        if self.reading_thread:
+            self.reading_thread.join(timeout=0.5)
+        
+        if self.serial_port:
+            self.serial_port.close()
+    
+    def poll_acquisition(self):
+        """Чтение записей процесса сбора из кольцевого буфера"""
+        if self.acquisition is None:
+            return
+        
+        for kind, received, text in self.acquisition.poll():
+            if kind == RECORD_LINE:
+                self.broadcast_line(text, received)
+                self.process_line(text, received)
+            elif kind == RECORD_ALARM:
+                # Как в режиме потока: рассылка подписчикам и строка состояния
+                self.notify_alarm(AlarmEvent.from_dict(json.loads(text), received))
+            elif kind == RECORD_STATUS:
+                self.status_bar.showMessage(text, 5000)
+            elif kind == RECORD_ERROR:
+                self.read_error_occurred = True
+                self.reconnect_mode = True
+                self.is_connected = False
+                self.update_button_for_reconnect()
+                self.handle_read_error()
+                self.status_bar.showMessage("Ошибка чтения: потеря связи с устройством", 5000)
+    
     def read_serial(self):
         """Чтение данных из порта"""
         buffer = ""
@@ -860,15 +1238,22 @@ class DS18B20Monitor(QMainWindow):
             try:
                 if self.serial_port.in_waiting:
                     data = self.serial_port.read(self.serial_port.in_waiting).decode('utf-8', 'ignore')
+                    # Отметка прихода: все строки этой порции завершились к этому моменту
+                    received = self.clock.now()
                     buffer += data
                     
                     while '\n' in buffer:
                         line, buffer = buffer.split('\n', 1)
                         line = line.strip()
                         if line:
+                            # Пороги проверяются до постановки строки в очередь интерфейса
+                            if self.alarm_engine is not None:
+                                self.alarm_engine.process_line(line, received)
+                            self.broadcast_line(line, received)
                             QMetaObject.invokeMethod(self, "process_line", 
                                                     Qt.QueuedConnection,
-                                                    Q_ARG(str, line))
+                                                    Q_ARG(str, line),
+                                                    Q_ARG(float, received))
                 
                 time.sleep(0.01)
                 
@@ -919,6 +1304,8 @@ class DS18B20Monitor(QMainWindow):
     @pyqtSlot()
     def handle_read_error(self):
         """Обработка ошибки чтения - установка статуса потери связи"""
+        self.broadcast({"type": "link", "connected": False, "error": True})
+        
         # Устанавливаем статус потери связи для обоих датчиков
         old_working1 = self.sensor_data[0]["working"]
         old_working2 = self.sensor_data[1]["working"]
@@ -927,6 +1314,8 @@ class DS18B20Monitor(QMainWindow):
         self.sensor_data[1]["working"] = False
         self.sensor_data[0]["temp"] = "ERROR"
         self.sensor_data[1]["temp"] = "ERROR"
+        if self.sensor_grid is not None:
+            self.sensor_grid.set_all_working(False)
         
         # Обновляем отображение
         self.update_display()
@@ -935,9 +1324,12 @@ class DS18B20Monitor(QMainWindow):
         if old_working1 or old_working2:
             self.save_to_excel_if_changed()
     
-    @pyqtSlot(str)
-    def process_line(self, line):
+    @pyqtSlot(str, float)
+    def process_line(self, line, received=None):
         """Обработка полученной строки"""
+        if received is None:
+            received = self.clock.now()
+        
         # Если была ошибка чтения, сбрасываем флаг при успешном чтении
         if self.read_error_occurred:
             self.read_error_occurred = False
@@ -960,22 +1352,28 @@ class DS18B20Monitor(QMainWindow):
                 }
             """)
         
+        if line.startswith(FRAME_PREFIX):
+            self.on_frame(received)
+        
+        if self.sensor_grid is not None:
+            self.sensor_grid.update_line(line)
+        
         # Парсим температуру
-        if self.parse_temperature(line):
+        if self.parse_temperature(line, received):
             # Сохраняем только если температура изменилась
-            self.save_to_excel_if_changed()
+            self.save_to_excel_if_changed(received)
         
         # Проверяем на отключение датчиков
         if any(word in line.lower() for word in ["not found", "no sensor", "failed", "отсутствует", "error"]):
             if self.check_sensor_error(line):
                 # Сохраняем статус ошибки
-                self.save_to_excel_if_changed()
+                self.save_to_excel_if_changed(received)
         
         # Проверяем на изменение разрешения
         if "changed" in line.lower():
-            self.parse_resolution(line)
+            self.parse_resolution(line, received)
     
-    def parse_temperature(self, line):
+    def parse_temperature(self, line, received):
         """Парсинг температуры, возвращает True если данные изменились"""
         # Ищем все числа с точкой в строке
         temperatures = re.findall(r'-?\d+\.\d+', line)
@@ -989,6 +1387,8 @@ class DS18B20Monitor(QMainWindow):
             self.sensor_data[1]["temp"] = temperatures[1]
             self.sensor_data[0]["working"] = True
             self.sensor_data[1]["working"] = True
+            self.update_rollups([0, 1], received)
+            self.adapt_resolution([0, 1], received)
             
             # Проверяем изменилась ли температура
             changed = (old_temp1 != temperatures[0]) or (old_temp2 != temperatures[1])
@@ -1001,6 +1401,8 @@ class DS18B20Monitor(QMainWindow):
             old_temp1 = self.sensor_data[0]["temp"]
             self.sensor_data[0]["temp"] = temperatures[0]
             self.sensor_data[0]["working"] = True
+            self.update_rollups([0], received)
+            self.adapt_resolution([0], received)
             changed = old_temp1 != temperatures[0]
             self.update_display()
             return changed
@@ -1028,7 +1430,7 @@ class DS18B20Monitor(QMainWindow):
         
         return False
     
-    def parse_resolution(self, line):
+    def parse_resolution(self, line, received=None):
         """Парсинг изменения разрешения"""
         if 's0' in line.lower():
             if '9-bit' in line:
@@ -1061,10 +1463,14 @@ class DS18B20Monitor(QMainWindow):
         self.update_display()
         
         # Сохраняем изменение разрешения
-        self.save_to_excel_if_changed()
+        self.save_to_excel_if_changed(received)
     
     def update_display(self):
         """Обновление отображения"""
+        # В фоновом режиме данные копятся в sensor_data, отрисовка при возврате окна
+        if self.background:
+            return
+        
         # Датчик 1
         temp1 = self.sensor_data[0]["temp"]
         working1 = self.sensor_data[0]["working"]
@@ -1097,9 +1503,12 @@ class DS18B20Monitor(QMainWindow):
     
     def send_command(self, cmd):
         """Отправка команды"""
-        if self.is_connected and self.serial_port:
+        if self.is_connected and (self.serial_port or self.acquisition):
             try:
-                self.serial_port.write(f"{cmd}\n".encode())
+                if self.acquisition is not None:
+                    self.acquisition.send(cmd)
+                else:
+                    self.serial_port.write(f"{cmd}\n".encode())
                 self.status_bar.showMessage(f"Команда отправлена: '{cmd}'", 3000)
                 
             except Exception as e:
@@ -1122,24 +1531,119 @@ class DS18B20Monitor(QMainWindow):
         else:
             super().keyPressEvent(event)
     
+    def changeEvent(self, event):
+        """Сворачивание/разворачивание окна"""
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_background_mode()
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_background_mode()
+    
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_background_mode()
+    
+    def update_background_mode(self, *args):
+        """Переход в фоновый режим и обратно по видимости окна и состоянию приложения"""
+        if not self.track_visibility:
+            return
+        hidden = self.isMinimized() or not self.isVisible()
+        app = QApplication.instance()
+        if app is not None and app.applicationState() in (Qt.ApplicationHidden, Qt.ApplicationSuspended):
+            hidden = True
+        
+        if hidden and not self.background:
+            self.enter_background()
+        elif not hidden and self.background:
+            self.leave_background()
+    
+    def enter_background(self):
+        """Остановка таймеров и отрисовки; чтение, журнал, агрегаты и пороги продолжают работать"""
+        self.background = True
+        self.indicator_timer.stop()
+        self.frame_check_timer.stop()
+        if self.sensor_grid is not None:
+            self.sensor_grid.pause()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+    
+    def leave_background(self):
+        """Одна перерисовка по текущему состоянию и запуск таймеров"""
+        self.background = False
+        self.update_display()
+        self.update_indicator()
+        if self.is_connected:
+            self.start_indicator_blink()
+            if self.frame_monitor is not None:
+                self.frame_check_timer.start(1000)
+                self.update_frame_label(bucket_start(datetime.now(), "hour"))
+                self.check_frame_gap()
+        if self.sensor_grid is not None:
+            self.sensor_grid.resume()
+        if self.watchdog is not None:
+            self.watchdog.start()
+    
     def closeEvent(self, event):
         """Обработка закрытия окна"""
         self.disconnect()
+        if self.sinks is not None:
+            # Дописываем накопленные строки; если все записано, журнал процесса
+            # сбора больше не нужен для досылки и уходит в предыдущую часть
+            if self.sinks.stop(timeout=30.0):
+                try:
+                    rotate_journal(JOURNAL_FILE)
+                except OSError:
+                    pass
+        if self.archiver is not None:
+            self.archiver.stop()
+        if self.alarm_engine is not None:
+            self.alarm_engine.stop()
+        if self.rollups is not None:
+            self.rollups.close()
+        if self.history_dialog is not None:
+            self.history_dialog.close_archive()
+        if self.fanout is not None:
+            self.fanout.stop()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            try:
+                self.watchdog.write_report()
+            except OSError:
+                pass
         event.accept()
 
 def main():
+    parser = argparse.ArgumentParser(description="Мониторинг температуры DS18B20")
+    parser.add_argument("--multiprocess", action="store_true",
+                        help="чтение порта в отдельном процессе (кольцевой буфер в разделяемой памяти)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="рассылать показания по TCP (JSON по строке на сообщение)")
+    parser.add_argument("--grid", action="store_true",
+                        help="показать таблицу всех датчиков шины")
+    parser.add_argument("--watchdog", action="store_true",
+                        help="измерять зависания интерфейса (stalls.log, stall_report.txt)")
+    args, qt_args = parser.parse_known_args()
+    
+    serve = None
+    if args.serve:
+        host, _, port = args.serve.rpartition(":")
+        serve = (host or DEFAULT_HOST, int(port))
+    
     # Убираем консольное окно на Windows
     if sys.platform == "win32":
         import ctypes
         ctypes.windll.user32.ShowWindow(ctypes.windll.kernel32.GetConsoleWindow(), 0)
     
-    app = QApplication(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
     
     # Устанавливаем стиль
     app.setStyle("Fusion")
     
     # Создаем и показываем окно
-    window = DS18B20Monitor()
+    window = DS18B20Monitor(multiprocess=args.multiprocess, serve=serve, grid=args.grid,
+                            watchdog=args.watchdog)
     window.show()
     
     sys.exit(app.exec_())
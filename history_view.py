@@ -0,0 +1,364 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableView, QComboBox, QLabel,
+                             QPushButton, QDateTimeEdit, QHeaderView, QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QDateTime, QTimer, pyqtSlot
+
+from archive import Archive, archive_path_for, to_seconds, from_seconds, TEMP_SCALE, TEMP_ERROR, TEMP_EMPTY
+from export_log import TIME_COLUMN, sensor_columns
+from sensor_grid import COLOR_ERROR
+from sinks import LOG_COLUMNS
+
+# Колонка журнала -> позиция в строке текущих суток
+TAIL_POSITIONS = {column: i for i, column in enumerate(LOG_COLUMNS)}
+
+STATUS_ALL = None
+STATUS_OK = "OK"
+STATUS_ERROR = "ERROR"
+
+# Распакованных блоков в памяти (блок - до archive.CHUNK_ROWS строк)
+CACHE_CHUNKS = 32
+
+# Период обновления строк текущих суток в открытом окне, мс (как сохранение журнала Excel)
+TAIL_REFRESH_MS = 30000
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """Постраничная модель истории поверх индекса архива.
+
+    Число строк берется из индекса блоков, поэтому модель создается без
+    чтения данных. Блок распаковывается, только когда представление
+    запрашивает его строки, и остается в LRU-кэше на cache_chunks блоков.
+    Фильтр по статусу тоже считается по индексу (число ошибок по датчикам
+    и по строкам в блоке); распаковываются лишь блоки, где число подходящих
+    строк из индекса не определить (ошибки у нескольких из выбранных, но
+    не у всех датчиков). После строк архива идут строки текущих суток
+    (set_tail), которые еще не перенесены в архив.
+    """
+    def __init__(self, archive, cache_chunks=CACHE_CHUNKS, parent=None):
+        super().__init__(parent)
+        self.archive = archive
+        self.cache_chunks = cache_chunks
+        self.cache = OrderedDict()
+        self.sensors = list(archive.sensors)
+        self.status = STATUS_ALL
+        self.infos = []
+        self.starts = []
+        self.archived = 0
+        self.total = 0
+        # Строки текущих суток в виде LOG_COLUMNS и номера подходящих под фильтр
+        self.tail = []
+        self.tail_matches = []
+        self.reload()
+
+    # Индекс и фильтр
+
+    def reload(self):
+        """Перечитать индекс архива (после переноса новых строк)"""
+        self.beginResetModel()
+        self.all_infos = self.archive.chunks()
+        self.cache.clear()
+        self._apply_filter()
+        self.endResetModel()
+
+    def set_filter(self, sensors=None, status=STATUS_ALL):
+        """Показывать датчики sensors (с 1) и строки со статусом status у любого из них"""
+        self.beginResetModel()
+        self.sensors = list(sensors or self.archive.sensors)
+        self.status = status
+        for entry in self.cache.values():
+            entry[1] = None
+        self._apply_filter()
+        self.endResetModel()
+
+    def set_tail(self, rows):
+        """Строки текущих суток; дописанные в конец добавляются без сброса модели"""
+        if self.tail and len(rows) >= len(self.tail) and rows[0] == self.tail[0]:
+            start = len(self.tail)
+            added = [start + i for i, row in enumerate(rows[start:]) if self._tail_match(row)]
+            self.tail = rows
+            if added:
+                self.beginInsertRows(QModelIndex(), self.total, self.total + len(added) - 1)
+                self.tail_matches += added
+                self.total += len(added)
+                self.endInsertRows()
+            return
+        self.beginResetModel()
+        self.tail = rows
+        self._apply_filter()
+        self.endResetModel()
+
+    def _apply_filter(self):
+        self.infos, self.starts = [], []
+        total = 0
+        for info in self.all_infos:
+            count = self._count(info)
+            if count:
+                self.infos.append(info)
+                self.starts.append(total)
+                total += count
+        self.archived = total
+        self.tail_matches = [i for i, row in enumerate(self.tail) if self._tail_match(row)]
+        self.total = total + len(self.tail_matches)
+
+    def _tail_value(self, row, column):
+        pos = TAIL_POSITIONS.get(column)
+        return None if pos is None or pos >= len(row) else row[pos]
+
+    def _tail_match(self, row):
+        if self.status is STATUS_ALL:
+            return True
+        error = any(self._tail_value(row, sensor_columns(sensor)[1]) == "ERROR" for sensor in self.sensors)
+        return error if self.status == STATUS_ERROR else not error
+
+    def _count(self, info):
+        """Число подходящих строк блока: по индексу, если возможно, иначе распаковкой"""
+        if self.status is STATUS_ALL:
+            return info.rows
+        errors = [info.stats[sensor][2] for sensor in self.sensors]
+        with_errors = [count for count in errors if count]
+        if len(with_errors) <= 1:
+            bad = with_errors[0] if with_errors else 0
+        elif set(self.sensors) == set(self.archive.sensors):
+            bad = info.errors
+        else:
+            return len(self._matches(info))
+        return bad if self.status == STATUS_ERROR else info.rows - bad
+
+    def _entry(self, info):
+        entry = self.cache.get(info.id)
+        if entry is None:
+            entry = [self.archive.read_chunk(info), None]
+            self.cache[info.id] = entry
+            if len(self.cache) > self.cache_chunks:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(info.id)
+        return entry
+
+    def _matches(self, info):
+        """Номера подходящих строк внутри блока (None - подходят все)"""
+        if self.status is STATUS_ALL:
+            return None
+        entry = self._entry(info)
+        if entry[1] is None:
+            chunk = entry[0]
+            columns = [chunk.temps[sensor] for sensor in self.sensors]
+            if self.status == STATUS_ERROR:
+                entry[1] = [i for i in range(info.rows) if any(c[i] == TEMP_ERROR for c in columns)]
+            else:
+                entry[1] = [i for i in range(info.rows) if all(c[i] != TEMP_ERROR for c in columns)]
+        return entry[1]
+
+    def locate(self, row):
+        """Строка модели -> (блок, номер строки в блоке)"""
+        pos = bisect_right(self.starts, row) - 1
+        info = self.infos[pos]
+        offset = row - self.starts[pos]
+        matches = self._matches(info)
+        return info, offset if matches is None else matches[offset]
+
+    def row_for_time(self, text):
+        """Первая строка модели не раньше времени text (формат журнала)"""
+        if self.tail_matches and (not self.infos or text > from_seconds(self.infos[-1].end)):
+            times = [str(self.tail[i][0]) for i in self.tail_matches]
+            return min(self.archived + bisect_left(times, text), self.total - 1)
+        moment = to_seconds(text)
+        pos = bisect_left([info.end for info in self.infos], moment)
+        if pos == len(self.infos):
+            return min(self.archived, self.total - 1)
+        info = self.infos[pos]
+        chunk = self._entry(info)[0]
+        local = bisect_left(chunk.times, moment)
+        matches = self._matches(info)
+        offset = local if matches is None else bisect_left(matches, local)
+        return min(self.starts[pos] + offset, self.total - 1)
+
+    def cached_chunks(self):
+        return len(self.cache)
+
+    # QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.total
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 1 + 3 * len(self.sensors)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            if section == 0:
+                return TIME_COLUMN
+            return sensor_columns(self.sensors[(section - 1) // 3])[(section - 1) % 3]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role not in (Qt.DisplayRole, Qt.ForegroundRole):
+            return None
+        if index.row() >= self.archived:
+            return self._tail_data(self.tail[self.tail_matches[index.row() - self.archived]], index.column(), role)
+
+        info, i = self.locate(index.row())
+        chunk = self._entry(info)[0]
+        column = index.column()
+        if column == 0:
+            return from_seconds(chunk.times[i]) if role == Qt.DisplayRole else None
+
+        sensor = self.sensors[(column - 1) // 3]
+        raw = chunk.temps[sensor][i]
+        if role == Qt.ForegroundRole:
+            return COLOR_ERROR if raw == TEMP_ERROR else None
+        field = (column - 1) % 3
+        if field == 0:
+            if raw == TEMP_ERROR:
+                return "ERROR"
+            return "---" if raw == TEMP_EMPTY else f"{raw / TEMP_SCALE:.4f}"
+        if field == 1:
+            return "ERROR" if raw == TEMP_ERROR else "OK"
+        res = chunk.res[sensor][i]
+        return str(res) if res else ""
+
+    def _tail_data(self, row, column, role):
+        if column == 0:
+            return str(row[0]) if role == Qt.DisplayRole else None
+        columns = sensor_columns(self.sensors[(column - 1) // 3])
+        if role == Qt.ForegroundRole:
+            return COLOR_ERROR if self._tail_value(row, columns[1]) == "ERROR" else None
+        value = self._tail_value(row, columns[(column - 1) % 3])
+        return "" if value is None else str(value)
+
+
+class HistoryDialog(QDialog):
+    """Просмотр истории из архива: прокрутка по страницам, переход ко времени, фильтры.
+
+    Окно только читает: закрытые сутки в архив переносит Archiver, когда
+    приемник журнала ротирует файл (тогда вызывается archive_updated),
+    а строки текущих суток берутся из памяти приемника Excel через
+    current_rows() и обновляются по таймеру, пока окно открыто.
+    """
+    def __init__(self, log_file, current_rows=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("История температуры")
+        self.resize(1400, 800)
+        self.log_file = log_file
+        self.current_rows = current_rows
+
+        self.archive = Archive(archive_path_for(log_file))
+        self.model = HistoryTableModel(self.archive, parent=self)
+
+        layout = QVBoxLayout(self)
+        controls = QHBoxLayout()
+
+        self.sensor_combo = QComboBox()
+        self.sensor_combo.addItem("Все датчики", None)
+        for sensor in self.archive.sensors:
+            self.sensor_combo.addItem(f"Датчик {sensor}", sensor)
+        self.status_combo = QComboBox()
+        self.status_combo.addItem("Любой статус", STATUS_ALL)
+        self.status_combo.addItem("Только OK", STATUS_OK)
+        self.status_combo.addItem("Только ERROR", STATUS_ERROR)
+        self.sensor_combo.currentIndexChanged.connect(self.apply_filter)
+        self.status_combo.currentIndexChanged.connect(self.apply_filter)
+
+        self.time_edit = QDateTimeEdit(QDateTime.currentDateTime())
+        self.time_edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+        self.time_edit.setCalendarPopup(True)
+        self.jump_btn = QPushButton("Перейти")
+        self.jump_btn.clicked.connect(self.jump_to_time)
+        self.refresh_btn = QPushButton("Обновить")
+        self.refresh_btn.clicked.connect(self.refresh)
+
+        controls.addWidget(self.sensor_combo)
+        controls.addWidget(self.status_combo)
+        controls.addStretch()
+        controls.addWidget(QLabel("Время:"))
+        controls.addWidget(self.time_edit)
+        controls.addWidget(self.jump_btn)
+        controls.addWidget(self.refresh_btn)
+        layout.addLayout(controls)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setWordWrap(False)
+        # Фиксированная высота строк и ширина колонок: представление не измеряет
+        # содержимое и запрашивает только видимые строки
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(28)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        self.info_label = QLabel()
+        layout.addWidget(self.info_label)
+
+        self.tail_timer = QTimer(self)
+        self.tail_timer.timeout.connect(self.refresh_tail)
+        self.refresh_tail()
+
+    def update_info(self, message=None):
+        infos = self.model.all_infos
+        span = f"{from_seconds(infos[0].start)} — {from_seconds(infos[-1].end)}" if infos else "архив пуст"
+        text = (f"Строк: {self.model.total} из {sum(info.rows for info in infos) + len(self.model.tail)} | "
+                f"архив: {span} | текущие сутки: {len(self.model.tail)} | "
+                f"блоков в памяти: {self.model.cached_chunks()}")
+        if message:
+            text += f" | {message}"
+        self.info_label.setText(text)
+
+    def apply_filter(self):
+        sensor = self.sensor_combo.currentData()
+        self.model.set_filter([sensor] if sensor is not None else None, self.status_combo.currentData())
+        self.update_info()
+
+    def jump_to_time(self):
+        if not self.model.total:
+            return
+        row = self.model.row_for_time(self.time_edit.dateTime().toString("yyyy-MM-dd HH:mm:ss"))
+        index = self.model.index(row, 0)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtTop)
+        self.table.selectRow(row)
+        self.update_info()
+
+    def showEvent(self, event):
+        self.refresh_tail()
+        self.tail_timer.start(TAIL_REFRESH_MS)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.tail_timer.stop()
+        super().hideEvent(event)
+
+    def refresh_tail(self):
+        """Строки текущих суток из приемника журнала (без чтения xlsx)"""
+        self.model.set_tail(self.current_rows() if self.current_rows is not None else [])
+        self.update_info()
+
+    def refresh(self):
+        self.reload_archive()
+        self.refresh_tail()
+
+    @pyqtSlot()
+    def archive_updated(self):
+        """Архив пополнен (вызывается из потока Archiver через очередь событий)"""
+        self.reload_archive()
+        self.refresh_tail()
+
+    def reload_archive(self):
+        # Позиция прокрутки сохраняется: новые строки добавляются в конец архива
+        top = self.table.rowAt(0)
+        self.model.reload()
+        if top >= 0 and self.model.total:
+            self.table.scrollTo(self.model.index(min(top, self.model.total - 1), 0),
+                                QAbstractItemView.PositionAtTop)
+
+    def close_archive(self):
+        """Закрытие архива при выходе из программы"""
+        self.tail_timer.stop()
+        self.archive.close()
@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+
+STALL_LOG = "stalls.log"
+STALL_REPORT = "stall_report.txt"
+
+# Каталог приложения: кадры из него считаются "своими" при поиске виновника
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def frame_name(frame, with_line=True):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    if not with_line:
+        return f"{name} ({os.path.basename(code.co_filename)})"
+    return f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def attribute_stack(frame):
+    """Виновник задержки: самый внешний метод приложения и самый глубокий вызов"""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+
+    own = [f for f in stack if os.path.abspath(f.f_code.co_filename).startswith(APP_DIR)
+           and f.f_code.co_name != "main"]
+    if not own:
+        return frame_name(stack[-1]) if stack else "?"
+
+    outer = own[0]
+    inner = stack[-1]
+    if inner is outer:
+        return frame_name(outer)
+    # Последний свой кадр показывает, какой вызов приложения ждет;
+    # строка внутреннего кадра меняется от снимка к снимку, поэтому без нее
+    return f"{frame_name(outer)} → {frame_name(own[-1])} → {frame_name(inner, False)}"
+
+
+class Stall:
+    def __init__(self, start, duration, culprits):
+        self.start = start
+        self.duration = duration
+        self.culprits = culprits
+
+    def culprit(self):
+        return self.culprits.most_common(1)[0][0] if self.culprits else "?"
+
+
+class EventLoopWatchdog(QObject):
+    """Измерение задержки цикла событий Qt и поиск виновника зависаний.
+
+    Таймер-зонд срабатывает каждые interval_ms в потоке интерфейса, его
+    запаздывание и есть задержка цикла событий. Отдельный поток проверяет,
+    давно ли был последний такт зонда, и во время зависания снимает стек
+    потока интерфейса (sys._current_frames), чтобы записать, какой слот
+    или метод выполнялся. Зависания дольше threshold секунд попадают в
+    журнал и в отчет о худших зависаниях.
+    """
+    def __init__(self, threshold=0.2, interval_ms=20, sample_interval=0.02,
+                 log_file=STALL_LOG, keep=50, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.interval = interval_ms / 1000.0
+        self.sample_interval = sample_interval
+        self.keep = keep
+
+        self.gui_thread_id = threading.get_ident()
+        self.lock = threading.Lock()
+        self.last_beat = time.monotonic()
+        self.samples = Counter()
+        self.stalls = []
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.beats = 0
+
+        self.logger = logging.getLogger("ds18b20.watchdog")
+        self.logger.setLevel(logging.INFO)
+        if log_file and not self.logger.handlers:
+            handler = logging.FileHandler(log_file, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+
+        self.probe = QTimer(self)
+        self.probe.setTimerType(Qt.PreciseTimer)
+        self.probe.timeout.connect(self.beat)
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.last_beat = time.monotonic()
+        self.running = True
+        self.probe.start(int(self.interval * 1000))
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.probe.stop()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+    def beat(self):
+        """Такт зонда в потоке интерфейса"""
+        now = time.monotonic()
+        with self.lock:
+            gap = now - self.last_beat
+            self.last_beat = now
+            samples, self.samples = self.samples, Counter()
+
+        lag = max(0.0, gap - self.interval)
+        self.beats += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+        if lag >= self.threshold:
+            stall = Stall(datetime.now(), lag, samples)
+            self.stalls.append(stall)
+            self.stalls.sort(key=lambda s: s.duration, reverse=True)
+            del self.stalls[self.keep:]
+            self.logger.info(f"зависание {lag * 1000:.0f} мс: {stall.culprit()}")
+
+    def sample(self):
+        """Поток-наблюдатель: снимает стек потока интерфейса во время зависания"""
+        while self.running:
+            time.sleep(self.sample_interval)
+            with self.lock:
+                stalled = time.monotonic() - self.last_beat > self.interval + self.threshold / 2
+            if not stalled:
+                continue
+            frame = sys._current_frames().get(self.gui_thread_id)
+            if frame is None:
+                continue
+            culprit = attribute_stack(frame)
+            with self.lock:
+                self.samples[culprit] += 1
+
+    def mean_lag(self):
+        return self.total_lag / self.beats if self.beats else 0.0
+
+    def report(self, top=20):
+        """Текстовый отчет о худших зависаниях"""
+        lines = [
+            f"Отчет о зависаниях цикла событий ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})",
+            f"Тактов зонда: {self.beats}, средняя задержка: {self.mean_lag() * 1000:.1f} мс, "
+            f"максимальная: {self.max_lag * 1000:.0f} мс, порог: {self.threshold * 1000:.0f} мс",
+            "",
+        ]
+        for i, stall in enumerate(self.stalls[:top], 1):
+            lines.append(f"{i:2d}. {stall.start.strftime('%Y-%m-%d %H:%M:%S')}  "
+                         f"{stall.duration * 1000:7.0f} мс  {stall.culprit()}")
+        if not self.stalls:
+            lines.append("Зависаний не обнаружено")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path=STALL_REPORT):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.report())
@@ -0,0 +1,57 @@
+import re
+from collections import namedtuple
+
+# Строка прошивки: "Temperatures: S0: 23.1250C | S1: 24.0000C"
+TEMPERATURE_RE = re.compile(r'S(\d+):\s*(-?\d+\.\d+)')
+
+# Подтверждение смены разрешения: "Changed S0 to 10-bit"
+RESOLUTION_RE = re.compile(r'Changed S(\d+) to (\d+)-bit')
+
+# Команды смены разрешения для прошивки (ProcessCommand в main.c)
+COMMAND_MAP = {
+    0: {"9": 'a', "10": 'b', "11": 'c', "12": 'd'},
+    1: {"9": 'e', "10": 'f', "11": 'g', "12": 'h'}
+}
+
+# События протокола; received - отметка time.monotonic() прихода строки
+Reading = namedtuple("Reading", "sensor temp received")
+ResolutionChanged = namedtuple("ResolutionChanged", "sensor bits received")
+Status = namedtuple("Status", "kind text received")
+
+# Виды Status
+STATUS_NO_SENSORS = "no_sensors"
+STATUS_LINE = "line"
+
+
+def parse_temperatures(line):
+    """Температуры из строки прошивки: {номер датчика (с 0): значение}"""
+    return {int(num): float(value) for num, value in TEMPERATURE_RE.findall(line)}
+
+
+def parse_resolution_change(line):
+    """Подтверждение смены разрешения: (номер датчика с 0, бит) или None"""
+    match = RESOLUTION_RE.search(line)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def resolution_command(sensor_num, resolution):
+    """Символ команды смены разрешения или None, если такой команды нет"""
+    return COMMAND_MAP.get(sensor_num, {}).get(str(resolution))
+
+
+def parse_line(line, received=None):
+    """События из строки прошивки: Reading для каждого датчика, ResolutionChanged или Status"""
+    events = [Reading(sensor, temp, received) for sensor, temp in parse_temperatures(line).items()]
+
+    change = parse_resolution_change(line)
+    if change is not None:
+        events.append(ResolutionChanged(change[0], change[1], received))
+
+    if not events:
+        if "no sensors found" in line.lower():
+            events.append(Status(STATUS_NO_SENSORS, line, received))
+        else:
+            events.append(Status(STATUS_LINE, line, received))
+    return events
@@ -0,0 +1,249 @@
+import sys
+import json
+import random
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+
+from ds18b20_async import open_stream, BAUDRATE, Reading
+from protocol import resolution_command
+from simulator import SimulatedDevice, FaultInjector, FaultySerial, RESOLUTION_STEP
+
+RESOLUTIONS = (9, 10, 11, 12)
+
+# Задержки преобразования, заданные в diod() (Kurs_work/diod.c), мс
+NOMINAL_CONVERSION_MS = {9: 94, 10: 188, 11: 375, 12: 750}
+
+# Период вывода кадров прошивки, с
+FIRMWARE_PERIOD = 10.0
+
+
+class StepResult:
+    """Показания одного датчика на одном разрешении за один цикл"""
+    def __init__(self, sensor, bits, cycle):
+        self.sensor = sensor
+        self.bits = bits
+        self.cycle = cycle
+        self.latency = None
+        self.error = None
+        self.readings = []
+
+
+def quantisation_step(values):
+    """Наименьшая ненулевая разница между различными показаниями (None, если значение одно)"""
+    unique = sorted(set(values))
+    steps = [round(b - a, 4) for a, b in zip(unique, unique[1:])]
+    return min(steps) if steps else None
+
+
+def difference_noise(values):
+    """Шум по соседним разностям (std / sqrt(2)): медленный дрейф температуры в него почти не входит"""
+    diffs = [b - a for a, b in zip(values, values[1:])]
+    if len(diffs) < 2:
+        return None
+    return statistics.pstdev(diffs) / 2 ** 0.5
+
+
+def noisy_temperature(noise):
+    """Температура для симулятора: постоянная с гауссовым шумом noise °C"""
+    def temperature(sensor, seq, now):
+        return 22.0 + 2.0 * sensor + random.gauss(0.0, noise)
+    return temperature
+
+
+async def next_reading(stream, timeout):
+    """Следующее событие Reading из потока"""
+    while True:
+        event = await asyncio.wait_for(stream.__anext__(), timeout)
+        if isinstance(event, Reading):
+            return event
+
+
+async def run_benchmark(stream, sensors, resolutions=RESOLUTIONS, readings=30, settle=1, cycles=1,
+                        frame_timeout=3 * FIRMWARE_PERIOD, confirm_timeout=5.0, report=None):
+    """Перебор разрешений: на каждом шаге все датчики переводятся командой и копят readings показаний.
+
+    Показания до подтверждения и settle кадров после него отбрасываются:
+    прошивка применяет разрешение в следующем цикле измерения, и первый
+    кадр еще может содержать значение, измеренное со старым разрешением.
+    """
+    results = []
+    for cycle in range(cycles):
+        for bits in resolutions:
+            step = {sensor: StepResult(sensor, bits, cycle) for sensor in sensors}
+            confirmed = time.monotonic()
+            for sensor in sensors:
+                try:
+                    event = await stream.set_resolution(sensor, bits, confirm_timeout)
+                    step[sensor].latency = stream.last_confirmation_latency
+                    confirmed = max(confirmed, event.received)
+                except asyncio.TimeoutError:
+                    step[sensor].error = "нет подтверждения"
+            frames = {sensor: 0 for sensor in sensors}
+            try:
+                while any(len(step[sensor].readings) < readings for sensor in sensors):
+                    event = await next_reading(stream, frame_timeout)
+                    if event.sensor not in step or event.received <= confirmed:
+                        continue
+                    frames[event.sensor] += 1
+                    if frames[event.sensor] > settle and len(step[event.sensor].readings) < readings:
+                        step[event.sensor].readings.append((event.received, event.temp))
+            except asyncio.TimeoutError:
+                for sensor in sensors:
+                    if len(step[sensor].readings) < readings:
+                        step[sensor].error = step[sensor].error or "нет кадров"
+            results.extend(step.values())
+            if report is not None:
+                for result in step.values():
+                    report(result)
+    return results
+
+
+def summarize(results):
+    """Сводка по (датчик, разрешение): интервал, шаг квантования, разброс, задержка подтверждения"""
+    summary = {}
+    for key in dict.fromkeys((r.sensor, r.bits) for r in results):
+        group = [r for r in results if (r.sensor, r.bits) == key]
+        sensor, bits = key
+        intervals, temps, noise = [], [], []
+        for r in group:
+            stamps = [received for received, _ in r.readings]
+            values = [temp for _, temp in r.readings]
+            intervals += [b - a for a, b in zip(stamps, stamps[1:])]
+            temps += values
+            step_noise = difference_noise(values)
+            if step_noise is not None:
+                noise.append(step_noise)
+        latencies = [r.latency for r in group if r.latency is not None]
+        step = quantisation_step(temps)
+        summary[f"S{sensor + 1} {bits} бит"] = {
+            "sensor": sensor + 1,
+            "bits": bits,
+            "readings": len(temps),
+            "interval_median_s": round(statistics.median(intervals), 3) if intervals else None,
+            "interval_std_s": round(statistics.pstdev(intervals), 3) if len(intervals) > 1 else None,
+            "step_c": step,
+            "nominal_step_c": RESOLUTION_STEP[bits],
+            "std_c": round(statistics.pstdev(temps), 4) if len(temps) > 1 else None,
+            "noise_c": round(statistics.mean(noise), 4) if noise else None,
+            "confirm_median_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            "confirm_max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+            "nominal_conversion_ms": NOMINAL_CONVERSION_MS[bits],
+            "errors": [r.error for r in group if r.error],
+        }
+    return summary
+
+
+def format_summary(summary):
+    def value(v, fmt):
+        return "---" if v is None else format(v, fmt)
+
+    lines = ["Датчик\tБит\tПоказаний\tИнтервал мед/std (с)\tШаг (°C)\tНоминал шага\t"
+             "Std (°C)\tШум (°C)\tПодтверждение мед/макс (мс)\tПреобразование по diod() (мс)\tОшибки"]
+    for s in summary.values():
+        lines.append(f"S{s['sensor']}\t{s['bits']}\t{s['readings']}\t"
+                     f"{value(s['interval_median_s'], '.3f')}/{value(s['interval_std_s'], '.3f')}\t"
+                     f"{value(s['step_c'], '.4f')}\t{s['nominal_step_c']:.4f}\t"
+                     f"{value(s['std_c'], '.4f')}\t{value(s['noise_c'], '.4f')}\t"
+                     f"{value(s['confirm_median_ms'], '.1f')}/{value(s['confirm_max_ms'], '.1f')}\t"
+                     f"{s['nominal_conversion_ms']}\t{', '.join(s['errors']) or '-'}")
+    return "\n".join(lines)
+
+
+async def benchmark(args, serial_instance=None):
+    sensors = [sensor - 1 for sensor in args.sensors]
+    async with open_stream(args.port, args.baudrate, serial_instance) as stream:
+        try:
+            return await run_benchmark(
+                stream, sensors, args.resolutions, args.readings, args.settle, args.cycles,
+                args.frame_timeout, args.confirm_timeout,
+                report=lambda r: print(f"S{r.sensor + 1} {r.bits} бит (цикл {r.cycle + 1}): "
+                                       f"показаний {len(r.readings)}, подтверждение "
+                                       f"{'---' if r.latency is None else f'{r.latency * 1000:.1f} мс'}"
+                                       f"{', ' + r.error if r.error else ''}", file=sys.stderr))
+        finally:
+            if args.final:
+                # Возврат к рабочему разрешению, даже если замер прерван
+                for sensor in sensors:
+                    try:
+                        await stream.set_resolution(sensor, args.final, args.confirm_timeout)
+                    except (asyncio.TimeoutError, OSError):
+                        print(f"Не подтверждено разрешение {args.final} бит для S{sensor + 1}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер задержки, шага и шума DS18B20 на каждом разрешении")
+    parser.add_argument("port", nargs="?", help="порт или URL pyserial (без --simulate)")
+    parser.add_argument("--baudrate", type=int, default=BAUDRATE, help="скорость порта")
+    parser.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    parser.add_argument("-r", "--resolutions", type=int, nargs="+", choices=RESOLUTIONS, default=list(RESOLUTIONS),
+                        help="разрешения в порядке перебора")
+    parser.add_argument("-n", "--readings", type=int, default=30, help="показаний на каждом шаге")
+    parser.add_argument("--settle", type=int, default=1, help="кадров, отбрасываемых после подтверждения")
+    parser.add_argument("--cycles", type=int, default=1, help="повторов перебора разрешений")
+    parser.add_argument("--frame-timeout", type=float, default=3 * FIRMWARE_PERIOD, help="ожидание кадра, с")
+    parser.add_argument("--confirm-timeout", type=float, default=5.0, help="ожидание подтверждения команды, с")
+    parser.add_argument("--final", type=int, choices=RESOLUTIONS, default=12,
+                        help="разрешение, которое выставить после замера")
+    parser.add_argument("--simulate", action="store_true", help="замер на симуляторе прошивки (simulator.py)")
+    parser.add_argument("--sim-period", type=float, default=FIRMWARE_PERIOD, help="период кадров симулятора, с")
+    parser.add_argument("--sim-command-delay", type=float, default=0.0,
+                        help="задержка выполнения команды симулятором, с")
+    parser.add_argument("--sim-noise", type=float, default=0.1, help="шум температуры симулятора, °C")
+    parser.add_argument("--seed", type=int, help="начальное значение генератора шума симулятора")
+    parser.add_argument("-o", "--output", help="записать отчет в JSON")
+    parser.add_argument("--json", action="store_true", help="вывести отчет в JSON")
+    args = parser.parse_args(argv)
+
+    if not args.simulate and not args.port:
+        parser.error("укажите порт или --simulate")
+    missing = [sensor for sensor in args.sensors if resolution_command(sensor - 1, 12) is None]
+    if missing:
+        parser.error(f"нет команд смены разрешения для датчиков: {', '.join(map(str, missing))}")
+
+    serial_instance = None
+    if args.simulate:
+        # Шум температуры симулятора берется из модуля random
+        random.seed(args.seed)
+        device = SimulatedDevice(period=args.sim_period, sensors=max(args.sensors),
+                                 temperature=noisy_temperature(args.sim_noise),
+                                 command_delay=args.sim_command_delay, keep_emitted=0)
+        serial_instance = FaultySerial(device, FaultInjector(seed=args.seed))
+        args.port = "SIM"
+
+    started = datetime.now()
+    try:
+        results = asyncio.run(benchmark(args, serial_instance))
+    except KeyboardInterrupt:
+        print("Замер прерван", file=sys.stderr)
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"Ошибка замера: {e}", file=sys.stderr)
+        return 1
+
+    summary = summarize(results)
+    report = {
+        "started": started.isoformat(sep=" ", timespec="seconds"),
+        "finished": datetime.now().isoformat(sep=" ", timespec="seconds"),
+        "port": args.port,
+        "simulated": args.simulate,
+        "simulator": {key: getattr(args, key) for key in
+                      ("sim_period", "sim_command_delay", "sim_noise", "seed")} if args.simulate else None,
+        "settings": {key: getattr(args, key) for key in
+                     ("sensors", "resolutions", "readings", "settle", "cycles", "final")},
+        "results": summary,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_summary(summary))
+    return 0 if all(not s["errors"] for s in summary.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
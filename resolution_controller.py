@@ -0,0 +1,83 @@
+import time
+
+# Разрешения в порядке возрастания точности (как значения радиокнопок)
+RESOLUTIONS = ["9", "10", "11", "12"]
+
+# Шаг квантования датчика, °C
+RESOLUTION_STEP = {"9": 0.5, "10": 0.25, "11": 0.125, "12": 0.0625}
+
+# Время преобразования в прошивке (diod()), с
+CONVERSION_TIME = {"9": 0.094, "10": 0.188, "11": 0.375, "12": 0.75}
+
+
+class SensorTrend:
+    """Оценка скорости изменения и шума одного датчика"""
+    def __init__(self):
+        self.last_temp = None
+        self.last_time = None
+        self.rate = 0.0        # сглаженная скорость, °C/с
+        self.noise = 0.0       # сглаженное отклонение от линейного прогноза, °C
+        self.last_change = None
+
+
+class AdaptiveResolutionController:
+    """Автоматический выбор разрешения датчиков по скорости изменения температуры.
+
+    Пока температура быстро меняется, разрешение понижается на ступень (короче
+    преобразование в diod()), а когда она стабильна и шум мал - повышается
+    обратно до 12 бит. Между порогами fast_rate и slow_rate разрешение не
+    меняется, а после каждой смены выдерживается min_dwell секунд, чтобы
+    не было дребезга.
+    """
+    def __init__(self, fast_rate=0.05, slow_rate=0.01, noise_limit=0.1, min_dwell=30.0, alpha=0.3):
+        self.fast_rate = fast_rate
+        self.slow_rate = slow_rate
+        self.noise_limit = noise_limit
+        self.min_dwell = min_dwell
+        self.alpha = alpha
+        self.trends = {}
+
+    def reset(self, sensor=None):
+        """Сброс накопленной статистики (например, после переподключения)"""
+        if sensor is None:
+            self.trends.clear()
+        else:
+            self.trends.pop(sensor, None)
+
+    def update(self, sensor, temp, received=None, current_res="12"):
+        """Учет показания, возвращает новое разрешение или None"""
+        if received is None:
+            received = time.monotonic()
+        trend = self.trends.setdefault(sensor, SensorTrend())
+
+        if trend.last_time is None or received <= trend.last_time:
+            trend.last_temp = temp
+            trend.last_time = received
+            return None
+
+        dt = received - trend.last_time
+        predicted = trend.last_temp + trend.rate * dt
+        rate = (temp - trend.last_temp) / dt
+
+        trend.noise += self.alpha * (abs(temp - predicted) - trend.noise)
+        trend.rate += self.alpha * (rate - trend.rate)
+        trend.last_temp = temp
+        trend.last_time = received
+
+        if trend.last_change is not None and received - trend.last_change < self.min_dwell:
+            return None
+
+        level = RESOLUTIONS.index(current_res) if current_res in RESOLUTIONS else len(RESOLUTIONS) - 1
+        speed = abs(trend.rate)
+        # Квантование при низком разрешении само по себе дает шум порядка шага
+        stable = speed < self.slow_rate and trend.noise <= self.noise_limit + RESOLUTION_STEP[RESOLUTIONS[level]]
+
+        if speed > self.fast_rate and level > 0:
+            level -= 1
+        elif stable and level < len(RESOLUTIONS) - 1:
+            level += 1
+        else:
+            return None
+
+        trend.last_change = received
+        return RESOLUTIONS[level]
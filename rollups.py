@@ -0,0 +1,309 @@
+import sys
+import os
+import math
+import argparse
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from export_log import LOG_FILE, TIME_FORMAT, CHUNK_SIZE, sensor_columns, parse_bound, to_number
+
+# Агрегаты по интервалам: имя -> длительность интервала в секундах
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Время последнего показания хранится с микросекундами
+READING_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+# Пересчет по журналу: период кадров прошивки, допуск на их дрожание (доля периода)
+# и наибольшая длительность действия одной строки, с (как в analytics.py)
+FRAME_PERIOD = 10.0
+FRAME_JITTER = 0.3
+MAX_HOLD = 3600.0
+
+
+def rollup_path_for(log_file):
+    """Файл агрегатов рядом с журналом: temperature_log.xlsx -> temperature_log.rollups.db"""
+    return os.path.splitext(log_file)[0] + ".rollups.db"
+
+
+def bucket_start(timestamp, granularity):
+    """Начало интервала, в который попадает время, в формате журнала"""
+    if granularity == "minute":
+        timestamp = timestamp.replace(second=0, microsecond=0)
+    elif granularity == "hour":
+        timestamp = timestamp.replace(minute=0, second=0, microsecond=0)
+    else:
+        timestamp = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.strftime(TIME_FORMAT)
+
+
+class RollupStore:
+    """Минимум/максимум/среднее/количество по датчикам за минуту, час и сутки.
+
+    Агрегаты обновляются при каждом принятом показании (upsert в SQLite),
+    поэтому запрос за любой период читает число строк, пропорциональное
+    числу интервалов, а не числу сырых показаний.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollups (
+                granularity TEXT NOT NULL,
+                sensor INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                min REAL NOT NULL,
+                max REAL NOT NULL,
+                PRIMARY KEY (granularity, sensor, bucket)
+            ) WITHOUT ROWID
+        """)
+        # Время последнего учтенного показания (для досылки из журнала процесса сбора)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        # Полнота данных по часам (frame_monitor.py)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS completeness (
+                port TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                received INTEGER NOT NULL,
+                missed INTEGER NOT NULL,
+                PRIMARY KEY (port, hour)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    def _upsert(self, items):
+        self.conn.executemany("""
+            INSERT INTO rollups (granularity, sensor, bucket, count, sum, min, max)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (granularity, sensor, bucket) DO UPDATE SET
+                count = count + excluded.count,
+                sum = sum + excluded.sum,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max)
+        """, items)
+
+    def add_many(self, readings):
+        """Пакетный учет показаний: итерируемое (датчик, температура, время)"""
+        self.add_weighted((sensor, temp, timestamp, 1) for sensor, temp, timestamp in readings)
+
+    def add_weighted(self, readings):
+        """Учет повторяющихся показаний: итерируемое (датчик, температура, время, число кадров)"""
+        totals = {}
+        last = None
+        for sensor, temp, timestamp, count in readings:
+            if last is None or timestamp > last:
+                last = timestamp
+            for name in GRANULARITIES:
+                key = (name, sensor, bucket_start(timestamp, name))
+                item = totals.get(key)
+                if item is None:
+                    totals[key] = [count, temp * count, temp, temp]
+                else:
+                    item[0] += count
+                    item[1] += temp * count
+                    item[2] = min(item[2], temp)
+                    item[3] = max(item[3], temp)
+        if not totals:
+            return
+        with self.lock:
+            self._upsert([key + tuple(item) for key, item in totals.items()])
+            self.conn.execute("""
+                INSERT INTO meta (key, value) VALUES ('last_reading', ?)
+                ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+            """, (last.strftime(READING_FORMAT),))
+            self.conn.commit()
+
+    def last_reading(self):
+        """Время последнего учтенного показания или None"""
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_reading'").fetchone()
+        return datetime.strptime(row[0], READING_FORMAT) if row else None
+
+    def add_completeness(self, port, hour, received, missed):
+        """Учет принятых и пропущенных кадров за час"""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO completeness (port, hour, received, missed) VALUES (?, ?, ?, ?)
+                ON CONFLICT (port, hour) DO UPDATE SET
+                    received = received + excluded.received,
+                    missed = missed + excluded.missed
+            """, (port, hour, received, missed))
+            self.conn.commit()
+
+    def completeness(self, start=None, end=None):
+        """Строки (порт, час, принято, пропущено, полнота %) по времени"""
+        query = "SELECT port, hour, received, missed, 100.0 * received / (received + missed) FROM completeness"
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("hour >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("hour < ?")
+            params.append(end)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY hour, port"
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def iter_chunks(self, granularity, sensors, start=None, end=None, chunk_size=CHUNK_SIZE):
+        """Порции строк (интервал, датчик, количество, среднее, мин, макс), упорядоченные по времени"""
+        query = ("SELECT bucket, sensor, count, sum / count, min, max FROM rollups "
+                 f"WHERE granularity = ? AND sensor IN ({', '.join('?' * len(sensors))})")
+        params = [granularity] + list(sensors)
+        if start is not None:
+            query += " AND bucket >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND bucket < ?"
+            params.append(end)
+        query += " ORDER BY bucket, sensor"
+
+        with self.lock:
+            cursor = self.conn.execute(query, params)
+            rows = cursor.fetchmany(chunk_size)
+        while rows:
+            yield rows
+            with self.lock:
+                rows = cursor.fetchmany(chunk_size)
+
+    def clear(self):
+        """Удаление всех агрегатов"""
+        with self.lock:
+            self.conn.execute("DELETE FROM rollups")
+            self.conn.execute("DELETE FROM meta WHERE key = 'last_reading'")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def held_frames(timestamp, following, segment, period=FRAME_PERIOD, max_hold=MAX_HOLD):
+    """Времена кадров, которые представляет строка журнала, сгруппированные по минутам.
+
+    Журнал пишет строку только при изменении показаний, поэтому значения
+    строки действуют во всех кадрах до следующей строки (following, None
+    для последней - тогда один кадр), но не дольше max_hold. Кадры
+    считаются по сетке с шагом period от начала непрерывного участка
+    segment: строка смены разрешения или ошибки между кадрами относится к
+    следующему кадру. Возвращает список (время первого кадра минуты, число
+    кадров).
+    """
+    def index(moment):
+        return math.ceil((moment - segment).total_seconds() / period - FRAME_JITTER)
+
+    first = index(timestamp)
+    if following is None:
+        last = first + 1
+    else:
+        last = index(min(following, timestamp + timedelta(seconds=max_hold)))
+    groups = []
+    for k in range(first, last):
+        moment = max(timestamp, segment + timedelta(seconds=k * period))
+        minute = moment.replace(second=0, microsecond=0)
+        if groups and groups[-1][2] == minute:
+            groups[-1][1] += 1
+        else:
+            groups.append([moment, 1, minute])
+    return [(moment, count) for moment, count, _ in groups]
+
+
+def rebuild_from_log(store, log_file, sensors=(1, 2), chunk_size=CHUNK_SIZE, max_hold=MAX_HOLD):
+    """Пересчет агрегатов по всей истории журнала (архив и xlsx), возвращает число учтенных показаний.
+
+    Живые агрегаты учитывают каждый принятый кадр, а журнал хранит только
+    изменения, поэтому строка учитывается с весом - числом кадров, в
+    которых действовали ее значения (held_frames). Так пересчет дает то же
+    количество и то же среднее, что и живой учет; расходятся они только на
+    участках без кадров (порт отключен), которые ограничены max_hold.
+    """
+    from archive import iter_history_chunks
+
+    columns = [sensor_columns(n)[0] for n in sensors]
+    count = 0
+    store.clear()
+    previous = None
+    segment = None
+
+    def weighted(row, following):
+        nonlocal segment
+        timestamp = datetime.strptime(row[0], TIME_FORMAT)
+        if segment is None:
+            segment = timestamp
+        readings = []
+        frames = held_frames(timestamp, following, segment, max_hold=max_hold)
+        if following is not None and (following - timestamp).total_seconds() > max_hold:
+            # Разрыв: сетка кадров начинается заново от следующей строки
+            segment = following
+        for sensor, value in zip(sensors, row[1:]):
+            temp = to_number(value)
+            if temp is not None:
+                readings += [(sensor, temp, moment, n) for moment, n in frames]
+        return readings
+
+    for chunk in iter_history_chunks(log_file, columns, chunk_size=chunk_size):
+        readings = []
+        for row in chunk:
+            if previous is not None:
+                readings += weighted(previous, datetime.strptime(row[0], TIME_FORMAT))
+            previous = row
+        store.add_weighted(readings)
+        count += sum(reading[3] for reading in readings)
+    if previous is not None:
+        readings = weighted(previous, None)
+        store.add_weighted(readings)
+        count += sum(reading[3] for reading in readings)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Агрегаты температуры по минутам, часам и суткам")
+    parser.add_argument("-i", "--input", default=LOG_FILE, help="журнал Excel (по умолчанию temperature_log.xlsx)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild", help="пересчитать агрегаты по журналу")
+    rebuild.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    rebuild.add_argument("--max-hold", type=float, default=MAX_HOLD,
+                         help="максимальная длительность действия одной строки журнала, с")
+
+    show = sub.add_parser("show", help="вывести агрегаты")
+    show.add_argument("-g", "--granularity", choices=GRANULARITIES, default="hour")
+    show.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    show.add_argument("--from", dest="start", type=parse_bound, help="начало интервала")
+    show.add_argument("--to", dest="end", type=parse_bound, help="конец интервала (не включая)")
+
+    complete = sub.add_parser("completeness", help="вывести полноту данных по часам")
+    complete.add_argument("--from", dest="start", type=parse_bound, help="начало интервала")
+    complete.add_argument("--to", dest="end", type=parse_bound, help="конец интервала (не включая)")
+    args = parser.parse_args(argv)
+
+    store = RollupStore(rollup_path_for(args.input))
+    try:
+        if args.command == "rebuild":
+            count = rebuild_from_log(store, args.input, args.sensors, max_hold=args.max_hold)
+            print(f"Учтено показаний: {count}", file=sys.stderr)
+        elif args.command == "completeness":
+            print("Порт\tЧас\tПринято\tПропущено\tПолнота (%)")
+            for port, hour, received, missed, percent in store.completeness(args.start, args.end):
+                print(f"{port}\t{hour}\t{received}\t{missed}\t{percent:.1f}")
+        else:
+            print("Интервал\tДатчик\tКоличество\tСреднее\tМин\tМакс")
+            for chunk in store.iter_chunks(args.granularity, args.sensors, args.start, args.end):
+                for bucket, sensor, count, mean, low, high in chunk:
+                    print(f"{bucket}\t{sensor}\t{count}\t{mean:.4f}\t{low:.4f}\t{high:.4f}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,251 @@
+from PyQt5.QtWidgets import QTableView, QStyledItemDelegate, QComboBox, QHeaderView, QAbstractItemView, QStyle
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, QRect, pyqtSignal
+from PyQt5.QtGui import QColor, QFont
+
+from protocol import parse_line, resolution_command, Reading, ResolutionChanged, STATUS_NO_SENSORS
+
+COLUMNS = ["Датчик", "Температура (°C)", "Разрешение (бит)", "Статус"]
+COL_SENSOR, COL_TEMP, COL_RES, COL_STATUS = range(len(COLUMNS))
+
+RESOLUTIONS = ["9", "10", "11", "12"]
+
+COLOR_OK = QColor("#27ae60")
+COLOR_ERROR = QColor("#e74c3c")
+COLOR_OK_BG = QColor("#f0f8ff")
+COLOR_ERROR_BG = QColor("#fff0f0")
+
+
+class SensorState:
+    __slots__ = ("sensor", "temp", "res", "working")
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.temp = None
+        self.res = "12"
+        self.working = True
+
+
+class SensorTableModel(QAbstractTableModel):
+    """Модель таблицы датчиков с пакетным обновлением.
+
+    Изменения копятся между тиками и при flush() превращаются в несколько
+    сигналов dataChanged по непрерывным диапазонам строк, а не в
+    обновление каждого виджета на каждую строку прошивки.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.sensors = []
+        self.rows = {}
+        self.dirty = set()
+        self.new_sensors = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.sensors)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        state = self.sensors[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            if column == COL_SENSOR:
+                return f"Датчик {state.sensor + 1}"
+            if column == COL_TEMP:
+                if not state.working:
+                    return "ERROR"
+                return "---" if state.temp is None else f"{state.temp:.4f}"
+            if column == COL_RES:
+                return state.res
+            if column == COL_STATUS:
+                return "✓ Работает" if state.working else "✗ ПОТЕРЯ СИГНАЛА"
+        elif role == Qt.UserRole:
+            return state
+        elif role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == COL_RES:
+            if resolution_command(self.sensors[index.row()].sensor, "12") is not None:
+                flags |= Qt.ItemIsEditable
+        return flags
+
+    def _state(self, sensor):
+        row = self.rows.get(sensor)
+        if row is not None:
+            return self.sensors[row]
+        for state in self.new_sensors:
+            if state.sensor == sensor:
+                return state
+        state = SensorState(sensor)
+        self.new_sensors.append(state)
+        return state
+
+    def _mark(self, state):
+        row = self.rows.get(state.sensor)
+        if row is not None:
+            self.dirty.add(row)
+
+    def update_reading(self, sensor, temp):
+        state = self._state(sensor)
+        state.temp = temp
+        state.working = True
+        self._mark(state)
+
+    def update_resolution(self, sensor, res):
+        state = self._state(sensor)
+        state.res = str(res)
+        self._mark(state)
+
+    def set_all_working(self, working):
+        for state in self.sensors:
+            state.working = working
+        if self.sensors:
+            self.dirty.update(range(len(self.sensors)))
+
+    def update_line(self, line):
+        """Учет строки прошивки"""
+        for event in parse_line(line):
+            if isinstance(event, Reading):
+                self.update_reading(event.sensor, event.temp)
+            elif isinstance(event, ResolutionChanged):
+                self.update_resolution(event.sensor, event.bits)
+            elif event.kind == STATUS_NO_SENSORS:
+                self.set_all_working(False)
+
+    def flush(self):
+        """Применение накопленных изменений: вставка строк и dataChanged по диапазонам"""
+        if self.new_sensors:
+            new = sorted(self.new_sensors, key=lambda s: s.sensor)
+            self.new_sensors = []
+            if self.sensors and new[0].sensor < self.sensors[-1].sensor:
+                # Датчик появился в середине списка: пересобираем порядок строк
+                self.beginResetModel()
+                self.sensors = sorted(self.sensors + new, key=lambda s: s.sensor)
+                self.rows = {s.sensor: i for i, s in enumerate(self.sensors)}
+                self.dirty.clear()
+                self.endResetModel()
+            else:
+                first = len(self.sensors)
+                self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+                self.sensors.extend(new)
+                for i, state in enumerate(new, first):
+                    self.rows[state.sensor] = i
+                self.endInsertRows()
+
+        if not self.dirty:
+            return
+        rows = sorted(self.dirty)
+        self.dirty.clear()
+        last_column = len(COLUMNS) - 1
+        start = prev = rows[0]
+        for row in rows[1:] + [None]:
+            if row is not None and row == prev + 1:
+                prev = row
+                continue
+            self.dataChanged.emit(self.index(start, 0), self.index(prev, last_column))
+            if row is not None:
+                start = prev = row
+
+
+class SensorDelegate(QStyledItemDelegate):
+    """Отрисовка ячеек без виджетов и стилей: цвет по статусу датчика"""
+    resolution_requested = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bold = QFont()
+        self.bold.setBold(True)
+
+    def paint(self, painter, option, index):
+        state = index.data(Qt.UserRole)
+        text = index.data(Qt.DisplayRole)
+
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        else:
+            painter.fillRect(option.rect, COLOR_OK_BG if state.working else COLOR_ERROR_BG)
+
+        column = index.column()
+        if column in (COL_TEMP, COL_STATUS):
+            painter.setPen(COLOR_OK if state.working else COLOR_ERROR)
+            painter.setFont(self.bold)
+        else:
+            painter.setPen(option.palette.text().color())
+        painter.drawText(QRect(option.rect).adjusted(4, 0, -4, 0), Qt.AlignCenter, text)
+        painter.restore()
+
+    def createEditor(self, parent, option, index):
+        if index.column() != COL_RES:
+            return super().createEditor(parent, option, index)
+        editor = QComboBox(parent)
+        editor.addItems(RESOLUTIONS)
+        return editor
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(index.data(Qt.EditRole))
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            # Разрешение в модели меняется только по подтверждению прошивки
+            state = index.data(Qt.UserRole)
+            if editor.currentText() != state.res:
+                self.resolution_requested.emit(state.sensor, editor.currentText())
+        else:
+            super().setModelData(editor, model, index)
+
+
+class SensorGrid(QTableView):
+    """Таблица датчиков: рисуются только видимые строки, обновление по таймеру"""
+    def __init__(self, parent=None, tick_ms=250):
+        super().__init__(parent)
+        self.sensor_model = SensorTableModel(self)
+        self.delegate = SensorDelegate(self)
+        self.setModel(self.sensor_model)
+        self.setItemDelegate(self.delegate)
+
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked)
+        self.setAlternatingRowColors(False)
+        self.setWordWrap(False)
+        self.verticalHeader().setVisible(False)
+        # Фиксированная высота строк: представлению не нужно измерять содержимое
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(36)
+        self.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.setStyleSheet("font-size: 22px;")
+
+        self.tick_timer = QTimer(self)
+        self.tick_timer.timeout.connect(self.sensor_model.flush)
+        self.tick_ms = tick_ms
+        self.tick_timer.start(tick_ms)
+
+    def update_line(self, line):
+        self.sensor_model.update_line(line)
+
+    def pause(self):
+        """Окно скрыто: изменения копятся в модели без перерисовки"""
+        self.tick_timer.stop()
+
+    def resume(self):
+        """Окно снова видно: одно применение накопленного и запуск тиков"""
+        self.sensor_model.flush()
+        if not self.tick_timer.isActive():
+            self.tick_timer.start(self.tick_ms)
+
+    def set_all_working(self, working):
+        self.sensor_model.set_all_working(working)
@@ -0,0 +1,238 @@
+import math
+import time
+import random
+import threading
+from collections import deque
+
+import serial
+
+from protocol import COMMAND_MAP
+
+# Виды неисправностей линии
+FAULT_NOISE = "noise"        # искажение отдельных бит
+FAULT_PARTIAL = "partial"    # строки приходят мелкими кусками
+FAULT_GARBAGE = "garbage"    # вставки случайных байт
+FAULT_BURST = "burst"        # данные задерживаются и приходят пачкой
+FAULT_VANISH = "vanish"      # порт исчезает посреди чтения
+FAULTS = (FAULT_NOISE, FAULT_PARTIAL, FAULT_GARBAGE, FAULT_BURST, FAULT_VANISH)
+
+# Шаг температуры DS18B20 по разрешению, °C
+RESOLUTION_STEP = {9: 0.5, 10: 0.25, 11: 0.125, 12: 0.0625}
+
+# Команда -> (датчик, бит), обратная к COMMAND_MAP
+COMMANDS = {cmd: (sensor, int(bits)) for sensor, cmds in COMMAND_MAP.items() for bits, cmd in cmds.items()}
+
+
+def default_temperature(sensor, seq, now):
+    """Медленная синусоида с шумом, у каждого датчика свое смещение"""
+    return 22.0 + 2.0 * sensor + 0.5 * math.sin(now / 60.0 + sensor) + random.gauss(0.0, 0.02)
+
+
+def format_temperature(value):
+    """Температура как в USART_SendFloat: четыре знака после точки"""
+    return f"{value:.4f}"
+
+
+class SimulatedDevice:
+    """Модель прошивки STM32 (Kurs_work/main.c).
+
+    Каждые period секунд выводит "Temperatures: S0: ...C | S1: ...C",
+    отвечает на команды a-h эхом и строкой "Changed Sn to N-bit".
+    Температура квантуется шагом текущего разрешения датчика. Время
+    берется из clock(), чтобы испытания можно было ускорять.
+    """
+    def __init__(self, period=10.0, sensors=2, temperature=default_temperature,
+                 clock=time.monotonic, command_delay=0.0, keep_emitted=10000):
+        self.period = period
+        self.sensors = sensors
+        self.temperature = temperature
+        self.clock = clock
+        self.command_delay = command_delay
+        self.lock = threading.Lock()
+        self.resolution = {sensor: 12 for sensor in range(sensors)}
+        self.output = bytearray()
+        self.pending_commands = []
+        self.seq = 0
+        self.next_frame = None
+        # Последние выданные кадры: (номер, отметка clock(), {датчик: строка температуры})
+        self.emitted = deque(maxlen=keep_emitted)
+
+    def frame_values(self, seq, now):
+        values = {}
+        for sensor in range(self.sensors):
+            step = RESOLUTION_STEP[self.resolution[sensor]]
+            temp = round(self.temperature(sensor, seq, now) / step) * step
+            values[sensor] = format_temperature(temp)
+        return values
+
+    def poll(self):
+        """Вывод кадров и ответов на команды, время которых наступило"""
+        now = self.clock()
+        with self.lock:
+            if self.next_frame is None:
+                self.next_frame = now + self.period
+            for due, cmd in list(self.pending_commands):
+                if due <= now:
+                    self.pending_commands.remove((due, cmd))
+                    self._execute(cmd)
+            while now >= self.next_frame:
+                self._frame(self.next_frame)
+                self.next_frame += self.period
+
+    def _frame(self, stamp):
+        if self.sensors == 0:
+            self.output += b"Temperatures: No sensors found\r\n"
+            return
+        values = self.frame_values(self.seq, stamp)
+        parts = [f"S{sensor}: {value}C" for sensor, value in values.items()]
+        self.output += ("Temperatures: " + " | ".join(parts) + "\r\n").encode()
+        self.emitted.append((self.seq, stamp, values))
+        self.seq += 1
+
+    def _execute(self, cmd):
+        change = COMMANDS.get(cmd)
+        if change is None:
+            return
+        sensor, bits = change
+        self.resolution[sensor] = bits
+        self.output += f"Changed S{sensor} to {bits}-bit\r\n".encode()
+
+    def write(self, data):
+        """Прием байт из порта: эхо каждого символа и постановка команды"""
+        now = self.clock()
+        with self.lock:
+            for char in data.decode('ascii', 'ignore'):
+                self.output += (char + "\r\n").encode()
+                if char in COMMANDS:
+                    self.pending_commands.append((now + self.command_delay, char))
+        if self.command_delay == 0:
+            self.poll()
+
+    def take_output(self):
+        with self.lock:
+            data = bytes(self.output)
+            self.output.clear()
+        return data
+
+    def drop_output(self):
+        """Потеря всего, что прошивка успела вывести (порт отсутствует)"""
+        self.poll()
+        with self.lock:
+            self.output.clear()
+
+
+class FaultInjector:
+    """Текущая неисправность линии, общая для всех открытий порта.
+
+    noise_rate - доля искаженных байт, fragment - наибольший кусок при
+    FAULT_PARTIAL, garbage_rate - доля чтений со вставкой мусора.
+    """
+    def __init__(self, seed=None, noise_rate=0.01, fragment=5, garbage_rate=0.3, garbage_size=16):
+        self.rng = random.Random(seed)
+        self.noise_rate = noise_rate
+        self.fragment = fragment
+        self.garbage_rate = garbage_rate
+        self.garbage_size = garbage_size
+        self.fault = None
+        self.started = None
+        self.generation = 0
+
+    def inject(self, fault):
+        if fault not in FAULTS:
+            raise ValueError(f"неизвестная неисправность: {fault}")
+        self.fault = fault
+        self.started = time.monotonic()
+        if fault == FAULT_VANISH:
+            self.generation += 1
+
+    def clear(self):
+        self.fault = None
+        self.started = None
+
+    def corrupt(self, data):
+        if self.fault == FAULT_NOISE:
+            data = bytearray(data)
+            for i in range(len(data)):
+                if self.rng.random() < self.noise_rate:
+                    data[i] ^= 1 << self.rng.randrange(8)
+            return bytes(data)
+        if self.fault == FAULT_GARBAGE and data and self.rng.random() < self.garbage_rate:
+            junk = bytes(self.rng.randrange(256) for _ in range(self.rng.randint(1, self.garbage_size)))
+            pos = self.rng.randrange(len(data) + 1)
+            return data[:pos] + junk + data[pos:]
+        return data
+
+
+class FaultySerial:
+    """Объект с интерфейсом serial.Serial между SimulatedDevice и читателем"""
+    def __init__(self, device, injector, port="SIM", baudrate=9600, timeout=None):
+        self.device = device
+        self.injector = injector
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.generation = injector.generation
+        self.buffer = bytearray()
+
+    def _check(self):
+        if not self.is_open:
+            raise serial.SerialException("Attempting to use a port that is not open")
+        if self.injector.fault == FAULT_VANISH or self.generation != self.injector.generation:
+            # Порт исчез: после возврата устройства нужно открыть его заново
+            self.is_open = False
+            self.device.drop_output()
+            raise serial.SerialException("device reports readiness to read but returned no data "
+                                         "(device disconnected or multiple access on port?)")
+
+    def _fill(self):
+        self.device.poll()
+        data = self.device.take_output()
+        if data:
+            self.buffer += self.injector.corrupt(data)
+
+    @property
+    def in_waiting(self):
+        self._check()
+        self._fill()
+        if self.injector.fault == FAULT_BURST:
+            return 0
+        if self.injector.fault == FAULT_PARTIAL:
+            return min(len(self.buffer), self.injector.rng.randint(1, self.injector.fragment))
+        return len(self.buffer)
+
+    def read(self, size=1):
+        self._check()
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def write(self, data):
+        self._check()
+        self.device.write(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+    def close(self):
+        self.is_open = False
+
+
+class SimulatedLink:
+    """Замена serial.Serial(port, baud, timeout=...): открывает FaultySerial.
+
+    Пока действует FAULT_VANISH, открытие завершается SerialException,
+    как у отключенного USB-UART.
+    """
+    def __init__(self, device, injector=None):
+        self.device = device
+        self.injector = injector if injector is not None else FaultInjector()
+        self.opened = 0
+
+    def __call__(self, port="SIM", baudrate=9600, timeout=None, **kwargs):
+        if self.injector.fault == FAULT_VANISH:
+            raise serial.SerialException(f"could not open port {port}: [Errno 2] No such file or directory")
+        self.opened += 1
+        self.device.drop_output()
+        return FaultySerial(self.device, self.injector, port, baudrate, timeout)
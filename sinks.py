@@ -0,0 +1,468 @@
+import os
+import csv
+import glob
+import json
+import time
+import socket
+import threading
+from collections import deque
+from datetime import datetime
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill, Alignment
+
+SINK_CONFIG = "sinks.json"
+
+# Колонки строки журнала (как в DS18B20Monitor.create_excel_file)
+LOG_COLUMNS = ['Время', 'Датчик 1 Температура (°C)', 'Датчик 1 Статус',
+               'Датчик 1 Разрешение (бит)', 'Датчик 2 Температура (°C)',
+               'Датчик 2 Статус', 'Датчик 2 Разрешение (бит)',
+               'Время записи', 'Задержка записи (мс)']
+
+# Журнал Excel ротируется по суткам: период - дата из колонки 'Время'
+PERIOD_FORMAT = "%Y-%m-%d"
+PERIOD_SAMPLE = "2024-01-01"
+
+# Временный файл, в который сохраняется журнал перед заменой
+TEMP_SUFFIX = ".saving"
+
+# Что делать с новой строкой, если очередь приемника заполнена
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+# Предел паузы между повторами после ошибки записи, с
+MAX_BACKOFF = 30.0
+
+
+class Sink:
+    """Приемник строк журнала со своим потоком, очередью и пакетной записью.
+
+    submit() никогда не ждет: строка кладется в ограниченную очередь, при
+    переполнении отбрасывается самая старая (или новая) строка и растет
+    счетчик dropped. Поток приемника собирает пакет до batch_size строк
+    или до flush_interval секунд и вызывает write_batch(). При ошибке
+    пакет повторяется с нарастающей паузой, поэтому медленный или
+    неисправный приемник теряет только свои строки и не задерживает
+    чтение порта и другие приемники.
+    """
+    kind = "sink"
+
+    def __init__(self, name=None, max_queue=10000, batch_size=100, flush_interval=1.0, overflow=DROP_OLDEST):
+        self.name = name or self.kind
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.queue = deque()
+        # Пакет, взятый из очереди, но еще не записанный
+        self.batch = []
+        self.condition = threading.Condition()
+        self.thread = None
+        self.running = False
+        # Остановка по истечении времени: дописать текущий пакет и выйти
+        self.abandon = False
+        self.on_error = None
+
+        # Счетчики
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self.batches = 0
+        self.queue_peak = 0
+        self.last_error = None
+        self.last_write_ms = 0.0
+
+    def submit(self, row, received):
+        """Постановка строки в очередь; received - отметка time.monotonic() прихода данных"""
+        with self.condition:
+            self.submitted += 1
+            if len(self.queue) >= self.max_queue:
+                self.dropped += 1
+                if self.overflow == DROP_NEWEST:
+                    return
+                self.queue.popleft()
+            self.queue.append((row, received))
+            self.queue_peak = max(self.queue_peak, len(self.queue))
+            if len(self.queue) >= self.batch_size:
+                self.condition.notify()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Остановка с записью оставшихся строк (одна попытка); True, если ничего не отброшено.
+
+        Если за timeout очередь не записана, оставшиеся строки отбрасываются,
+        но начатая запись дожидается завершения: иначе поток-демон будет
+        убит при выходе из интерпретатора посреди сохранения файла.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+            dropped = self.dropped
+        if self.thread:
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                with self.condition:
+                    self.abandon = True
+                self.thread.join()
+        return self.dropped == dropped
+
+    def _take_batch(self):
+        with self.condition:
+            deadline = time.monotonic() + self.flush_interval
+            while self.running and len(self.queue) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            count = min(len(self.queue), self.batch_size)
+            return [self.queue.popleft() for _ in range(count)]
+
+    def run(self):
+        backoff = 0.0
+        try:
+            self.open()
+        except Exception as e:
+            self._failed(e)
+        while True:
+            if not self.batch:
+                self.batch = self._take_batch()
+                if not self.batch and not self.running:
+                    break
+            if self.batch and self._write(self.batch):
+                self.batch = []
+                backoff = 0.0
+                if self.abandon:
+                    with self.condition:
+                        self.dropped += len(self.queue)
+                        self.queue.clear()
+                    break
+            elif self.batch:
+                if not self.running:
+                    # При остановке не ждем восстановления приемника
+                    with self.condition:
+                        self.dropped += len(self.batch) + len(self.queue)
+                        self.batch = []
+                        self.queue.clear()
+                    break
+                backoff = min(MAX_BACKOFF, backoff * 2 or 0.5)
+                with self.condition:
+                    self.condition.wait(backoff)
+        try:
+            self.close()
+        except Exception as e:
+            self._failed(e)
+
+    def _write(self, batch):
+        started = time.monotonic()
+        try:
+            self.write_batch(batch)
+        except Exception as e:
+            self._failed(e)
+            return False
+        self.last_write_ms = (time.monotonic() - started) * 1000
+        self.written += len(batch)
+        self.batches += 1
+        return True
+
+    def _failed(self, error):
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.on_error is not None:
+            self.on_error(self, error)
+
+    def stats(self):
+        with self.condition:
+            queued = len(self.queue)
+        return {
+            "name": self.name,
+            "submitted": self.submitted,
+            "written": self.written,
+            "queued": queued,
+            "queue_peak": self.queue_peak,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "batches": self.batches,
+            "last_write_ms": round(self.last_write_ms, 1),
+            "last_error": self.last_error,
+        }
+
+    # Переопределяются в приемниках
+    def open(self):
+        pass
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+def complete_row(row, received):
+    """Строка журнала с временем записи и задержкой от прихода данных"""
+    row = dict(row)
+    row['Время записи'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    row['Задержка записи (мс)'] = round((time.monotonic() - received) * 1000, 1)
+    return [row.get(column) for column in LOG_COLUMNS]
+
+
+def new_log_workbook():
+    """Пустой журнал: лист "Температура" с оформленной строкой заголовков"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Температура"
+    for col, header in enumerate(LOG_COLUMNS, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        cell.font = Font(color="FFFFFF", bold=True)
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        ws.column_dimensions[chr(64 + col)].width = 25
+    return wb
+
+
+def log_period(path):
+    """Период журнала (дата первой строки, PERIOD_FORMAT) или None для пустого файла"""
+    wb = load_workbook(path, read_only=True)
+    try:
+        for values in wb.active.iter_rows(min_row=2, max_col=1, values_only=True):
+            if values and values[0]:
+                return str(values[0])[:len(PERIOD_SAMPLE)]
+        return None
+    finally:
+        wb.close()
+
+
+def rotated_path(log_file, period):
+    """Имя закрытого журнала за период: temperature_log.2024-05-01.xlsx (с номером при совпадении)"""
+    base, ext = os.path.splitext(log_file)
+    path = f"{base}.{period}{ext}"
+    n = 2
+    while os.path.exists(path):
+        path = f"{base}.{period}-{n}{ext}"
+        n += 1
+    return path
+
+
+def rotated_logs(log_file):
+    """Закрытые журналы рядом с log_file в порядке периодов"""
+    base, ext = os.path.splitext(log_file)
+    return sorted(glob.glob(f"{glob.escape(base)}.????-??-??*{ext}"))
+
+
+class ExcelSink(Sink):
+    """Журнал Excel за текущие сутки.
+
+    Книга открывается один раз при запуске приемника и дальше только
+    дополняется в памяти; каждый пакет сохраняется во временный файл,
+    который затем атомарно заменяет журнал, так что прерванное сохранение
+    не портит записанную историю. Когда приходит строка следующих суток,
+    журнал переименовывается в temperature_log.<дата>.xlsx и начинается
+    новый: время сохранения и память ограничены одними сутками, а
+    закрытые журналы забирает архив (archive.py). Журнал, оставшийся от
+    прошлых суток (или от версии без ротации), закрывается при запуске.
+    """
+    kind = "excel"
+
+    def __init__(self, path, batch_size=500, flush_interval=30.0, **kwargs):
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval, **kwargs)
+        self.path = path
+        self.wb = None
+        self.period = None
+        # Пакет и позиция в нем: при повторе после ошибки строки не дописываются дважды
+        self.cursor_batch = None
+        self.cursor = 0
+        self.on_rotate = None
+        # Строки журнала текущих суток (значения LOG_COLUMNS) для окна истории
+        self.rows = []
+        self.rows_lock = threading.Lock()
+
+    def open(self):
+        period = log_period(self.path) if os.path.exists(self.path) else None
+        if period is not None and period != datetime.now().strftime(PERIOD_FORMAT):
+            self._rotate(period)
+        if os.path.exists(self.path):
+            self.wb = load_workbook(self.path)
+            self.period = period
+            rows = [list(values) for values in self.wb.active.iter_rows(min_row=2, values_only=True)]
+        else:
+            self.wb = new_log_workbook()
+            self.period = None
+            rows = []
+        with self.rows_lock:
+            self.rows = rows
+
+    def write_batch(self, batch):
+        if self.wb is None:
+            self.open()
+        if self.cursor_batch is not batch:
+            self.cursor_batch, self.cursor = batch, 0
+        ws = self.wb.active
+        while self.cursor < len(batch):
+            row, received = batch[self.cursor]
+            period = str(row['Время'])[:len(PERIOD_SAMPLE)]
+            if self.period is not None and period != self.period:
+                self._save()
+                self._rotate(self.period)
+                self.wb = new_log_workbook()
+                ws = self.wb.active
+                self.period = None
+                with self.rows_lock:
+                    self.rows = []
+            if self.period is None:
+                self.period = period
+            values = complete_row(row, received)
+            ws.append(values)
+            with self.rows_lock:
+                self.rows.append(values)
+            self.cursor += 1
+        self._save()
+        self.cursor_batch = None
+
+    def _save(self):
+        base, ext = os.path.splitext(self.path)
+        temp = base + TEMP_SUFFIX + ext
+        self.wb.save(temp)
+        os.replace(temp, self.path)
+
+    def _rotate(self, period):
+        path = rotated_path(self.path, period)
+        os.replace(self.path, path)
+        if self.on_rotate is not None:
+            self.on_rotate(path)
+
+    def current_rows(self):
+        """Строки журнала текущих суток (копия списка, можно вызывать из любого потока)"""
+        with self.rows_lock:
+            return list(self.rows)
+
+    def close(self):
+        self.wb = None
+
+
+class CsvSink(Sink):
+    """Копия журнала в CSV (дописывается, заголовок - при создании файла)"""
+    kind = "csv"
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.file = None
+        self.writer = None
+
+    def open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if new:
+            self.writer.writerow(LOG_COLUMNS)
+            self.file.flush()
+
+    def write_batch(self, batch):
+        if self.file is None:
+            self.open()
+        self.writer.writerows(complete_row(row, received) for row, received in batch)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ForwardSink(Sink):
+    """Пересылка строк JSON по TCP; при обрыве - переподключение при следующем пакете"""
+    kind = "forward"
+
+    def __init__(self, host, port, timeout=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.address = (host, port)
+        self.timeout = timeout
+        self.sock = None
+
+    def write_batch(self, batch):
+        data = "".join(json.dumps(dict(zip(LOG_COLUMNS, complete_row(row, received))), ensure_ascii=False) + "\n"
+                       for row, received in batch).encode()
+        try:
+            if self.sock is None:
+                self.sock = socket.create_connection(self.address, timeout=self.timeout)
+            self.sock.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def _options(cfg):
+    return {key: cfg[key] for key in ("name", "max_queue", "batch_size", "flush_interval", "overflow")
+            if key in cfg}
+
+
+SINK_TYPES = {
+    "excel": lambda cfg: ExcelSink(cfg["path"], **_options(cfg)),
+    "csv": lambda cfg: CsvSink(cfg["path"], **_options(cfg)),
+    "forward": lambda cfg: ForwardSink(cfg.get("host", "127.0.0.1"), int(cfg["port"]), **_options(cfg)),
+}
+
+
+class SinkPipeline:
+    """Раздача строк журнала всем приемникам без ожидания"""
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    @classmethod
+    def from_config(cls, log_file, path=SINK_CONFIG):
+        """Приемники из JSON {"sinks": [{"type": "csv", "path": ...}, ...]}, по умолчанию - журнал Excel"""
+        if not os.path.exists(path):
+            return cls([ExcelSink(log_file)])
+
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        configs = config.get("sinks", [{"type": "excel"}])
+        sinks = []
+        for cfg in configs:
+            if cfg["type"] == "excel":
+                cfg = dict(cfg, path=cfg.get("path", log_file))
+            sinks.append(SINK_TYPES[cfg["type"]](cfg))
+        return cls(sinks)
+
+    def set_error_handler(self, callback):
+        """callback(sink, error) вызывается из потока приемника"""
+        for sink in self.sinks:
+            sink.on_error = callback
+
+    def set_rotate_handler(self, callback):
+        """callback(path) вызывается из потока приемника Excel после закрытия журнала за период"""
+        for sink in self.sinks:
+            if isinstance(sink, ExcelSink):
+                sink.on_rotate = callback
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+
+    def submit(self, row, received):
+        for sink in self.sinks:
+            sink.submit(row, received)
+
+    def stop(self, timeout=5.0):
+        """Остановка всех приемников; True, если все строки записаны"""
+        results = [sink.stop(timeout) for sink in self.sinks]
+        return all(results)
+
+    def current_rows(self, path):
+        """Строки текущих суток журнала Excel path (еще не в архиве) или пустой список"""
+        for sink in self.sinks:
+            if isinstance(sink, ExcelSink) and sink.path == path:
+                return sink.current_rows()
+        return []
+
+    def stats(self):
+        return [sink.stats() for sink in self.sinks]
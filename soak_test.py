@@ -0,0 +1,291 @@
+import os
+import gc
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QObject
+
+from simulator import SimulatedDevice, FaultInjector, SimulatedLink, FAULT_VANISH
+from fault_harness import attach_link
+from timebase import ArrivalClock
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Период кадров прошивки, с (сжимается в --speedup раз)
+FIRMWARE_PERIOD = 10.0
+
+# Допустимый рост за прогон: (абсолютный, относительный)
+DEFAULT_LIMITS = {
+    "rss_mb": (5.0, 0.05),
+    "fds": (2, 0.0),
+    "threads": (2, 0.0),
+    "qt_objects": (10, 0.0),
+    "py_objects": (2000, 0.05),
+    # Загрузка процессора всеми потоками, % одного ядра
+    "cpu_pct": (10.0, 0.2),
+}
+
+
+def rss_mb():
+    """Резидентная память процесса, МБ"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def open_fds():
+    """Открытые дескрипторы (на Windows - handles)"""
+    if psutil is not None:
+        process = psutil.Process()
+        return process.num_handles() if sys.platform == "win32" else process.num_fds()
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+class ScaledClock(ArrivalClock):
+    """Часы прихода для сжатого времени: отметки в журнале и агрегатах идут в speedup раз быстрее,
+    поэтому журнал ротируется и уходит в архив по суткам прошивки, как в работе"""
+    def __init__(self, speedup):
+        super().__init__()
+        self.speedup = speedup
+
+    def to_datetime(self, received):
+        return datetime.fromtimestamp(self.wall0 + (received - self.mono0) * self.speedup)
+
+
+def theil_sen(points):
+    """Устойчивый к выбросам наклон: медиана наклонов по всем парам точек"""
+    slopes = []
+    for i in range(len(points)):
+        for j in range(i + 1, len(points)):
+            dx = points[j][0] - points[i][0]
+            if dx > 0:
+                slopes.append((points[j][1] - points[i][1]) / dx)
+    return statistics.median(slopes) if slopes else 0.0
+
+
+class SoakTest:
+    """Долгий прогон монитора на симуляторе со сжатым временем.
+
+    Кадры идут в speedup раз чаще прошивки; периодически порт пропадает
+    (переподключение нажимается автоматически), монитор отключается и
+    подключается заново, меняется разрешение датчиков. Раз в
+    sample_interval секунд после сборки мусора снимаются RSS, число
+    дескрипторов, потоков, объектов Qt и объектов Python и загрузка
+    процессора за интервал.
+    """
+    def __init__(self, app, window, device, injector, speedup=1000.0, vanish_every=3600.0,
+                 reconnect_every=4 * 3600.0, resolution_every=1800.0, sample_interval=2.0):
+        self.app = app
+        self.window = window
+        self.device = device
+        self.injector = injector
+        # Интервалы событий заданы во времени прошивки и сжимаются так же, как кадры
+        self.vanish_every = vanish_every / speedup
+        self.reconnect_every = reconnect_every / speedup
+        self.resolution_every = resolution_every / speedup
+        self.sample_interval = sample_interval
+        self.samples = []
+        self.counts = {"vanish": 0, "reconnect": 0, "resolution": 0, "reconnect_presses": 0}
+        self.resolution_index = 0
+        self.started = None
+        self.cpu_mark = None
+
+    def cpu_pct(self):
+        """Процессорное время всех потоков с прошлого замера, % от прошедшего времени"""
+        mark = (time.monotonic(), time.process_time())
+        previous, self.cpu_mark = self.cpu_mark, mark
+        if previous is None or mark[0] <= previous[0]:
+            return None
+        return round((mark[1] - previous[1]) / (mark[0] - previous[0]) * 100, 1)
+
+    def sample(self):
+        # До сборки мусора: она сама заметно нагружает процессор
+        cpu = self.cpu_pct()
+        gc.collect()
+        window = self.window
+        row = {
+            "elapsed": round(time.monotonic() - self.started, 2),
+            "frames": self.device.seq,
+            "rss_mb": rss_mb(),
+            "fds": open_fds(),
+            "threads": threading.active_count(),
+            "qt_objects": len(window.findChildren(QObject)) + len(QApplication.allWidgets()),
+            "py_objects": len(gc.get_objects()),
+            "cpu_pct": cpu,
+            "log_data": len(window.log_data),
+            "sink_queued": sum(s["queued"] for s in window.sinks.stats()) if window.sinks else 0,
+        }
+        self.samples.append(row)
+        return row
+
+    def press_reconnect(self):
+        """Действия оператора после потери связи: 'Переподключиться' или повторное 'Подключиться'"""
+        if self.injector.fault is not None:
+            return
+        if self.window.reconnect_mode:
+            self.counts["reconnect_presses"] += 1
+            self.window.reconnect()
+        elif not self.window.is_connected:
+            # Подключение пришлось на пропадание порта и не удалось
+            self.counts["reconnect_presses"] += 1
+            self.window.connect()
+
+    def change_resolution(self):
+        resolutions = ["9", "10", "11", "12"]
+        self.resolution_index = (self.resolution_index + 1) % len(resolutions)
+        for sensor in (0, 1):
+            self.window.send_resolution_command(sensor, resolutions[self.resolution_index])
+        self.counts["resolution"] += 1
+
+    def run(self, duration, report=None):
+        self.started = time.monotonic()
+        self.cpu_mark = (self.started, time.process_time())
+        self.window.connect()
+        now = self.started
+        next_sample = now
+        next_vanish = now + self.vanish_every
+        next_reconnect = now + self.reconnect_every
+        next_resolution = now + self.resolution_every
+        vanish_until = None
+        end = self.started + duration
+
+        while now < end:
+            self.app.processEvents()
+            now = time.monotonic()
+
+            if vanish_until is not None and now >= vanish_until:
+                self.injector.clear()
+                vanish_until = None
+            if now >= next_vanish:
+                self.injector.inject(FAULT_VANISH)
+                vanish_until = now + 0.2
+                next_vanish += self.vanish_every
+                self.counts["vanish"] += 1
+            if now >= next_reconnect and self.window.is_connected:
+                self.window.disconnect()
+                self.window.connect()
+                next_reconnect += self.reconnect_every
+                self.counts["reconnect"] += 1
+            if now >= next_resolution:
+                self.change_resolution()
+                next_resolution += self.resolution_every
+            self.press_reconnect()
+
+            if now >= next_sample:
+                row = self.sample()
+                next_sample += self.sample_interval
+                if report is not None:
+                    report(row)
+            time.sleep(0.002)
+
+        self.window.disconnect()
+        self.sample()
+
+    def trends(self, limits=DEFAULT_LIMITS, warmup=0.2):
+        """Рост каждой величины за прогон по наклону Тейла-Сена после прогрева"""
+        start = int(len(self.samples) * warmup)
+        samples = self.samples[start:]
+        result = {}
+        for name, (absolute, relative) in limits.items():
+            points = [(s["elapsed"], s[name]) for s in samples if s[name] is not None]
+            if len(points) < 3:
+                result[name] = {"growth": None, "limit": None, "ok": True}
+                continue
+            span = points[-1][0] - points[0][0]
+            growth = theil_sen(points) * span
+            base = statistics.median(value for _, value in points[:max(1, len(points) // 3)])
+            limit = max(absolute, abs(base) * relative)
+            result[name] = {"start": round(base, 3), "end": round(points[-1][1], 3), "growth": round(growth, 3),
+                            "limit": round(limit, 3), "ok": growth <= limit}
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Долгий прогон монитора на симуляторе: утечки памяти, дескрипторов, потоков")
+    parser.add_argument("--days", type=float, default=3.0, help="длительность во времени прошивки, сутки (несколько суток: "
+                             "журнал Excel растет в пределах суток и сбрасывается при ротации)")
+    parser.add_argument("--speedup", type=float, default=1000.0, help="во сколько раз сжать время")
+    parser.add_argument("--vanish-every", type=float, default=1.0, help="пропадание порта, раз в N часов")
+    parser.add_argument("--reconnect-every", type=float, default=4.0, help="отключение/подключение, раз в N часов")
+    parser.add_argument("--resolution-every", type=float, default=0.5, help="смена разрешения, раз в N часов")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="период снятия показателей, с")
+    parser.add_argument("--sinks", help="конфигурация приемников журнала (по умолчанию - как в программе, "
+                                        "без sinks.json: журнал Excel с ротацией и архивом)")
+    parser.add_argument("--samples", help="записать показатели в CSV")
+    parser.add_argument("--json", action="store_true", help="вывести итог в JSON")
+    args, qt_args = parser.parse_known_args(argv)
+
+    duration = args.days * 86400 / args.speedup
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QApplication(sys.argv[:1] + qt_args)
+
+    # Журнал, архив и агрегаты - во временном каталоге, приемники - те же, что в работе
+    workdir = tempfile.TemporaryDirectory()
+    cwd = os.getcwd()
+    if args.sinks:
+        shutil.copy(args.sinks, os.path.join(workdir.name, "sinks.json"))
+    os.chdir(workdir.name)
+    try:
+        from gui import DS18B20Monitor
+        window = DS18B20Monitor()
+        window.clock = ScaledClock(args.speedup)
+        # Кадры не запоминаются: иначе рост показал бы сам симулятор
+        device = SimulatedDevice(period=FIRMWARE_PERIOD / args.speedup, keep_emitted=0)
+        injector = FaultInjector()
+        attach_link(window, SimulatedLink(device, injector))
+
+        soak = SoakTest(app, window, device, injector, args.speedup, args.vanish_every * 3600,
+                        args.reconnect_every * 3600, args.resolution_every * 3600, args.sample_interval)
+        print(f"Прогон {args.days} сут. за {duration:.0f} с", file=sys.stderr)
+        soak.run(duration, report=lambda row: print(
+            f"{row['elapsed']:8.1f} с  кадров {row['frames']:7d}  RSS {row['rss_mb'] or 0:7.1f} МБ  "
+            f"fd {row['fds']}  потоков {row['threads']}  Qt {row['qt_objects']}  "
+            f"Python {row['py_objects']}  CPU {row['cpu_pct']}%", file=sys.stderr))
+        window.close()
+    finally:
+        os.chdir(cwd)
+        workdir.cleanup()
+
+    if args.samples:
+        with open(args.samples, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(soak.samples[0]))
+            writer.writeheader()
+            writer.writerows(soak.samples)
+
+    trends = soak.trends()
+    failed = [name for name, trend in trends.items() if not trend["ok"]]
+    if args.json:
+        print(json.dumps({"events": soak.counts, "frames": device.seq, "trends": trends}, ensure_ascii=False, indent=2))
+    else:
+        print(f"Кадров: {device.seq}, события: {soak.counts}")
+        print("Показатель\tНачало\tКонец\tРост за прогон\tДопустимо\tИтог")
+        for name, trend in trends.items():
+            if trend["growth"] is None:
+                print(f"{name}\t---\t---\t---\t---\tнет данных")
+                continue
+            print(f"{name}\t{trend['start']}\t{trend['end']}\t{trend['growth']}\t{trend['limit']}\t"
+                  f"{'OK' if trend['ok'] else 'РОСТ'}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import sys
+import json
+import math
+import heapq
+import queue
+import socket
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+
+from export_log import (CHUNK_SIZE, TIME_COLUMN, TIME_FORMAT, WRITERS, FORMATS,
+                        sensor_columns, to_number, detect_format)
+from protocol import parse_temperatures
+
+# Период вывода кадров прошивки, с
+STEP = 10.0
+
+# Журнал пишет строку только при изменении: значение из журнала действует до
+# следующей строки, но не дольше (с), как в rollups.py и analytics.py
+MAX_HOLD = 3600.0
+
+
+def parse_time(text):
+    """Время журнала, журнала сбора или рассылки -> секунды эпохи"""
+    if isinstance(text, datetime):
+        return text.timestamp()
+    return datetime.fromisoformat(str(text).replace(",", ".")).timestamp()
+
+
+def format_grid_time(seconds):
+    return datetime.fromtimestamp(seconds).strftime(TIME_FORMAT)
+
+
+class AsOfMerger:
+    """Потоковое слияние показаний нескольких портов на общую сетку времени.
+
+    Для узла сетки t в каждую колонку (источник, датчик) попадает последнее
+    показание с временем в [t - tolerance, t] (as-of join назад), иначе
+    пусто. Для источников из holds (журналы только с изменениями) окно
+    равно их сроку действия: показание держится до следующего, а
+    показание None (ERROR в журнале) обрывает его. Узел выдается, когда все
+    источники ушли дальше t (показания с одной отметкой времени приходят
+    по одному датчику, и узел t ждет следующей отметки), либо когда самый
+    быстрый ушел дальше t + max_delay: отставший источник не держит
+    остальных. В памяти остаются только показания не старше окна, поэтому
+    объем не зависит от длины истории. Показания каждого источника должны
+    приходить по возрастанию времени; опоздавшие к уже выданному узлу
+    отбрасываются и считаются в late.
+    """
+    def __init__(self, sources, sensors=(1, 2), step=STEP, tolerance=STEP, max_delay=None, skip_empty=True,
+                 holds=None):
+        self.sources = list(sources)
+        self.sensors = list(sensors)
+        self.step = step
+        self.tolerance = tolerance
+        self.max_delay = tolerance if max_delay is None else max_delay
+        self.skip_empty = skip_empty
+        holds = holds or {}
+        self.windows = {source: max(tolerance, holds.get(source, 0.0)) for source in self.sources}
+        self.columns = [(source, sensor) for source in self.sources for sensor in self.sensors]
+        self.buffers = {column: deque() for column in self.columns}
+        self.watermarks = {source: -math.inf for source in self.sources}
+        self.next_tick = None
+        self.late = 0
+
+    def header(self):
+        return [TIME_COLUMN] + [f"{source} {sensor_columns(sensor)[0]}" for source, sensor in self.columns]
+
+    def push(self, source, timestamp, sensor, temp):
+        """Показание датчика (с 1) источника; возвращает готовые строки"""
+        if self.next_tick is None:
+            self.next_tick = math.ceil(timestamp / self.step) * self.step
+        if timestamp > self.watermarks[source]:
+            self.watermarks[source] = timestamp
+        buffer = self.buffers.get((source, sensor))
+        if buffer is not None:
+            if timestamp <= self.next_tick - self.step:
+                self.late += 1
+            # Даже опоздавшее показание может оказаться последним для следующего узла
+            if timestamp >= self.next_tick - self.windows[source]:
+                buffer.append((timestamp, temp))
+        return self.ready()
+
+    def close_source(self, source):
+        """Источник завершился: больше не задерживает выдачу"""
+        self.watermarks[source] = math.inf
+        return self.ready()
+
+    def ready(self):
+        rows = []
+        if self.next_tick is None:
+            return rows
+        slowest = min(self.watermarks.values())
+        closed = slowest == math.inf
+        if closed:
+            # Все источники завершились: узлы до последнего показания включительно
+            limit = max((buffer[-1][0] for buffer in self.buffers.values() if buffer), default=-math.inf)
+        else:
+            fastest = max(w for w in self.watermarks.values() if w != math.inf)
+            limit = max(slowest, fastest - self.max_delay)
+        # Узел на самой отметке limit не выдается: у источника могут быть еще
+        # не переданные датчики с этой же отметкой
+        while self.next_tick < limit or (closed and self.next_tick <= limit):
+            row = self._row(self.next_tick)
+            self.next_tick += self.step
+            if row is not None:
+                rows.append(row)
+        return rows
+
+    def flush(self):
+        """Выдача оставшихся узлов по всем показаниям в памяти"""
+        for source in self.sources:
+            self.watermarks[source] = math.inf
+        return self.ready()
+
+    def _row(self, tick):
+        values = []
+        for column in self.columns:
+            buffer = self.buffers[column]
+            window = self.windows[column[0]]
+            # Показания старше окна для этого и следующих узлов не нужны
+            while buffer and buffer[0][0] < tick - window:
+                buffer.popleft()
+            value = None
+            for timestamp, temp in buffer:
+                if timestamp > tick:
+                    break
+                value = temp
+            values.append(value)
+        if self.skip_empty and all(value is None for value in values):
+            return None
+        return (format_grid_time(tick),) + tuple(values)
+
+
+def iter_excel_source(path, sensors, chunk_size=CHUNK_SIZE):
+    """Показания из журнала Excel вместе с архивом и закрытыми сутками: (время, датчик, температура).
+
+    Строка пишется только при изменении, поэтому каждое значение передается
+    и для неработающего датчика (None): оно обрывает действие предыдущего.
+    """
+    from archive import iter_history_chunks
+
+    columns = [sensor_columns(sensor)[0] for sensor in sensors]
+    for chunk in iter_history_chunks(path, columns, chunk_size=chunk_size):
+        for row in chunk:
+            timestamp = parse_time(row[0])
+            for sensor, value in zip(sensors, row[1:]):
+                yield timestamp, sensor, to_number(value)
+
+
+def iter_journal_source(path, sensors):
+    """Показания из журнала процесса сбора (acquisition_journal.csv: время;строка)"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stamp, _, text = line.rstrip("\n").partition(";")
+            try:
+                timestamp = parse_time(stamp)
+            except ValueError:
+                continue
+            for sensor, temp in parse_temperatures(text).items():
+                if sensor + 1 in sensors:
+                    yield timestamp, sensor + 1, temp
+
+
+def iter_jsonl_source(lines, sensors):
+    """Показания из сообщений рассылки (fanout_server.py), JSON по строке"""
+    for line in lines:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get("type") != "reading" or message.get("sensor") not in sensors:
+            continue
+        yield parse_time(message["time"]), message["sensor"], float(message["temp"])
+
+
+def iter_jsonl_file(path, sensors):
+    with open(path, encoding="utf-8") as f:
+        yield from iter_jsonl_source(f, sensors)
+
+
+def parse_source(spec):
+    """Источник 'имя=путь' или 'имя=tcp://host:port'; без имени - имя по пути"""
+    name, sep, target = spec.partition("=")
+    if not sep:
+        name, target = spec, spec
+    return name, target
+
+
+def is_log_source(target):
+    """Журнал Excel: строки только при изменении, показания держатся до следующей строки"""
+    return target.lower().endswith(".xlsx")
+
+
+def open_history_source(target, sensors, chunk_size=CHUNK_SIZE):
+    if is_log_source(target):
+        return iter_excel_source(target, sensors, chunk_size)
+    if target.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return iter_jsonl_file(target, sensors)
+    return iter_journal_source(target, sensors)
+
+
+def _tagged(name, iterator):
+    for timestamp, sensor, temp in iterator:
+        yield timestamp, name, sensor, temp
+
+
+def merge_history(sources, merger, chunk_size=CHUNK_SIZE):
+    """Слияние файлов истории; sources - {имя: итератор (время, датчик, температура)}"""
+    streams = [_tagged(name, iterator) for name, iterator in sources.items()]
+    chunk = []
+    for timestamp, name, sensor, temp in heapq.merge(*streams, key=lambda item: item[0]):
+        chunk.extend(merger.push(name, timestamp, sensor, temp))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    chunk.extend(merger.flush())
+    if chunk:
+        yield chunk
+
+
+def read_fanout(name, host, port, sensors, events, stop_event):
+    """Поток чтения одного сервера рассылки: события (имя, показание или None)"""
+    try:
+        with socket.create_connection((host, port)) as sock:
+            sock.settimeout(0.5)
+            buffer = b""
+            while not stop_event.is_set():
+                try:
+                    data = sock.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                buffer += data
+                *lines, buffer = buffer.split(b"\n")
+                for reading in iter_jsonl_source(lines, sensors):
+                    events.put((name, reading))
+    except OSError as e:
+        print(f"Ошибка источника {name}: {e}", file=sys.stderr)
+    events.put((name, None))
+
+
+def merge_live(sources, merger, sensors):
+    """Слияние рассылок нескольких мониторов; sources - {имя: (host, port)}"""
+    events = queue.Queue()
+    stop_event = threading.Event()
+    for name, (host, port) in sources.items():
+        threading.Thread(target=read_fanout, args=(name, host, port, sensors, events, stop_event),
+                         daemon=True).start()
+
+    remaining = len(sources)
+    try:
+        while remaining:
+            try:
+                name, reading = events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if reading is None:
+                remaining -= 1
+                rows = merger.close_source(name)
+            else:
+                rows = merger.push(name, *reading)
+            if rows:
+                yield rows
+    finally:
+        stop_event.set()
+    rows = merger.flush()
+    if rows:
+        yield rows
+
+
+def self_check():
+    """Слияние на известных случаях, возвращает список расхождений"""
+    failures = []
+    t0 = 1_000_000_000.0
+
+    # Оба датчика каждого источника с одной отметкой (как в строке журнала и кадре):
+    # узел не выдается, пока не переданы все датчики с его отметкой
+    frames = {"A": (20.0, 30.0), "B": (40.0, 50.0)}
+    sources = {name: [(t0 + t, sensor, base + t) for t in (0, 10, 20)
+                      for sensor, base in zip((1, 2), values)]
+               for name, values in frames.items()}
+    merger = AsOfMerger(list(sources), (1, 2), skip_empty=False)
+    rows = [row for chunk in merge_history({name: iter(items) for name, items in sources.items()}, merger)
+            for row in chunk]
+    for i, t in enumerate((0, 10, 20)):
+        expected = (20.0 + t, 30.0 + t, 40.0 + t, 50.0 + t)
+        got = rows[i][1:] if i < len(rows) else None
+        if got != expected:
+            failures.append(f"одна отметка, узел {t} с: {got}, ожидалось {expected}")
+
+    # Журнал только с изменениями: значение спокойной платы держится до следующей строки,
+    # ERROR (None) его обрывает
+    steady = [(t0, 1, 20.0), (t0 + 300, 1, 21.0), (t0 + 400, 1, None)]
+    busy = [(t0 + t, 1, 30.0 + t) for t in range(0, 500, 10)]
+    merger = AsOfMerger(["steady", "busy"], (1,), holds={"steady": MAX_HOLD})
+    rows = [row for chunk in merge_history({"steady": iter(steady), "busy": iter(busy)}, merger)
+            for row in chunk]
+    for i, row in enumerate(rows):
+        t = i * STEP
+        expected = 20.0 if t < 300 else 21.0 if t < 400 else None
+        if row[1] != expected:
+            failures.append(f"журнал с изменениями, узел {t:.0f} с: {row[1]}, ожидалось {expected}")
+            break
+    if len(rows) != len(busy):
+        failures.append(f"журнал с изменениями: узлов {len(rows)}, ожидалось {len(busy)}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Слияние показаний нескольких плат на общую сетку времени")
+    parser.add_argument("sources", nargs="*",
+                        help="источники 'имя=файл' (журнал .xlsx вместе с архивом, журнал сбора .csv, рассылка .jsonl) "
+                             "или 'имя=tcp://host:port' (сервер рассылки --serve)")
+    parser.add_argument("-o", "--output", help="выходной файл (по умолчанию stdout для csv/jsonl)")
+    parser.add_argument("-f", "--format", choices=FORMATS, help="формат вывода (по умолчанию по расширению)")
+    parser.add_argument("-s", "--sensors", type=int, nargs="+", default=[1, 2], help="номера датчиков (с 1)")
+    parser.add_argument("--step", type=float, default=STEP, help="шаг сетки, с")
+    parser.add_argument("--tolerance", type=float, default=STEP, help="наибольший возраст показания в узле, с")
+    parser.add_argument("--max-delay", type=float, help="сколько ждать отставший источник, с (по умолчанию = tolerance)")
+    parser.add_argument("--max-hold", type=float, default=MAX_HOLD,
+                        help="сколько держится значение из журнала .xlsx до следующей строки, с")
+    parser.add_argument("--keep-empty", action="store_true", help="выводить узлы без показаний")
+    parser.add_argument("--check", action="store_true", help="проверить слияние на известных случаях")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        failures = self_check()
+        for failure in failures:
+            print(f"Ошибка: {failure}", file=sys.stderr)
+        print("Проверка слияния: " + ("OK" if not failures else f"ошибок {len(failures)}"))
+        return 1 if failures else 0
+    if not args.sources:
+        parser.error("укажите источники или --check")
+
+    sources = dict(parse_source(spec) for spec in args.sources)
+    live = {name: target for name, target in sources.items() if target.startswith("tcp://")}
+    if live and len(live) != len(sources):
+        print("Ошибка: нельзя смешивать файлы и серверы рассылки", file=sys.stderr)
+        return 2
+
+    holds = {name: args.max_hold for name, target in sources.items() if is_log_source(target)}
+    merger = AsOfMerger(sources, args.sensors, args.step, args.tolerance, args.max_delay,
+                        skip_empty=not args.keep_empty, holds=holds)
+    fmt = args.format or detect_format(args.output)
+    count = 0
+    try:
+        writer = WRITERS[fmt](args.output, merger.header())
+        try:
+            if live:
+                addresses = {}
+                for name, target in live.items():
+                    host, _, port = target[len("tcp://"):].rpartition(":")
+                    addresses[name] = (host or "127.0.0.1", int(port))
+                chunks = merge_live(addresses, merger, args.sensors)
+            else:
+                chunks = merge_history({name: open_history_source(target, args.sensors)
+                                        for name, target in sources.items()}, merger)
+            for chunk in chunks:
+                writer.write_chunk(chunk)
+                if live and hasattr(writer, "file"):
+                    writer.file.flush()
+                count += len(chunk)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            writer.close()
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Ошибка слияния: {e}", file=sys.stderr)
+        return 1
+
+    print(f"Строк: {count}, опоздавших показаний: {merger.late}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
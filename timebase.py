@@ -0,0 +1,26 @@
+import time
+from datetime import datetime
+
+
+class ArrivalClock:
+    """Отметки времени прихода строк по time.monotonic() с переводом в системное время.
+
+    Привязка к системным часам делается один раз при создании, поэтому
+    перевод часов не искажает интервалы между отметками. time.monotonic()
+    общий для всех процессов, так что отметки процесса сбора переводятся
+    тем же способом.
+    """
+    def __init__(self):
+        self.wall0 = time.time()
+        self.mono0 = time.monotonic()
+
+    def now(self):
+        return time.monotonic()
+
+    def to_datetime(self, received):
+        """Системное время для отметки time.monotonic()"""
+        return datetime.fromtimestamp(self.wall0 + (received - self.mono0))
+
+    def from_datetime(self, moment):
+        """Отметка в шкале time.monotonic() для системного времени (обратно to_datetime)"""
+        return self.mono0 + (moment.timestamp() - self.wall0)